@@ -1,10 +1,30 @@
 from __future__ import annotations
 
+import json
+import struct
 from dataclasses import dataclass
 from typing import Any, Optional
 
 import httpx
 
+try:
+    import websockets
+except ImportError:  # optional, only needed for LastOasisClient.stream()
+    websockets = None  # type: ignore[assignment]
+
+try:
+    import msgpack
+except ImportError:  # optional, responses fall back to JSON
+    msgpack = None  # type: ignore[assignment]
+
+MSGPACK = "application/msgpack"
+
+
+def _decode(r: httpx.Response) -> Any:
+    if r.headers.get("content-type", "").startswith(MSGPACK):
+        return msgpack.unpackb(r.content)
+    return r.json()
+
 
 @dataclass(frozen=True)
 class EntryQuote:
@@ -20,22 +40,149 @@ class EntryConfirm:
     api_key: str
 
 
+_GRID_HEADER = struct.Struct("<4sBBHqII16s")
+_GRID_AGENT = struct.Struct("<HHhBBif")
+
+
+@dataclass(frozen=True)
+class GridFrame:
+    """A decoded /world/grid.bin frame. The tile arrays are row-major (index y * size + x).
+
+    With dtype "u8", degradation and hazard hold 0..255 and `scale` (1/255) converts them back;
+    with "f16" they are floats and `scale` is 1.0. numpy users can wrap them directly, e.g.
+    np.frombuffer(frame.degradation, np.uint8).reshape(size, size) * frame.scale.
+    """
+
+    tick: int
+    size: int
+    epoch: str
+    scale: float
+    degradation: Any
+    hazard: Any
+    resource: bytes
+    agents: list[dict[str, Any]]
+
+    @classmethod
+    def decode(cls, data: bytes) -> "GridFrame":
+        magic, _version, dtype, rec_size, tick, size, count, epoch = _GRID_HEADER.unpack_from(data, 0)
+        if magic != b"LOGB":
+            raise ValueError("not a /world/grid.bin frame")
+        n = size * size
+        view = memoryview(data)
+        off = _GRID_HEADER.size
+        if dtype == 0:
+            degradation, hazard = view[off : off + n], view[off + n : off + 2 * n]
+            off += 2 * n
+            scale = 1 / 255
+        else:
+            degradation = struct.unpack_from(f"<{n}e", data, off)
+            hazard = struct.unpack_from(f"<{n}e", data, off + 2 * n)
+            off += 4 * n
+            scale = 1.0
+        resource = bytes(view[off : off + n])
+        off += n
+        records = [_GRID_AGENT.unpack_from(data, off + i * rec_size) for i in range(count)]
+        off += count * rec_size
+        agents: list[dict[str, Any]] = []
+        for x, y, hp, alive, betrayals, res, trust in records:
+            strs = []
+            for _ in range(2):
+                ln = data[off]
+                strs.append(bytes(view[off + 1 : off + 1 + ln]).decode("utf-8"))
+                off += 1 + ln
+            agents.append({
+                "agent_id": strs[0],
+                "name": strs[1],
+                "x": x,
+                "y": y,
+                "hp": hp,
+                "alive": bool(alive),
+                "resource": res,
+                "trust_score": trust,
+                "betrayals": betrayals,
+            })
+        return cls(
+            tick=tick,
+            size=size,
+            epoch=epoch.rstrip(b"\0").decode("ascii"),
+            scale=scale,
+            degradation=degradation,
+            hazard=hazard,
+            resource=resource,
+            agents=agents,
+        )
+
+
+class AgentStream:
+    """Async iterator over the observations pushed by /world/stream, one per tick.
+
+    Actions are sent back over the same socket with act(); the server's replies are kept in
+    last_ack (the tick the action was queued for) and last_error.
+    """
+
+    def __init__(self, url: str, binary: bool = False, api_key: Optional[str] = None) -> None:
+        self.url = url
+        self.binary = binary
+        self.api_key = api_key
+        self.last_ack: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self._ws: Any = None
+
+    async def __aenter__(self) -> "AgentStream":
+        # a header, not ?token=, so the key stays out of access and proxy logs
+        headers = {"X-AGENT-TOKEN": self.api_key} if self.api_key else None
+        self._ws = await websockets.connect(self.url, additional_headers=headers)
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self._ws.close()
+
+    def __aiter__(self) -> "AgentStream":
+        return self
+
+    async def __anext__(self) -> dict[str, Any]:
+        while True:
+            try:
+                raw = await self._ws.recv()
+            except websockets.ConnectionClosed:
+                raise StopAsyncIteration
+            # the server answers in JSON text frames when it cannot produce msgpack
+            msg = msgpack.unpackb(raw) if isinstance(raw, bytes) else json.loads(raw)
+            kind = msg.get("type")
+            if kind == "observation":
+                return msg["observation"]
+            if kind == "ack":
+                self.last_ack = int(msg["queued_for_tick"])
+            elif kind == "error":
+                self.last_error = str(msg.get("detail"))
+
+    async def act(self, action: dict[str, Any]) -> None:
+        msg = {"type": "action", "action": action}
+        await self._ws.send(msgpack.packb(msg) if self.binary else json.dumps(msg))
+
+
 class LastOasisClient:
-    def __init__(self, base_url: str, api_key: Optional[str] = None) -> None:
+    def __init__(self, base_url: str, api_key: Optional[str] = None, use_msgpack: Optional[bool] = None) -> None:
+        """`use_msgpack` defaults to True when the msgpack package is installed."""
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
+        self.use_msgpack = (msgpack is not None) if use_msgpack is None else use_msgpack
+        if self.use_msgpack and msgpack is None:
+            raise RuntimeError("the msgpack package is required for use_msgpack=True")
 
     def _headers(self) -> dict[str, str]:
         h: dict[str, str] = {}
+        if self.use_msgpack:
+            h["Accept"] = f"{MSGPACK}, application/json;q=0.5"
         if self.api_key:
             h["X-AGENT-TOKEN"] = self.api_key
         return h
 
     async def entry_quote(self) -> EntryQuote:
         async with httpx.AsyncClient() as c:
-            r = await c.post(f"{self.base_url}/entry/quote")
+            r = await c.post(f"{self.base_url}/entry/quote", headers=self._headers())
             r.raise_for_status()
-            data = r.json()
+            data = _decode(r)
             return EntryQuote(
                 asset=str(data["asset"]),
                 amount=str(data["amount"]),
@@ -45,26 +192,71 @@ class LastOasisClient:
 
     async def entry_confirm(self, tx_ref: str, name: Optional[str] = None) -> EntryConfirm:
         async with httpx.AsyncClient() as c:
-            r = await c.post(f"{self.base_url}/entry/confirm", json={"tx_ref": tx_ref, "name": name})
+            r = await c.post(f"{self.base_url}/entry/confirm", json={"tx_ref": tx_ref, "name": name}, headers=self._headers())
             r.raise_for_status()
-            data = r.json()
+            data = _decode(r)
             return EntryConfirm(agent_id=str(data["agent_id"]), api_key=str(data["api_key"]))
 
     async def status(self) -> dict[str, Any]:
         async with httpx.AsyncClient() as c:
-            r = await c.get(f"{self.base_url}/world/status")
+            r = await c.get(f"{self.base_url}/world/status", headers=self._headers())
             r.raise_for_status()
-            return r.json()
+            return _decode(r)
 
-    async def observation(self) -> dict[str, Any]:
+    async def grid(self, dtype: str = "u8") -> GridFrame:
+        """The whole map from /world/grid.bin; `dtype` "f16" keeps more float precision."""
         async with httpx.AsyncClient() as c:
-            r = await c.get(f"{self.base_url}/world/observation", headers=self._headers())
+            r = await c.get(f"{self.base_url}/world/grid.bin", params={"dtype": dtype})
+            r.raise_for_status()
+            return GridFrame.decode(r.content)
+
+    async def observation(self, after_tick: Optional[int] = None, timeout_s: float = 25.0) -> dict[str, Any]:
+        """Current observation; with `after_tick`, the server holds the request until the world
+        passes that tick (or `timeout_s` elapses)."""
+        if after_tick is None:
+            params: dict[str, Any] = {}
+            http_timeout = httpx.Timeout(5.0)
+        else:
+            params = {"after_tick": after_tick, "timeout": timeout_s}
+            http_timeout = httpx.Timeout(5.0, read=timeout_s + 5.0)
+        async with httpx.AsyncClient(timeout=http_timeout) as c:
+            r = await c.get(f"{self.base_url}/world/observation", params=params, headers=self._headers())
             r.raise_for_status()
-            return r.json()
+            return _decode(r)
 
     async def submit_action(self, action: dict[str, Any]) -> dict[str, Any]:
         async with httpx.AsyncClient() as c:
             r = await c.post(f"{self.base_url}/world/action", json=action, headers=self._headers())
             r.raise_for_status()
-            return r.json()
+            return _decode(r)
+
+    async def observations(self, api_keys: list[str]) -> dict[str, Any]:
+        """Observations for many agents in one request: {"tick": T, "items": [...]} in key order;
+        items are {"agent_id", "observation"} or carry an "error"."""
+        async with httpx.AsyncClient() as c:
+            r = await c.post(f"{self.base_url}/world/observations", json={"tokens": api_keys}, headers=self._headers())
+            r.raise_for_status()
+            return _decode(r)
+
+    async def submit_actions(self, actions: list[tuple[str, dict[str, Any]]]) -> dict[str, Any]:
+        """Submit (api_key, action) pairs in one request; per-item results come back in order."""
+        async with httpx.AsyncClient() as c:
+            r = await c.post(
+                f"{self.base_url}/world/actions",
+                json={"actions": [{"token": key, "action": action} for key, action in actions]},
+                headers=self._headers(),
+            )
+            r.raise_for_status()
+            return _decode(r)
 
+    def stream(self) -> AgentStream:
+        """Push channel: `async with client.stream() as s: async for obs in s: await s.act(...)`."""
+        if websockets is None:
+            raise RuntimeError("the websockets package is required for LastOasisClient.stream()")
+        if not self.api_key:
+            raise RuntimeError("api_key is required for LastOasisClient.stream()")
+        ws_base = "ws" + self.base_url[len("http"):] if self.base_url.startswith("http") else self.base_url
+        url = f"{ws_base}/world/stream"
+        if self.use_msgpack:
+            return AgentStream(url + "?format=msgpack", binary=True, api_key=self.api_key)
+        return AgentStream(url, api_key=self.api_key)
@@ -2,7 +2,6 @@ from __future__ import annotations
 
 import asyncio
 import os
-import time
 from typing import Any
 
 from .agent_dqn import DQNAgent
@@ -60,15 +59,8 @@ def _reward(prev_obs: dict[str, Any], next_obs: dict[str, Any]) -> tuple[float,
 
 
 async def _wait_for_tick(c: LastOasisClient, min_tick: int, timeout_s: float = 5.0) -> dict[str, Any]:
-    start = time.time()
-    while True:
-        obs = await c.observation()
-        t = int(obs.get("tick", 0))
-        if t >= min_tick:
-            return obs
-        if time.time() - start > timeout_s:
-            return obs
-        await asyncio.sleep(0.05)
+    # long-poll: the server answers as soon as the tick resolves, or with the current view on timeout
+    return await c.observation(after_tick=min_tick - 1, timeout_s=timeout_s)
 
 
 async def train_dqn_agent(episodes: int = 100, max_ticks_per_episode: int = 500) -> DQNAgent:
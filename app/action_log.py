@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from .storage import NewEvent, Storage
+
+# Action submissions are appended to a local binary log instead of being committed to storage
+# one by one. Records: u32 body length | u32 crc32(body) | body, where body is
+# i64 tick | u16 agent id length | agent id (utf-8) | action json (utf-8), little-endian.
+# A background task fsyncs the log in batches and ingests the new records into storage as
+# ACTION_SUBMITTED events; a small sidecar file remembers how far ingestion got.
+
+logger = logging.getLogger("last_oasis")
+
+_HEADER = struct.Struct("<II")
+_BODY_HEAD = struct.Struct("<qH")
+_ROTATE_BYTES = 64 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ActionRecord:
+    tick: int
+    agent_id: str
+    action: dict[str, Any]
+
+    def event(self) -> NewEvent:
+        return (self.tick, "ACTION_SUBMITTED", self.agent_id, self.action)
+
+
+def encode_record(rec: ActionRecord) -> bytes:
+    agent = rec.agent_id.encode("utf-8")
+    body = _BODY_HEAD.pack(rec.tick, len(agent)) + agent + json.dumps(rec.action, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+def decode_records(data: bytes) -> tuple[list[ActionRecord], int]:
+    """Records in `data` and the number of bytes they span; stops at a torn or corrupt tail."""
+    out: list[ActionRecord] = []
+    off = 0
+    while off + _HEADER.size <= len(data):
+        length, crc = _HEADER.unpack_from(data, off)
+        body = data[off + _HEADER.size : off + _HEADER.size + length]
+        if len(body) < length or zlib.crc32(body) != crc:
+            break
+        tick, agent_len = _BODY_HEAD.unpack_from(body, 0)
+        agent = body[_BODY_HEAD.size : _BODY_HEAD.size + agent_len].decode("utf-8")
+        action = json.loads(body[_BODY_HEAD.size + agent_len :])
+        out.append(ActionRecord(tick=tick, agent_id=agent, action=action))
+        off += _HEADER.size + length
+    return out, off
+
+
+class ActionLog:
+    def __init__(self, path: str, flush_interval_ms: int = 50) -> None:
+        self.path = Path(path)
+        self._offset_path = self.path.with_name(self.path.name + ".ingested")
+        self.flush_interval_s = max(1, int(flush_interval_ms)) / 1000.0
+        self._buf = bytearray()
+        self._records: list[ActionRecord] = []
+        self._durable: list[ActionRecord] = []  # fsynced, not yet ingested
+        self._size = 0
+        self._ingested = 0
+        self._flush_lock = asyncio.Lock()
+        self.recovered: list[ActionRecord] = []
+
+    def _read_offset(self) -> int:
+        try:
+            return int(self._offset_path.read_text(encoding="ascii").strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_offset(self, offset: int) -> None:
+        tmp = self._offset_path.with_name(self._offset_path.name + ".tmp")
+        tmp.write_text(str(offset), encoding="ascii")
+        os.replace(tmp, self._offset_path)
+
+    def _read_tail(self) -> tuple[list[ActionRecord], int]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch(exist_ok=True)
+        data = self.path.read_bytes()
+        start = self._read_offset()
+        if start > len(data):
+            start = 0  # rotated after the offset file was last written
+        records, used = decode_records(data[start:])
+        end = start + used
+        if end < len(data):
+            logger.warning("action_log_truncated path=%s kept_bytes=%s dropped_bytes=%s", self.path, end, len(data) - end)
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+        return records, end
+
+    async def recover(self, storage: Storage) -> list[ActionRecord]:
+        """Ingest records written before the last shutdown or crash but never loaded into storage.
+
+        Called once at startup, before replay, so replay sees every durable submission. A crash
+        between an ingest and its offset update re-ingests that batch; duplicate submissions for
+        the same agent and tick are harmless, the last one wins.
+        """
+        records, end = await asyncio.to_thread(self._read_tail)
+        if records:
+            await storage.insert_events([r.event() for r in records])
+        self._size = self._ingested = end
+        await asyncio.to_thread(self._write_offset, end)
+        self.recovered = records
+        return records
+
+    def pending_for(self, tick: int) -> dict[str, dict[str, Any]]:
+        """Recovered submissions queued for `tick`, as the tick loop's pending_actions."""
+        pending: dict[str, dict[str, Any]] = {}
+        for r in self.recovered:
+            if r.tick == tick:
+                pending[r.agent_id] = dict(r.action)
+        return pending
+
+    def append(self, tick: int, agent_id: str, action: dict[str, Any]) -> None:
+        """Buffer one submission; it becomes durable at the next flush."""
+        rec = ActionRecord(tick=tick, agent_id=agent_id, action=action)
+        self._buf += encode_record(rec)
+        self._records.append(rec)
+
+    def _write(self, data: bytes) -> None:
+        with open(self.path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rotate(self) -> None:
+        with open(self.path, "r+b") as f:
+            f.truncate(0)
+        self._write_offset(0)
+
+    async def flush(self, storage: Storage, db_lock: asyncio.Lock) -> int:
+        """fsync buffered records, then ingest them into storage. Returns the number flushed."""
+        async with self._flush_lock:
+            if self._records:
+                data, records = bytes(self._buf), self._records
+                self._buf, self._records = bytearray(), []
+                try:
+                    await asyncio.to_thread(self._write, data)
+                except BaseException:
+                    self._buf[:0] = data
+                    self._records[:0] = records
+                    raise
+                self._size += len(data)
+                self._durable.extend(records)
+            if not self._durable:
+                return 0
+
+            # a failed ingest keeps the batch for the next flush; the offset only moves on success
+            records = self._durable
+            async with db_lock:
+                await storage.insert_events([r.event() for r in records])
+            self._durable = []
+            self._ingested = self._size
+            if self._size >= _ROTATE_BYTES:
+                await asyncio.to_thread(self._rotate)
+                self._size = self._ingested = 0
+            else:
+                await asyncio.to_thread(self._write_offset, self._ingested)
+            return len(records)
+
+    async def run(self, storage: Storage, db_lock: asyncio.Lock) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_s)
+            try:
+                await self.flush(storage, db_lock)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("action_log_flush_failed path=%s", self.path)
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Any, Optional
+
+import httpx
+from fastapi import APIRouter, HTTPException, Request, WebSocket, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from ..settings import settings
+
+try:
+    import websockets
+except ImportError:  # pragma: no cover - ships with uvicorn[standard]
+    websockets = None
+
+# With ARENA_WORKERS > 0 the process that owns $PORT hosts no world itself. It starts that many
+# uvicorn worker processes on localhost, gives each a share of the arenas through ARENAS, and
+# forwards /arenas/<world_id>/... (and the root paths, for the root arena) to the owner.
+# make_sim_router does the same for SERVER_ROLE=api workers, towards the one simulation process.
+
+logger = logging.getLogger("last_oasis")
+
+_HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "upgrade", "host", "content-length", "te", "trailer"}
+
+
+class ArenaWorker:
+    def __init__(self, world_ids: list[str], port: int) -> None:
+        self.world_ids = world_ids
+        self.port = port
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.proc: Optional[asyncio.subprocess.Process] = None
+
+    async def start(self) -> None:
+        env = dict(os.environ)
+        env.update({"ARENAS": ",".join(self.world_ids), "ARENA_WORKERS": "0", "ARENA_ROOT": ""})
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(self.port),
+            env=env,
+        )
+
+    async def wait_ready(self, timeout_s: float = 60.0) -> None:
+        deadline = time.monotonic() + timeout_s
+        async with httpx.AsyncClient(timeout=2.0) as c:
+            while True:
+                if self.proc is not None and self.proc.returncode is not None:
+                    raise RuntimeError(f"arena worker on port {self.port} exited with {self.proc.returncode}")
+                try:
+                    r = await c.get(f"{self.base_url}/arenas")
+                    if r.status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"arena worker on port {self.port} did not become ready")
+                await asyncio.sleep(0.25)
+
+    async def stop(self) -> None:
+        if self.proc is None or self.proc.returncode is not None:
+            return
+        self.proc.terminate()
+        try:
+            await asyncio.wait_for(self.proc.wait(), 15.0)
+        except asyncio.TimeoutError:
+            self.proc.kill()
+
+
+def assign_workers(world_ids: list[str], workers: int, base_port: int) -> list[ArenaWorker]:
+    """Round-robin arenas over at most `workers` processes."""
+    n = max(1, min(workers, len(world_ids)))
+    return [ArenaWorker(world_ids[i::n], base_port + i) for i in range(n)]
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(timeout=httpx.Timeout(10.0, read=max(settings.long_poll_max_s, settings.profile_max_s) + 10.0))
+
+
+async def forward(client: httpx.AsyncClient, request: Request, url: str) -> StreamingResponse:
+    """Replay `request` against `url` and stream the upstream response back unchanged."""
+    headers = [(k, v) for k, v in request.headers.items() if k.lower() not in _HOP_HEADERS]
+    upstream = client.build_request(
+        request.method,
+        url,
+        params=request.query_params,
+        headers=headers,
+        content=await request.body(),
+    )
+    try:
+        resp = await client.send(upstream, stream=True)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail="arena_unavailable") from e
+    # raw bytes, so Content-Encoding from upstream still applies
+    return StreamingResponse(
+        resp.aiter_raw(),
+        status_code=resp.status_code,
+        headers={k: v for k, v in resp.headers.items() if k.lower() not in _HOP_HEADERS},
+        background=BackgroundTask(resp.aclose),
+    )
+
+
+async def pipe(ws: WebSocket, url: str) -> None:
+    """Bridge `ws` to the upstream WebSocket at `url` (ws://...), keeping the query and token."""
+    if websockets is None:
+        await ws.close(code=status.WS_1011_INTERNAL_ERROR)
+        return
+    query = f"?{ws.url.query}" if ws.url.query else ""
+    token = ws.headers.get("x-agent-token")
+    try:
+        up = await websockets.connect(f"{url}{query}", additional_headers={"X-AGENT-TOKEN": token} if token else None)
+    except (OSError, websockets.InvalidHandshake):
+        await ws.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await ws.accept()
+
+    async def down() -> None:
+        async for msg in up:
+            if isinstance(msg, bytes):
+                await ws.send_bytes(msg)
+            else:
+                await ws.send_text(msg)
+
+    async def upward() -> None:
+        while True:
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                return
+            await up.send(msg["bytes"] if msg.get("bytes") is not None else msg.get("text", ""))
+
+    tasks = [asyncio.create_task(down()), asyncio.create_task(upward())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await up.close()
+        try:
+            await ws.close()
+        except RuntimeError:
+            pass
+
+
+def make_proxy_router(workers: list[ArenaWorker], root_id: Optional[str]) -> APIRouter:
+    r = APIRouter()
+    owners = {wid: w for w in workers for wid in w.world_ids}
+    client = _client()
+
+    def owner(world_id: str) -> ArenaWorker:
+        w = owners.get(world_id)
+        if w is None:
+            raise HTTPException(status_code=404, detail="arena_not_found")
+        return w
+
+    @r.get("/arenas")
+    async def arenas() -> dict[str, Any]:
+        items: list[dict[str, Any]] = []
+        for w in workers:
+            try:
+                resp = await client.get(f"{w.base_url}/arenas")
+                items.extend(resp.json()["items"])
+            except (httpx.HTTPError, ValueError, KeyError):
+                items.extend({"world_id": wid, "error": "arena_unavailable"} for wid in w.world_ids)
+        return {"root": root_id, "items": items}
+
+    @r.websocket("/arenas/{world_id}/world/stream")
+    async def arena_stream(ws: WebSocket, world_id: str) -> None:
+        w = owners.get(world_id)
+        if w is None:
+            await ws.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        await pipe(ws, f"ws://127.0.0.1:{w.port}/arenas/{world_id}/world/stream")
+
+    @r.api_route("/arenas/{world_id}/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
+    async def arena_http(request: Request, world_id: str, path: str) -> StreamingResponse:
+        return await forward(client, request, f"{owner(world_id).base_url}/arenas/{world_id}/{path}")
+
+    if root_id is not None:
+
+        @r.websocket("/world/stream")
+        async def root_stream(ws: WebSocket) -> None:
+            await pipe(ws, f"ws://127.0.0.1:{owner(root_id).port}/arenas/{root_id}/world/stream")
+
+        # registered last: everything not matched by the app's own routes goes to the root arena
+        @r.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
+        async def root_http(request: Request, path: str) -> StreamingResponse:
+            return await forward(client, request, f"{owner(root_id).base_url}/arenas/{root_id}/{path}")
+
+    return r
+
+
+def make_sim_router(sim_url: str, arena_ids: list[str]) -> APIRouter:
+    """SERVER_ROLE=api: everything the local read routes do not serve goes to the simulation
+    process at the same path. Include it after those routes."""
+    r = APIRouter()
+    client = _client()
+    ws_base = "ws" + sim_url[len("http"):] if sim_url.startswith("http") else sim_url
+
+    @r.websocket("/world/stream")
+    async def root_stream(ws: WebSocket) -> None:
+        await pipe(ws, f"{ws_base}/world/stream")
+
+    @r.websocket("/arenas/{world_id}/world/stream")
+    async def arena_stream(ws: WebSocket, world_id: str) -> None:
+        if world_id not in arena_ids:
+            await ws.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        await pipe(ws, f"{ws_base}/arenas/{world_id}/world/stream")
+
+    @r.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
+    async def to_sim(request: Request, path: str) -> StreamingResponse:
+        return await forward(client, request, f"{sim_url}/{path}")
+
+    return r
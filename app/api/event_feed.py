@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Collection
+from typing import TYPE_CHECKING, Optional
+
+from ..db import DbEvent
+from .negotiation import dumps
+
+if TYPE_CHECKING:
+    from .routes import AppState
+
+logger = logging.getLogger("last_oasis")
+
+# Server-Sent Events for the events table. While anyone is watching, one task reads the rows
+# added since the last read after every tick (and at least once a second, for entries and logs
+# written between ticks), encodes each row once as an SSE message and hands the same bytes to
+# every viewer's queue. Viewers filter by type by picking messages, never by re-encoding, so the
+# cost follows the number of new events rather than viewers x page size.
+#
+# Message ids are events.id. A viewer that reconnects with Last-Event-ID first reads what it
+# missed from storage, up to the id the live feed stood at when it subscribed, then continues
+# from its queue; the two never overlap. A viewer whose queue fills up is disconnected and
+# resumes the same way.
+
+Batch = list[tuple[int, str, bytes]]  # (event id, type, encoded SSE message)
+
+PAGE = 500
+QUEUE_BATCHES = 256
+HEARTBEAT_S = 15.0
+
+
+def encode_event(e: DbEvent) -> bytes:
+    data = dumps(
+        {"id": e.id, "tick": e.tick, "type": e.type, "agent_id": e.agent_id, "payload": e.payload, "created_at": e.created_at}
+    )
+    return b"id: %d\ndata: %s\n\n" % (e.id, data)
+
+
+class EventFeed:
+    def __init__(self, app_state: "AppState") -> None:
+        self.app_state = app_state
+        self.last_id: Optional[int] = None  # newest id handed out; None while nobody watches
+        self._subscribers: set[asyncio.Queue[Optional[Batch]]] = set()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def viewers(self) -> int:
+        return len(self._subscribers)
+
+    async def subscribe(self) -> tuple[int, asyncio.Queue[Optional[Batch]]]:
+        """A queue that receives every batch after the returned id."""
+        async with self._lock:
+            if self.last_id is None:
+                newest = await self.app_state.storage.list_events(1)
+                self.last_id = newest[0].id if newest else 0
+            queue: asyncio.Queue[Optional[Batch]] = asyncio.Queue(maxsize=QUEUE_BATCHES)
+            self._subscribers.add(queue)
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self._run())
+            return self.last_id, queue
+
+    def unsubscribe(self, queue: asyncio.Queue[Optional[Batch]]) -> None:
+        self._subscribers.discard(queue)
+
+    async def _run(self) -> None:
+        ticks = self.app_state.ticks
+        version = ticks.version
+        while True:
+            version = await ticks.wait(version, timeout=1.0)
+            if not self._subscribers:
+                self.last_id = None  # stop tracking; the next subscriber starts from the newest row
+                return
+            try:
+                await self._pull()
+            except Exception:
+                logger.exception("event_feed_pull_failed after_id=%s", self.last_id)
+
+    def close(self) -> None:
+        """Stop the reader and end every open stream."""
+        if self._task is not None:
+            self._task.cancel()
+        for queue in self._subscribers:
+            self._end(queue)
+        self._subscribers.clear()
+        self.last_id = None
+
+    @staticmethod
+    def _end(queue: asyncio.Queue[Optional[Batch]]) -> None:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def _pull(self) -> None:
+        while self.last_id is not None:
+            evs = await self.app_state.storage.list_events(PAGE, after_id=self.last_id)
+            if not evs:
+                return
+            batch = [(e.id, e.type, encode_event(e)) for e in evs]
+            self.last_id = evs[-1].id
+            for queue in list(self._subscribers):
+                try:
+                    queue.put_nowait(batch)
+                except asyncio.QueueFull:
+                    # too slow: drop what it has and end its stream; it resumes from Last-Event-ID
+                    self._subscribers.discard(queue)
+                    self._end(queue)
+            if len(evs) < PAGE:
+                return
+
+    async def stream(
+        self,
+        after_id: Optional[int] = None,
+        backlog: int = 0,
+        types: Collection[str] = (),
+        exclude: Collection[str] = (),
+    ) -> AsyncIterator[bytes]:
+        """SSE bytes: events after `after_id` (or the newest `backlog`), then live ones."""
+
+        def keep(type: str) -> bool:
+            return (not types or type in types) and type not in exclude
+
+        start, queue = await self.subscribe()
+        try:
+            yield b"retry: 2000\n\n"
+            storage = self.app_state.storage
+            if after_id is not None:
+                cursor = after_id
+                while cursor < start:
+                    evs = [e for e in await storage.list_events(PAGE, after_id=cursor) if e.id <= start]
+                    if not evs:
+                        break
+                    cursor = evs[-1].id
+                    chunk = b"".join(encode_event(e) for e in evs if keep(e.type))
+                    if chunk:
+                        yield chunk
+            elif backlog > 0:
+                evs = await storage.list_events(backlog, before_id=start + 1)
+                chunk = b"".join(encode_event(e) for e in reversed(evs) if keep(e.type))
+                if chunk:
+                    yield chunk
+
+            while True:
+                try:
+                    batch = await asyncio.wait_for(queue.get(), HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"  # keeps proxies from timing out an idle stream
+                    continue
+                if batch is None:
+                    return
+                chunk = b"".join(data for _, type, data in batch if keep(type))
+                if chunk:
+                    yield chunk
+        finally:
+            self.unsubscribe(queue)
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import struct
+
+from ..world.engine import WorldState
+
+# Packed /world/grid.bin layout, little-endian:
+#
+#   header   magic "LOGB" | u8 format version | u8 dtype | u16 agent record size | i64 tick
+#            | u32 size | u32 agent count | world epoch, ascii, NUL-padded to 16 bytes   (40 bytes)
+#   tiles    degradation[size*size] | hazard[size*size] as dtype, row-major (index y*size+x),
+#            then resource[size*size] as u8 (tile resources never exceed 100)
+#   agents   agent count records of AGENT_RECORD (x, y, hp, alive, betrayals, resource, trust_score)
+#   strings  per agent, in record order: u8 len | agent_id utf-8 | u8 len | name utf-8
+#
+# dtype 0 quantizes degradation and hazard (both in [0, 1]) to u8 as round(v * 255); dtype 1
+# stores them as float16. Clients read each array with one typed-array view instead of
+# parsing tiles.
+
+MAGIC = b"LOGB"
+FORMAT_VERSION = 1
+DTYPE_U8 = 0
+DTYPE_F16 = 1
+DTYPES = {"u8": DTYPE_U8, "f16": DTYPE_F16}
+
+HEADER = struct.Struct("<4sBBHqII16s")
+AGENT_RECORD = struct.Struct("<HHhBBif")
+
+
+def _quantize(values: list[float]) -> bytes:
+    return bytes(min(255, max(0, int(v * 255 + 0.5))) for v in values)
+
+
+def _str8(s: str) -> bytes:
+    raw = s.encode("utf-8")[:255]
+    return bytes((len(raw),)) + raw
+
+
+def encode_grid(world: WorldState, agent_names: dict[str, str], dtype: str = "u8") -> bytes:
+    """The /world/grid frame as packed arrays; `dtype` is "u8" or "f16"."""
+    code = DTYPES[dtype]
+    n = world.size * world.size
+    tiles = [t for row in world.grid for t in row]
+    degradation = [float(t["degradation"]) for t in tiles]
+    hazard = [float(t["hazard"]) for t in tiles]
+    agents = list(world.agents.values())
+
+    out = bytearray(
+        HEADER.pack(
+            MAGIC, FORMAT_VERSION, code, AGENT_RECORD.size, world.tick, world.size, len(agents), world.epoch.encode("ascii")
+        )
+    )
+    if code == DTYPE_U8:
+        out += _quantize(degradation)
+        out += _quantize(hazard)
+    else:
+        out += struct.pack(f"<{n}e", *degradation)
+        out += struct.pack(f"<{n}e", *hazard)
+    out += bytes(min(255, max(0, int(t["resource"]))) for t in tiles)
+    for a in agents:
+        out += AGENT_RECORD.pack(
+            a.x,
+            a.y,
+            max(-32768, min(32767, int(a.hp))),
+            1 if a.alive else 0,
+            min(255, int(a.betrayals)),
+            int(a.inventory.get("resource", 0)),
+            float(a.trust_score),
+        )
+    for a in agents:
+        out += _str8(a.agent_id)
+        out += _str8(agent_names.get(a.agent_id, ""))
+    return bytes(out)
+
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import json
+from contextvars import ContextVar
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack responses need the optional package
+    msgpack = None
+
+# Responses are encoded as msgpack for clients that send `Accept: application/msgpack` and as
+# JSON (orjson when installed) for everyone else. The middleware records the Accept header for
+# the request being served so NegotiatedResponse can pick the encoding without each route
+# taking the request as a parameter.
+
+MSGPACK = "application/msgpack"
+_MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+
+_accept: ContextVar[str] = ContextVar("last_oasis_accept", default="")
+
+
+def dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def packb(payload: Any) -> bytes:
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def accepts_msgpack(accept: str) -> bool:
+    if msgpack is None:
+        return False
+    for part in accept.split(","):
+        media, _, params = part.strip().partition(";")
+        if media.strip().lower() in _MSGPACK_TYPES and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            return True
+    return False
+
+
+def wants_msgpack() -> bool:
+    """Whether the request being served asked for msgpack (and the server can produce it)."""
+    return accepts_msgpack(_accept.get())
+
+
+class NegotiationMiddleware:
+    """Plain ASGI middleware, so the context variable is set in the task that runs the route."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope.get("headers") or ():
+            if name == b"accept":
+                accept = value.decode("latin-1")
+                break
+        token = _accept.set(accept)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _accept.reset(token)
+
+
+class NegotiatedResponse(JSONResponse):
+    """JSON or msgpack depending on the request's Accept header.
+
+    Returning one directly from a route also skips FastAPI's jsonable_encoder pass, which is
+    most of the cost for large plain-dict payloads such as observations.
+    """
+
+    def __init__(self, content: Any, *args: Any, **kwargs: Any) -> None:
+        self._msgpack = wants_msgpack()
+        if self._msgpack and kwargs.get("media_type") is None:
+            kwargs["media_type"] = MSGPACK
+        super().__init__(content, *args, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        return packb(content) if self._msgpack else dumps(content)
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable
+
+from ..settings import Settings
+
+# Per-agent token buckets, one per route class, checked right after the token lookup and before
+# a request touches world_lock or db_lock. Buckets are keyed by agent_id (one per API token) so
+# the exported counters never contain tokens. A bucket holds up to `burst` tokens and refills
+# at `rate` per second; a class with rate 0 is not limited.
+
+@dataclass
+class TokenBucket:
+    tokens: float
+    updated: float
+
+
+class RateLimiter:
+    def __init__(self, limits: dict[str, tuple[float, float]], clock: Callable[[], float] = time.monotonic) -> None:
+        self.limits = {k: (rate, max(1.0, burst)) for k, (rate, burst) in limits.items() if rate > 0}
+        self.clock = clock
+        self._buckets: dict[tuple[str, str], TokenBucket] = {}
+        self.allowed: Counter[str] = Counter()
+        self.rejected: Counter[str] = Counter()
+        self.rejected_by_agent: Counter[str] = Counter()
+
+    @classmethod
+    def from_settings(cls, s: Settings) -> "RateLimiter":
+        return cls({
+            "observation": (s.rate_limit_observation_per_s, s.rate_limit_observation_burst),
+            "action": (s.rate_limit_action_per_s, s.rate_limit_action_burst),
+        })
+
+    def allow(self, route_class: str, key: str, cost: float = 1.0) -> bool:
+        limit = self.limits.get(route_class)
+        if limit is None:
+            return True
+        rate, burst = limit
+        now = self.clock()
+        bucket = self._buckets.get((route_class, key))
+        if bucket is None:
+            bucket = self._buckets[(route_class, key)] = TokenBucket(tokens=burst, updated=now)
+        else:
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            self.allowed[route_class] += 1
+            return True
+        self.rejected[route_class] += 1
+        self.rejected_by_agent[key] += 1
+        return False
+
+    def clear(self) -> None:
+        """Drop every bucket, e.g. when reset-world revokes all tokens; counters are kept."""
+        self._buckets.clear()
+        self.rejected_by_agent.clear()
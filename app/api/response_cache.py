@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import gzip
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional
+
+from fastapi.responses import Response
+
+from .negotiation import MSGPACK, dumps, packb
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional, gzip is always available
+    brotli = None
+
+# Read endpoints return the same body to every viewer until the world changes, so each body is
+# encoded once per world version (plus gzip/brotli variants) and later requests get the bytes as-is.
+# Query parameters are part of the key and an idle world keeps its version for a long time, so
+# the entries for one version are capped, least recently used first out.
+
+_COMPRESS_MIN_BYTES = 512
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> set[str]:
+    out: set[str] = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        if coding:
+            out.add(coding.strip().lower())
+    return out
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    etag: str
+    raw: bytes
+    media_type: str = "application/json"
+    gzip: Optional[bytes] = None
+    br: Optional[bytes] = None
+
+    @classmethod
+    def encode(cls, etag: str, payload: Any, msgpack: bool = False) -> "CachedBody":
+        """JSON- or msgpack-encode `payload`; bytes (an already packed body) are kept as they are."""
+        if isinstance(payload, bytes):
+            raw, media_type = payload, "application/octet-stream"
+        elif msgpack:
+            raw, media_type = packb(payload), MSGPACK
+        else:
+            raw, media_type = dumps(payload), "application/json"
+        if len(raw) < _COMPRESS_MIN_BYTES:
+            return cls(etag=etag, raw=raw, media_type=media_type)
+        return cls(
+            etag=etag,
+            raw=raw,
+            media_type=media_type,
+            gzip=gzip.compress(raw, compresslevel=6, mtime=0),
+            br=brotli.compress(raw, quality=5) if brotli is not None else None,
+        )
+
+    def response(self, accept_encoding: Optional[str] = None, if_none_match: Optional[str] = None) -> Response:
+        # each content-coding is a different representation, so it gets its own strong ETag
+        accepted = accepted_encodings(accept_encoding)
+        body, coding, suffix = self.raw, None, ""
+        if self.br is not None and "br" in accepted:
+            body, coding, suffix = self.br, "br", "-br"
+        elif self.gzip is not None and "gzip" in accepted:
+            body, coding, suffix = self.gzip, "gzip", "-gz"
+        etag = f'{self.etag[:-1]}{suffix}"' if suffix else self.etag
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+        if if_none_match is not None and etag in (t.strip() for t in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        if coding is not None:
+            headers["Content-Encoding"] = coding
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+
+class ResponseCache:
+    """Encoded bodies for the current world version; everything is dropped when the version moves."""
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._version: Optional[tuple[str, int]] = None
+        self._bodies: OrderedDict[Hashable, CachedBody] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: tuple[str, int]) -> Optional[CachedBody]:
+        if version != self._version:
+            self._version = version
+            self._bodies.clear()
+            return None
+        body = self._bodies.get(key)
+        if body is not None:
+            self._bodies.move_to_end(key)
+            self.hits += 1
+        return body
+
+    def put(self, key: Hashable, version: tuple[str, int], payload: Any, msgpack: bool = False) -> CachedBody:
+        self.misses += 1
+        epoch, ver = version
+        body = CachedBody.encode(f'"{epoch}-{ver}{"-m" if msgpack else ""}"', payload, msgpack)
+        if version == self._version:
+            self._bodies[key] = body
+            if len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+        return body
+
+    def __len__(self) -> int:
+        return len(self._bodies)
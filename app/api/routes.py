@@ -1,29 +1,73 @@
 from __future__ import annotations
 
 import asyncio
+import json
+import math
 import uuid
-from dataclasses import dataclass
-from typing import Any, Optional
-
-import aiosqlite
-from fastapi import APIRouter, Body, Depends, Header, HTTPException
-from pydantic import BaseModel, Field
-
-from ..db import insert_entry, insert_event, list_events, upsert_agent
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Optional
+
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    WebSocketException,
+    status,
+)
+from fastapi.responses import Response, StreamingResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, Field, ValidationError
+
+from .. import profiler
+from ..action_log import ActionLog
+from ..db import EventFilter
+from ..scheduler import TickScheduler
 from ..settings import settings
+from ..shared_world import WorldPublisher
 from ..chain.entry_fee import verify_entry_paid
-from ..world.engine import WorldState, extract_observation
+from ..storage import NewEvent, Storage
+from ..world.engine import AgentState, WorldState, extract_observation
+from ..world.history import WorldHistory
 from ..world.snapshot import maybe_snapshot
+from .event_feed import EventFeed
+from .grid_binary import DTYPES, encode_grid
+from .negotiation import NegotiatedResponse, dumps, msgpack, packb, wants_msgpack
+from .ratelimit import RateLimiter
+from .response_cache import ResponseCache
+from .ticks import Lockstep, TickSignal
 
 
 @dataclass
 class AppState:
-    conn: aiosqlite.Connection
+    storage: Storage
     world: WorldState
     world_lock: asyncio.Lock
     db_lock: asyncio.Lock
     pending_actions: dict[str, dict[str, Any]]
     agent_names: dict[str, str]
+    # api_key -> agent_id, mirrors the agents table so auth never touches the database
+    tokens: dict[str, str] = field(default_factory=dict)
+    history: WorldHistory = field(default_factory=lambda: WorldHistory(settings.time_travel_cache_size))
+    # when set, submissions go to the local action log and reach storage in batches
+    action_log: Optional[ActionLog] = None
+    ticks: TickSignal = field(default_factory=TickSignal)
+    # encoded bodies of the read endpoints for the current world version
+    responses: ResponseCache = field(default_factory=ResponseCache)
+    limiter: RateLimiter = field(default_factory=lambda: RateLimiter.from_settings(settings))
+    # drives the arena's tick loop; None when ticks only come from /admin/tick
+    scheduler: Optional[TickScheduler] = None
+    # set in lockstep mode: wakes the tick loop once every alive agent has acted
+    lockstep: Optional[Lockstep] = None
+    # SERVER_ROLE=sim: copies every world version to shared memory for the API workers
+    publisher: Optional[WorldPublisher] = None
+    # pushes new events to /admin/events/stream viewers; created with the first router
+    feed: Optional[EventFeed] = None
 
 
 class EntryQuoteOut(BaseModel):
@@ -52,26 +96,219 @@ class ActionIn(BaseModel):
     amount: Optional[int] = None
 
 
+class BatchObservationIn(BaseModel):
+    tokens: list[str] = Field(max_length=settings.batch_max_agents)
+
+
+class BatchActionItem(BaseModel):
+    token: str
+    action: ActionIn
+
+
+class BatchActionIn(BaseModel):
+    actions: list[BatchActionItem] = Field(max_length=settings.batch_max_agents)
+
+
+
+def _tile_view(world: WorldState, x: int, y: int) -> dict[str, Any]:
+    t = world.grid[y][x]
+    return {
+        "x": x,
+        "y": y,
+        "degradation": round(float(t["degradation"]), 4),
+        "resource": int(t["resource"]),
+        "hazard": round(float(t["hazard"]), 4),
+    }
+
+
+def _agent_view(a: AgentState, agent_names: dict[str, str]) -> dict[str, Any]:
+    return {
+        "agent_id": a.agent_id,
+        "name": agent_names.get(a.agent_id, ""),
+        "x": a.x,
+        "y": a.y,
+        "hp": a.hp,
+        "alive": a.alive,
+        "resource": a.inventory.get("resource", 0),
+        "score": a.hp + a.inventory.get("resource", 0),
+        "trust_score": round(a.trust_score, 1),
+        "betrayals": a.betrayals,
+    }
+
+
+def grid_payload(world: WorldState, agent_names: dict[str, str]) -> dict[str, Any]:
+    size = world.size
+    tiles = [_tile_view(world, x, y) for y in range(size) for x in range(size)]
+    agents_pos = [_agent_view(a, agent_names) for a in world.agents.values()]
+    return {"tick": world.tick, "size": size, "tiles": tiles, "agents": agents_pos}
+
+
+def grid_delta_payload(world: WorldState, agent_names: dict[str, str], since_tick: int) -> dict[str, Any]:
+    """Only the tiles and agents whose dirty stamp is newer than `since_tick`."""
+    size = world.size
+    tiles = [
+        _tile_view(world, i % size, i // size) for i, stamp in enumerate(world.tile_changed) if stamp > since_tick
+    ]
+    agents_pos = [
+        _agent_view(a, agent_names)
+        for aid, a in world.agents.items()
+        if world.agent_changed.get(aid, 0) > since_tick
+    ]
+    return {"tick": world.tick, "size": size, "since_tick": since_tick, "tiles": tiles, "agents": agents_pos}
+
+
+def status_payload(world: WorldState) -> dict[str, Any]:
+    alive = sum(1 for a in world.agents.values() if a.alive)
+    avg_deg = 0.0
+    c = 0
+    for row in world.grid:
+        for tile in row:
+            avg_deg += float(tile["degradation"])
+            c += 1
+    avg_deg = avg_deg / max(1, c)
+    return {"tick": world.tick, "alive_agents": alive, "avg_degradation": avg_deg}
+
+
+def leaderboard_payload(
+    world: WorldState,
+    agent_names: dict[str, str],
+    offset: int = 0,
+    limit: Optional[int] = 20,
+    agent_id: Optional[str] = None,
+) -> dict[str, Any]:
+    """A page of the score ranking (alive first, then hp + resource); `agent_id` adds that agent's rank."""
+    items = []
+    for pos, aid in enumerate(world.leaderboard.page(offset, limit), start=max(0, offset) + 1):
+        a = world.agents[aid]
+        score = int(a.hp) + int(a.inventory.get("resource", 0))
+        items.append({"rank": pos, "agent_id": a.agent_id, "name": agent_names.get(a.agent_id, ""), "alive": a.alive, "hp": a.hp, "resource": a.inventory.get("resource", 0), "score": score})
+    out: dict[str, Any] = {"tick": world.tick, "total": len(world.leaderboard), "items": items}
+    if agent_id is not None:
+        out["agent_rank"] = _rank(world.leaderboard.rank(agent_id))
+    return out
+
+
+def agents_payload(world: WorldState) -> dict[str, Any]:
+    agents_out = []
+    for a in world.agents.values():
+        agents_out.append({
+            "agent_id": a.agent_id,
+            "x": a.x,
+            "y": a.y,
+            "hp": a.hp,
+            "alive": a.alive,
+            "inventory": dict(a.inventory),
+        })
+    return {"tick": world.tick, "agents": agents_out}
+
+
+def market_payload(world: WorldState) -> dict[str, Any]:
+    total_resources = sum(tile["resource"] for row in world.grid for tile in row)
+    total_degradation = sum(tile["degradation"] for row in world.grid for tile in row)
+    avg_deg = total_degradation / (world.size * world.size)
+
+    total_agent_resources = sum(a.inventory.get("resource", 0) for a in world.agents.values() if a.alive)
+
+    return {
+        "tick": world.tick,
+        "market_price": round(world.market_price, 3),
+        "total_world_resources": total_resources,
+        "total_agent_resources": total_agent_resources,
+        "avg_degradation": round(avg_deg, 4),
+        "recent_trades_count": len(world.recent_trades),
+    }
+
+
+def reputation_payload(
+    world: WorldState,
+    agent_names: dict[str, str],
+    offset: int = 0,
+    limit: Optional[int] = None,
+    agent_id: Optional[str] = None,
+) -> dict[str, Any]:
+    """A page of the trust_score ranking (all agents by default); `agent_id` adds that agent's rank."""
+    items = []
+    for pos, aid in enumerate(world.reputation.page(offset, limit), start=max(0, offset) + 1):
+        a = world.agents[aid]
+        items.append({
+            "rank": pos,
+            "agent_id": a.agent_id,
+            "name": agent_names.get(a.agent_id, ""),
+            "trust_score": round(a.trust_score, 1),
+            "betrayals": a.betrayals,
+            "trade_count": len(a.trade_history),
+            "alive": a.alive,
+        })
+    out: dict[str, Any] = {"tick": world.tick, "total": len(world.reputation), "items": items}
+    if agent_id is not None:
+        out["agent_rank"] = _rank(world.reputation.rank(agent_id))
+    return out
+
+
+def _rank(pos: Optional[int]) -> Optional[int]:
+    return None if pos is None else pos + 1
+
+
+def resolved_tick_events(tick: int, actions: dict[str, Any], events: list[dict[str, Any]]) -> list[NewEvent]:
+    """The TICK_RESOLVED record plus one row per engine event, written as a single batch."""
+    rows: list[NewEvent] = [(tick, "TICK_RESOLVED", None, {"actions": actions, "events": events})]
+    rows.extend((tick, str(e.get("type") or "EVENT"), e.get("agent_id"), e) for e in events)
+    return rows
+
 
 def make_router(app_state: AppState) -> APIRouter:
-    r = APIRouter()
+    r = APIRouter(default_response_class=NegotiatedResponse)
+    if app_state.feed is None:
+        app_state.feed = EventFeed(app_state)
+    feed = app_state.feed
 
     async def auth(x_agent_token: Optional[str] = Header(default=None)) -> str:
         if not x_agent_token:
             raise HTTPException(status_code=401, detail="missing_x_agent_token")
-        agent_id = None
-        async with app_state.db_lock:
-            cur = await app_state.conn.execute(
-                "SELECT agent_id FROM agents WHERE api_key = ? LIMIT 1",
-                (x_agent_token,),
-            )
-            row = await cur.fetchone()
-        if row is not None:
-            agent_id = str(row["agent_id"])
+        agent_id = app_state.tokens.get(x_agent_token)
         if agent_id is None:
             raise HTTPException(status_code=401, detail="invalid_token")
         return agent_id
 
+    def rate_limit_error() -> HTTPException:
+        # more requests before the next tick cannot see anything new
+        if app_state.scheduler is not None:
+            retry = math.ceil(app_state.scheduler.until_next())
+        else:
+            retry = math.ceil(app_state.ticks.until_next(settings.tick_interval_ms / 1000.0))
+        return HTTPException(status_code=429, detail="rate_limited", headers={"Retry-After": str(max(1, retry))})
+
+    def limited(route_class: str) -> Callable[..., Any]:
+        """`auth` plus the agent's token bucket for `route_class`."""
+
+        async def dep(agent_id: str = Depends(auth)) -> str:
+            if not app_state.limiter.allow(route_class, agent_id):
+                raise rate_limit_error()
+            return agent_id
+
+        return dep
+
+    async def cached_read(
+        request: Request, key: Hashable | Callable[[WorldState], Hashable], build: Callable[[WorldState], Any]
+    ) -> Response:
+        """Serve `build(world)` from the per-version response cache, building it on the first miss.
+
+        `key` may be a function of the world when the body a query gets depends on the world.
+        """
+        async with app_state.world_lock:
+            world = app_state.world
+            version = (world.epoch, world.version)
+            if callable(key):
+                key = key(world)
+            binary = wants_msgpack()
+            body = app_state.responses.get((key, binary), version)
+            payload = build(world) if body is None else None
+        if body is None:
+            # nothing awaits between releasing the lock and put(), so other readers of this
+            # version queue on the lock and then find the body instead of rebuilding it
+            body = app_state.responses.put((key, binary), version, payload, binary)
+        return body.response(request.headers.get("accept-encoding"), request.headers.get("if-none-match"))
+
     @r.post("/entry/quote", response_model=EntryQuoteOut)
     async def entry_quote() -> EntryQuoteOut:
         return EntryQuoteOut(
@@ -119,173 +356,333 @@ def make_router(app_state: AppState) -> APIRouter:
             if agent_id not in app_state.world.agents:
                 app_state.world.add_agent(agent_id)
             agent_state = app_state.world.agents[agent_id].to_dict()
+            # the tick the agent joined after; another tick may resolve before db_lock is ours
+            tick = app_state.world.tick
+            rearm_locked()
+            # set with the agent so cached responses for this world version already carry the name
+            if body.name:
+                app_state.agent_names[agent_id] = body.name
         if body.name:
             agent_state["name"] = body.name
-            app_state.agent_names[agent_id] = body.name
         if agent_address:
             agent_state["wallet_address"] = agent_address
 
         async with app_state.db_lock:
-            await upsert_agent(app_state.conn, agent_id, api_key, agent_state)
-            await insert_entry(
-                app_state.conn, body.tx_ref, agent_id, settings.entry_price_asset, settings.entry_price_amount
-            )
-            await insert_event(
-                app_state.conn,
-                tick=app_state.world.tick,
-                type="AGENT_ENTERED",
-                agent_id=agent_id,
-                payload={"agent_id": agent_id, "name": body.name or agent_id},
+            await app_state.storage.upsert_agent(agent_id, api_key, agent_state)
+            app_state.tokens[api_key] = agent_id
+            await app_state.storage.insert_entry(
+                body.tx_ref, agent_id, settings.entry_price_asset, settings.entry_price_amount
             )
+            # The reset happened before the agent was added; log it first so replay applies them in order
             if did_reset:
-                await insert_event(
-                    app_state.conn,
-                    tick=app_state.world.tick,
+                await app_state.storage.insert_event(
+                    tick=tick,
                     type="WORLD_RESET_IF_EXTINCT",
                     payload={"reason": "no_alive_agents"},
                 )
+            await app_state.storage.insert_event(
+                tick=tick,
+                type="AGENT_ENTERED",
+                agent_id=agent_id,
+                payload={"agent_id": agent_id, "name": body.name or agent_id},
+            )
+        publish()
 
         return EntryConfirmOut(agent_id=agent_id, api_key=api_key)
 
     @r.get("/world/observation")
-    async def world_observation(agent_id: str = Depends(auth)) -> dict[str, Any]:
+    async def world_observation(
+        agent_id: str = Depends(limited("observation")),
+        after_tick: Optional[int] = None,
+        timeout: float = 25.0,
+    ) -> Response:
+        """With `after_tick`, blocks until the world passes that tick or `timeout` seconds elapse,
+        then returns the current observation either way."""
+        if after_tick is not None:
+            async with app_state.world_lock:
+                current = app_state.world.tick
+            if current <= after_tick:
+                await app_state.ticks.wait_for_tick(after_tick, max(0.0, min(timeout, settings.long_poll_max_s)))
         async with app_state.world_lock:
             obs = extract_observation(app_state.world, agent_id, settings.obs_radius)
         if obs is None:
             raise HTTPException(status_code=404, detail="agent_not_found")
-        return obs
+        return NegotiatedResponse(obs)
 
-    @r.post("/world/action")
-    async def world_action(body: ActionIn = Body(...), agent_id: str = Depends(auth)) -> dict[str, Any]:
-        action = body.model_dump(exclude_none=True)
-        async with app_state.world_lock:
-            if agent_id not in app_state.world.agents:
-                raise HTTPException(status_code=404, detail="agent_not_found")
-            if not app_state.world.agents[agent_id].alive:
-                raise HTTPException(status_code=403, detail="agent_dead")
-            app_state.pending_actions[agent_id] = action
-            target_tick = app_state.world.tick + 1
+    def publish() -> None:
+        # after anything replicas must see (ticks, entries, resets), before the response goes out
+        if app_state.publisher is not None:
+            app_state.publisher.publish(app_state)
+
+    def rearm_locked() -> None:
+        # caller holds world_lock; the set of alive agents may have changed
+        if app_state.lockstep is not None:
+            app_state.lockstep.arm(app_state.world, app_state.pending_actions)
+
+    def queue_locked(agent_id: str, action: dict[str, Any]) -> int:
+        # caller holds world_lock
+        if agent_id not in app_state.world.agents:
+            raise HTTPException(status_code=404, detail="agent_not_found")
+        if not app_state.world.agents[agent_id].alive:
+            raise HTTPException(status_code=403, detail="agent_dead")
+        app_state.pending_actions[agent_id] = action
+        if app_state.lockstep is not None:
+            app_state.lockstep.acted(agent_id)
+        return app_state.world.tick + 1
+
+    async def record_actions(queued: list[tuple[int, str, dict[str, Any]]]) -> None:
+        """Log (target_tick, agent_id, action) submissions: to the action log, or storage in one batch."""
+        if not queued:
+            return
+        if app_state.action_log is not None:
+            for target_tick, agent_id, action in queued:
+                app_state.action_log.append(target_tick, agent_id, action)
+            return
         async with app_state.db_lock:
-            await insert_event(
-                app_state.conn,
-                tick=target_tick,
-                type="ACTION_SUBMITTED",
-                agent_id=agent_id,
-                payload=action,
+            await app_state.storage.insert_events(
+                [(target_tick, "ACTION_SUBMITTED", agent_id, action) for target_tick, agent_id, action in queued]
             )
+
+    async def queue_action(agent_id: str, action: dict[str, Any]) -> int:
+        async with app_state.world_lock:
+            target_tick = queue_locked(agent_id, action)
+        await record_actions([(target_tick, agent_id, action)])
+        return target_tick
+
+    @r.post("/world/action")
+    async def world_action(body: ActionIn = Body(...), agent_id: str = Depends(limited("action"))) -> dict[str, Any]:
+        target_tick = await queue_action(agent_id, body.model_dump(exclude_none=True))
         return {"ok": True, "queued_for_tick": target_tick}
 
-    @r.get("/world/status")
-    async def world_status() -> dict[str, Any]:
+    @r.post("/world/observations")
+    async def world_observations(body: BatchObservationIn = Body(...)) -> Response:
+        """Observations for many agents under one world_lock acquisition, in request order.
+        Unknown tokens and missing agents get an `error` item instead of failing the batch."""
+        agent_ids = [app_state.tokens.get(t) for t in body.tokens]
+        items: list[dict[str, Any]] = []
+        async with app_state.world_lock:
+            tick = app_state.world.tick
+            for agent_id in agent_ids:
+                if agent_id is None:
+                    items.append({"error": "invalid_token"})
+                    continue
+                if not app_state.limiter.allow("observation", agent_id):
+                    items.append({"agent_id": agent_id, "error": "rate_limited"})
+                    continue
+                obs = extract_observation(app_state.world, agent_id, settings.obs_radius)
+                if obs is None:
+                    items.append({"agent_id": agent_id, "error": "agent_not_found"})
+                else:
+                    items.append({"agent_id": agent_id, "observation": obs})
+        return NegotiatedResponse({"tick": tick, "items": items})
+
+    @r.post("/world/actions")
+    async def world_actions(body: BatchActionIn = Body(...)) -> dict[str, Any]:
+        """Actions for many agents: one world_lock acquisition and one storage write for the batch."""
+        items: list[dict[str, Any]] = []
+        queued: list[tuple[int, str, dict[str, Any]]] = []
         async with app_state.world_lock:
-            alive = sum(1 for a in app_state.world.agents.values() if a.alive)
-            avg_deg = 0.0
-            c = 0
-            for row in app_state.world.grid:
-                for tile in row:
-                    avg_deg += float(tile["degradation"])
-                    c += 1
-            avg_deg = avg_deg / max(1, c)
-            return {"tick": app_state.world.tick, "alive_agents": alive, "avg_degradation": avg_deg}
+            for item in body.actions:
+                agent_id = app_state.tokens.get(item.token)
+                if agent_id is None:
+                    items.append({"ok": False, "error": "invalid_token"})
+                    continue
+                if not app_state.limiter.allow("action", agent_id):
+                    items.append({"ok": False, "agent_id": agent_id, "error": "rate_limited"})
+                    continue
+                action = item.action.model_dump(exclude_none=True)
+                try:
+                    target_tick = queue_locked(agent_id, action)
+                except HTTPException as e:
+                    items.append({"ok": False, "agent_id": agent_id, "error": e.detail})
+                    continue
+                queued.append((target_tick, agent_id, action))
+                items.append({"ok": True, "agent_id": agent_id, "queued_for_tick": target_tick})
+        await record_actions(queued)
+        return {"queued": len(queued), "items": items}
+
+    @r.websocket("/world/stream")
+    async def world_stream(
+        ws: WebSocket,
+        token: Optional[str] = None,
+        format: str = "json",
+        x_agent_token: Optional[str] = Header(default=None),
+    ) -> None:
+        """Pushes the agent's observation after every tick and accepts actions on the same socket.
+
+        Server messages: {"type": "observation", "observation": ...}, {"type": "ack", "queued_for_tick": N},
+        {"type": "error", "detail": ...}. Client messages: {"type": "action", "action": {...}}.
+        Clients that can set headers send X-AGENT-TOKEN; ?token= is for browsers, which cannot, and
+        puts the key in access logs.
+        With ?format=msgpack both directions use msgpack in binary frames instead of JSON text.
+        """
+        agent_id = app_state.tokens.get(x_agent_token or token or "")
+        if agent_id is None:
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="invalid_token")
+        binary = format == "msgpack" and msgpack is not None
+        await ws.accept()
+
+        async def send(msg: dict[str, Any]) -> None:
+            if binary:
+                await ws.send_bytes(packb(msg))
+            else:
+                await ws.send_text(dumps(msg).decode("utf-8"))
+
+        async def push() -> None:
+            version = -1
+            while True:
+                # ticks that pass while a slow client is still sending collapse into the latest one
+                version = await app_state.ticks.wait(version)
+                async with app_state.world_lock:
+                    obs = extract_observation(app_state.world, agent_id, settings.obs_radius)
+                if obs is None:
+                    await send({"type": "error", "detail": "agent_not_found"})
+                    return
+                await send({"type": "observation", "observation": obs})
+
+        async def receive() -> None:
+            while True:
+                if binary:
+                    try:
+                        msg = msgpack.unpackb(await ws.receive_bytes())
+                    except (KeyError, TypeError, ValueError):  # text frame or not msgpack
+                        msg = None
+                else:
+                    try:
+                        msg = json.loads(await ws.receive_text())
+                    except (KeyError, ValueError):  # binary frame or not JSON
+                        msg = None
+                if not isinstance(msg, dict) or msg.get("type") != "action":
+                    await send({"type": "error", "detail": "unknown_message_type"})
+                    continue
+                if not app_state.limiter.allow("action", agent_id):
+                    await send({"type": "error", "detail": "rate_limited"})
+                    continue
+                try:
+                    action = ActionIn.model_validate(msg.get("action") or {}).model_dump(exclude_none=True)
+                    target_tick = await queue_action(agent_id, action)
+                except ValidationError:
+                    await send({"type": "error", "detail": "invalid_action"})
+                except HTTPException as e:
+                    await send({"type": "error", "detail": e.detail})
+                else:
+                    await send({"type": "ack", "queued_for_tick": target_tick})
+
+        tasks = [asyncio.create_task(push()), asyncio.create_task(receive())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for t in tasks:
+                t.cancel()
+        for t in done:
+            if not t.cancelled() and isinstance(t.exception(), (WebSocketDisconnect, RuntimeError)):
+                return  # client went away
+        try:
+            await ws.close()
+        except RuntimeError:
+            pass
+
+    @r.get("/world/status")
+    async def world_status(request: Request) -> Response:
+        return await cached_read(request, "status", status_payload)
 
     @r.get("/world/leaderboard")
-    async def world_leaderboard() -> dict[str, Any]:
-        async with app_state.world_lock:
-            items = []
-            for a in app_state.world.agents.values():
-                score = int(a.hp) + int(a.inventory.get("resource", 0))
-                items.append({"agent_id": a.agent_id, "name": app_state.agent_names.get(a.agent_id, ""), "alive": a.alive, "hp": a.hp, "resource": a.inventory.get("resource", 0), "score": score})
-            items.sort(key=lambda x: (x["alive"], x["score"]), reverse=True)
-            return {"tick": app_state.world.tick, "items": items[:20]}
+    async def world_leaderboard(
+        request: Request,
+        offset: int = Query(default=0, ge=0),
+        limit: int = Query(default=20, ge=1, le=1000),
+        agent_id: Optional[str] = None,
+    ) -> Response:
+        """Ranked by score; page with `offset`/`limit`, `agent_id` adds `agent_rank` (1-based)."""
+        return await cached_read(
+            request,
+            ("leaderboard", offset, limit, agent_id),
+            lambda w: leaderboard_payload(w, app_state.agent_names, offset, limit, agent_id),
+        )
 
     @r.get("/world/agents")
-    async def world_agents() -> dict[str, Any]:
-        async with app_state.world_lock:
-            agents_out = []
-            for a in app_state.world.agents.values():
-                agents_out.append({
-                    "agent_id": a.agent_id,
-                    "x": a.x,
-                    "y": a.y,
-                    "hp": a.hp,
-                    "alive": a.alive,
-                    "inventory": dict(a.inventory),
-                })
-            return {"tick": app_state.world.tick, "agents": agents_out}
+    async def world_agents(request: Request) -> Response:
+        return await cached_read(request, "agents", agents_payload)
 
     @r.get("/world/grid")
-    async def world_grid() -> dict[str, Any]:
+    async def world_grid(request: Request, since_tick: Optional[int] = None, epoch: Optional[str] = None) -> Response:
+        """Full grid, or with `since_tick` and `epoch` from an earlier response only what changed since.
+
+        A full frame (`"full": true`) replaces client state; it is sent when the epoch differs (reset or
+        restart) or the client is more than GRID_DELTA_MAX_TICKS behind. The ETag changes with every
+        world mutation, so an unchanged world answers If-None-Match with 304.
+        """
+
+        def full(world: WorldState) -> bool:
+            return (
+                since_tick is None
+                or epoch != world.epoch
+                or since_tick > world.tick
+                or world.tick - since_tick > settings.grid_delta_max_ticks
+            )
+
+        def build(world: WorldState) -> dict[str, Any]:
+            if full(world):
+                payload = grid_payload(world, app_state.agent_names)
+                payload["full"] = True
+            else:
+                payload = grid_delta_payload(world, app_state.agent_names, since_tick)
+                payload["full"] = False
+            payload["epoch"] = world.epoch
+            return payload
+
+        # viewers polling in step send the same since_tick, so each delta is built once per version;
+        # every request that gets a full frame (any stale or bogus epoch) shares one entry
+        return await cached_read(
+            request, lambda w: ("grid", "full") if full(w) else ("grid", since_tick), build
+        )
+
+    @r.get("/world/grid.bin")
+    async def world_grid_bin(request: Request, dtype: str = "u8") -> Response:
+        """The full /world/grid frame as packed arrays (layout in api/grid_binary.py)."""
+        if dtype not in DTYPES:
+            raise HTTPException(status_code=400, detail="invalid_dtype")
+        return await cached_read(
+            request, ("grid.bin", dtype), lambda w: encode_grid(w, app_state.agent_names, dtype)
+        )
+
+    @r.get("/world/at/{tick}")
+    async def world_at(tick: int) -> dict[str, Any]:
+        """The /world/grid view of the world as it was at an earlier tick."""
         async with app_state.world_lock:
-            size = app_state.world.size
-            tiles: list[dict[str, Any]] = []
-            for y in range(size):
-                for x in range(size):
-                    t = app_state.world.grid[y][x]
-                    tiles.append({
-                        "x": x,
-                        "y": y,
-                        "degradation": round(float(t["degradation"]), 4),
-                        "resource": int(t["resource"]),
-                        "hazard": round(float(t["hazard"]), 4),
-                    })
-            agents_pos = []
-            for a in app_state.world.agents.values():
-                score = a.hp + a.inventory.get("resource", 0)
-                agents_pos.append({
-                    "agent_id": a.agent_id,
-                    "name": app_state.agent_names.get(a.agent_id, ""),
-                    "x": a.x,
-                    "y": a.y,
-                    "hp": a.hp,
-                    "alive": a.alive,
-                    "resource": a.inventory.get("resource", 0),
-                    "score": score,
-                    "trust_score": round(a.trust_score, 1),
-                    "betrayals": a.betrayals,
-                })
-            return {"tick": app_state.world.tick, "size": size, "tiles": tiles, "agents": agents_pos}
+            current_tick = app_state.world.tick
+            if tick == current_tick:
+                return grid_payload(app_state.world, app_state.agent_names)
+        if tick < 0 or tick > current_tick:
+            raise HTTPException(status_code=404, detail="tick_out_of_range")
+        world = await app_state.history.at(app_state.storage, tick)
+        if world is None:
+            raise HTTPException(status_code=404, detail="tick_not_retained")
+        return grid_payload(world, app_state.agent_names)
 
     @r.get("/world/market")
-    async def world_market() -> dict[str, Any]:
+    async def world_market(request: Request) -> Response:
         """Get current market price and economic stats"""
-        async with app_state.world_lock:
-            total_resources = sum(tile["resource"] for row in app_state.world.grid for tile in row)
-            total_degradation = sum(tile["degradation"] for row in app_state.world.grid for tile in row)
-            avg_deg = total_degradation / (app_state.world.size * app_state.world.size)
-
-            total_agent_resources = sum(a.inventory.get("resource", 0) for a in app_state.world.agents.values() if a.alive)
-
-            return {
-                "tick": app_state.world.tick,
-                "market_price": round(app_state.world.market_price, 3),
-                "total_world_resources": total_resources,
-                "total_agent_resources": total_agent_resources,
-                "avg_degradation": round(avg_deg, 4),
-                "recent_trades_count": len(app_state.world.recent_trades),
-            }
+        return await cached_read(request, "market", market_payload)
 
     @r.get("/world/reputation")
-    async def world_reputation() -> dict[str, Any]:
+    async def world_reputation(
+        request: Request,
+        offset: int = Query(default=0, ge=0),
+        limit: Optional[int] = Query(default=None, ge=1),
+        agent_id: Optional[str] = None,
+    ) -> Response:
         """Get reputation leaderboard"""
-        async with app_state.world_lock:
-            items = []
-            for a in app_state.world.agents.values():
-                items.append({
-                    "agent_id": a.agent_id,
-                    "name": app_state.agent_names.get(a.agent_id, ""),
-                    "trust_score": round(a.trust_score, 1),
-                    "betrayals": a.betrayals,
-                    "trade_count": len(a.trade_history),
-                    "alive": a.alive,
-                })
-            items.sort(key=lambda x: x["trust_score"], reverse=True)
-            return {"tick": app_state.world.tick, "items": items}
+        return await cached_read(
+            request,
+            ("reputation", offset, limit, agent_id),
+            lambda w: reputation_payload(w, app_state.agent_names, offset, limit, agent_id),
+        )
 
     @r.post("/admin/dqn-log")
     async def admin_dqn_log(body: dict[str, Any] = Body(...)) -> dict[str, Any]:
         async with app_state.db_lock:
-            await insert_event(
-                app_state.conn,
+            await app_state.storage.insert_event(
                 tick=app_state.world.tick,
                 type="DQN_LOG",
                 payload={
@@ -311,26 +708,137 @@ def make_router(app_state: AppState) -> APIRouter:
                     for a in alive_agents
                 ]
         async with app_state.db_lock:
-            await insert_event(
-                app_state.conn,
+            await app_state.storage.insert_event(
                 tick=tick,
                 type="GAME_FINALIZED",
                 payload={"survivors": survivors, "end_tick": tick},
             )
         return {"ok": True, "tick": tick, "survivors": len(survivors)}
 
+    def event_filter(
+        tick_min: Optional[int] = None,
+        tick_max: Optional[int] = None,
+        type: Optional[list[str]] = Query(default=None),
+        agent_id: Optional[str] = None,
+    ) -> EventFilter:
+        return EventFilter(tick_min=tick_min, tick_max=tick_max, types=tuple(type or ()), agent_id=agent_id)
+
     @r.get("/admin/events")
-    async def admin_events(limit: int = 50) -> dict[str, Any]:
+    async def admin_events(
+        limit: int = 50,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        flt: EventFilter = Depends(event_filter),
+    ) -> dict[str, Any]:
+        """Newest first below `before_id`, or oldest first above `after_id`; `next_cursor` continues the page."""
         limit = max(1, min(200, int(limit)))
-        async with app_state.db_lock:
-            evs = await list_events(app_state.conn, limit=limit)
+        evs = await app_state.storage.list_events(limit, flt=flt, before_id=before_id, after_id=after_id)
+        next_cursor = None
+        if len(evs) == limit:
+            next_cursor = {"after_id" if after_id is not None else "before_id": evs[-1].id}
         return {
             "items": [
                 {"id": e.id, "tick": e.tick, "type": e.type, "agent_id": e.agent_id, "payload": e.payload, "created_at": e.created_at}
                 for e in evs
-            ]
+            ],
+            "next_cursor": next_cursor,
+        }
+
+    @r.get("/admin/events/export")
+    async def admin_events_export(
+        after_id: int = 0,
+        limit: Optional[int] = None,
+        flt: EventFilter = Depends(event_filter),
+    ) -> StreamingResponse:
+        """Matching events oldest first as NDJSON, streamed while they are read."""
+        return StreamingResponse(
+            app_state.storage.iter_event_ndjson(flt=flt, after_id=after_id, limit=limit),
+            media_type="application/x-ndjson",
+        )
+
+    @r.get("/admin/events/stream")
+    async def admin_events_stream(
+        backlog: int = 0,
+        after_id: Optional[int] = None,
+        type: Optional[list[str]] = Query(default=None),
+        exclude: Optional[list[str]] = Query(default=None),
+        last_event_id: Optional[str] = Header(default=None),
+    ) -> StreamingResponse:
+        """New events as Server-Sent Events, each `data:` an /admin/events item and `id:` its event id.
+
+        Reconnecting with Last-Event-ID (or `after_id`) first replays what was missed; otherwise
+        the stream starts with the newest `backlog` events. `type`/`exclude` filter by event type.
+        """
+        if last_event_id is not None:
+            try:
+                after_id = int(last_event_id)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="invalid_last_event_id")
+        return StreamingResponse(
+            feed.stream(
+                after_id=after_id,
+                backlog=max(0, min(1000, int(backlog))),
+                types=frozenset(type or ()),
+                exclude=frozenset(exclude or ()),
+            ),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @r.get("/admin/ticks")
+    async def admin_ticks() -> dict[str, Any]:
+        """Tick cadence: current interval, budget use, overruns and skipped deadlines."""
+        if app_state.scheduler is None:
+            raise HTTPException(status_code=404, detail="no_tick_scheduler")
+        return {"tick": app_state.world.tick, **app_state.scheduler.snapshot()}
+
+    @r.get("/admin/rate-limits")
+    async def admin_rate_limits(top: int = 10) -> dict[str, Any]:
+        """Configured limits, allowed/rejected counts per route class and the most-rejected agents."""
+        lim = app_state.limiter
+        return {
+            "limits": {k: {"per_s": rate, "burst": burst} for k, (rate, burst) in lim.limits.items()},
+            "allowed": dict(lim.allowed),
+            "rejected": dict(lim.rejected),
+            "top_rejected_agents": [
+                {"agent_id": aid, "rejected": n} for aid, n in lim.rejected_by_agent.most_common(max(0, top))
+            ],
         }
 
+    @r.get("/admin/profile")
+    async def admin_profile(
+        mode: str = "sample",
+        seconds: float = 5.0,
+        interval_ms: float = 5.0,
+        format: str = "text",
+        sort: str = "cumulative",
+        limit: int = 60,
+    ) -> Response:
+        """Profile the whole server process (tick loops and handlers) for `seconds`, capped at
+        PROFILE_MAX_S. `mode=sample` returns collapsed stacks for flamegraph tools; `mode=cprofile`
+        returns pstats text, or the binary pstats file with `format=pstats`."""
+        if mode not in profiler.MODES:
+            raise HTTPException(status_code=400, detail="unknown_profile_mode")
+        if format not in ("text", "pstats"):
+            raise HTTPException(status_code=400, detail="unknown_profile_format")
+        if sort not in profiler.SORT_KEYS:
+            raise HTTPException(status_code=400, detail="unknown_sort_key")
+        seconds = max(0.1, min(settings.profile_max_s, float(seconds)))
+        try:
+            if mode == "sample":
+                stacks = await profiler.sample(seconds, interval_ms / 1000.0)
+                return Response(profiler.collapsed(stacks), media_type="text/plain")
+            stats = await profiler.cprofile(seconds)
+        except profiler.ProfilerBusy:
+            raise HTTPException(status_code=409, detail="profile_in_progress")
+        if format == "pstats":
+            return Response(
+                profiler.stats_dump(stats),
+                media_type="application/octet-stream",
+                headers={"Content-Disposition": 'attachment; filename="last_oasis.pstats"'},
+            )
+        return Response(profiler.stats_text(stats, sort, max(1, limit)), media_type="text/plain")
+
     @r.post("/admin/tick")
     async def admin_tick() -> dict[str, Any]:
         async with app_state.world_lock:
@@ -338,14 +846,18 @@ def make_router(app_state: AppState) -> APIRouter:
             app_state.pending_actions.clear()
             events = app_state.world.step(actions)
             tick = app_state.world.tick
+            rearm_locked()
+        publish()
+        await app_state.ticks.notify(tick)
         async with app_state.db_lock:
-            await insert_event(
-                app_state.conn, tick=tick, type="TICK_RESOLVED", payload={"actions": actions, "events": events}
+            await app_state.storage.insert_events(resolved_tick_events(tick, actions, events))
+            await maybe_snapshot(
+                app_state.storage,
+                app_state.world,
+                settings.snapshot_every_ticks,
+                keyframe_every=settings.snapshot_keyframe_every,
+                keep_keyframes=settings.snapshot_keep_keyframes,
             )
-            for e in events:
-                et = str(e.get("type") or "EVENT")
-                await insert_event(app_state.conn, tick=tick, type=et, agent_id=e.get("agent_id"), payload=e)
-            await maybe_snapshot(app_state.conn, app_state.world, settings.snapshot_every_ticks)
         return {"ok": True, "tick": tick, "events": len(events)}
 
     @r.post("/admin/spawn-demo-agents")
@@ -363,14 +875,13 @@ def make_router(app_state: AppState) -> APIRouter:
 
             # Register agent in DB
             async with app_state.db_lock:
-                await upsert_agent(
-                    app_state.conn,
+                await app_state.storage.upsert_agent(
                     agent_id=agent_id,
                     api_key=api_key,
                     state={}
                 )
-                await insert_entry(
-                    app_state.conn,
+                app_state.tokens[api_key] = agent_id
+                await app_state.storage.insert_entry(
                     f"demo_{agent_id}",  # tx_ref
                     agent_id,             # agent_id
                     "DEMO",              # paid_asset
@@ -382,11 +893,11 @@ def make_router(app_state: AppState) -> APIRouter:
                 app_state.world.add_agent(agent_id)
                 app_state.agent_names[agent_id] = name
                 tick = app_state.world.tick
+                rearm_locked()
 
             # Log entry event
             async with app_state.db_lock:
-                await insert_event(
-                    app_state.conn,
+                await app_state.storage.insert_event(
                     tick=tick,
                     type="AGENT_ENTERED",
                     agent_id=agent_id,
@@ -394,6 +905,7 @@ def make_router(app_state: AppState) -> APIRouter:
                 )
 
             spawned.append({"agent_id": agent_id, "name": name})
+        publish()
 
         return {"ok": True, "spawned": len(spawned), "agents": spawned}
 
@@ -408,20 +920,55 @@ def make_router(app_state: AppState) -> APIRouter:
             app_state.world = WorldState(size=settings.map_size)
             app_state.pending_actions.clear()
             app_state.agent_names.clear()
+            app_state.history.clear()
+            rearm_locked()
+        await app_state.ticks.notify(0)
+
+        # Submissions for the old world must land before the WORLD_RESET marker
+        if app_state.action_log is not None:
+            await app_state.action_log.flush(app_state.storage, app_state.db_lock)
 
         # Clear agents from DB (optional - or keep for history)
         async with app_state.db_lock:
-            await app_state.conn.execute("DELETE FROM agents")
-            await app_state.conn.execute("DELETE FROM entries")
-            await app_state.conn.commit()
-
-            await insert_event(
-                app_state.conn,
+            await app_state.storage.delete_agents()
+            await app_state.storage.delete_entries()
+            app_state.tokens.clear()
+            app_state.limiter.clear()
+            # Old snapshots belong to the previous world and must not be picked up on restart
+            await app_state.storage.clear_snapshots()
+
+            await app_state.storage.insert_event(
                 tick=0,
                 type="WORLD_RESET",
                 payload={"old_tick": old_tick, "reset_at": 0}
             )
+        publish()
 
         return {"ok": True, "old_tick": old_tick, "new_tick": 0, "message": "World reset successfully"}
 
     return r
+
+
+# Served by SERVER_ROLE=api workers from their replica; everything else goes to the simulation.
+READ_ROUTES = {
+    ("GET", "/world/observation"),
+    ("POST", "/world/observations"),
+    ("GET", "/world/status"),
+    ("GET", "/world/leaderboard"),
+    ("GET", "/world/agents"),
+    ("GET", "/world/grid"),
+    ("GET", "/world/grid.bin"),
+    ("GET", "/world/market"),
+    ("GET", "/world/reputation"),
+}
+
+
+def make_read_router(app_state: AppState) -> APIRouter:
+    """The READ_ROUTES subset of make_router, for a replica AppState that never writes."""
+    r = make_router(app_state)
+    r.routes = [
+        route
+        for route in r.routes
+        if isinstance(route, APIRoute) and any((m, route.path) in READ_ROUTES for m in route.methods)
+    ]
+    return r
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from ..world.engine import WorldState
+
+
+class TickSignal:
+    """Wakes everything waiting for the world to change once WorldState.step (or a reset) finishes.
+
+    `version` increases on every notify, so waiters are not confused when a reset moves the tick
+    backwards.
+    """
+
+    def __init__(self, tick: int = 0) -> None:
+        self.tick = tick
+        self.version = 0
+        self.notified_at = time.monotonic()
+        self._cond = asyncio.Condition()
+
+    async def notify(self, tick: int) -> None:
+        async with self._cond:
+            self.tick = tick
+            self.version += 1
+            self.notified_at = time.monotonic()
+            self._cond.notify_all()
+
+    def until_next(self, interval_s: float) -> float:
+        """Seconds until the next tick is due, assuming ticks every `interval_s`."""
+        return max(0.0, self.notified_at + interval_s - time.monotonic())
+
+    async def wait(self, after_version: int, timeout: Optional[float] = None) -> int:
+        """Return the current version once it is past `after_version`, or on timeout."""
+        async with self._cond:
+            try:
+                await asyncio.wait_for(self._cond.wait_for(lambda: self.version > after_version), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return self.version
+
+    async def wait_for_tick(self, after_tick: int, timeout: float) -> int:
+        """Wait until the world passes `after_tick` (or is reset below it), at most `timeout` seconds."""
+        async with self._cond:
+            start_tick = self.tick
+            try:
+                await asyncio.wait_for(
+                    self._cond.wait_for(lambda: self.tick > after_tick or self.tick < start_tick),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                pass
+            return self.tick
+
+
+class Lockstep:
+    """Lockstep tick mode: `ready` is set once every alive agent has an action queued.
+
+    The tick loop waits on `ready` with the timer as a fallback deadline. arm() recomputes who
+    is still expected after anything that changes the set of alive agents (a tick, an entry, a
+    reset); acted() is called for each queued action.
+    """
+
+    def __init__(self) -> None:
+        self.ready = asyncio.Event()
+        self.waiting: set[str] = set()
+        self.alive = 0
+
+    def arm(self, world: "WorldState", pending: dict[str, Any]) -> None:
+        alive = [aid for aid, a in world.agents.items() if a.alive]
+        self.alive = len(alive)
+        self.waiting = {aid for aid in alive if aid not in pending}
+        self._update()
+
+    def acted(self, agent_id: str) -> None:
+        self.waiting.discard(agent_id)
+        self._update()
+
+    def _update(self) -> None:
+        # with nobody alive there is nothing to wait for; leave it to the timer
+        if self.alive and not self.waiting:
+            self.ready.set()
+        else:
+            self.ready.clear()
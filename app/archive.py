@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, AsyncContextManager, Callable, Iterator, Optional
+
+import aiosqlite
+
+from .db import DbEvent, EventFilter, event_ndjson_line, get_last_reset_event_id, get_oldest_frame_tick
+
+# Events older than the retention horizon are moved out of SQLite into immutable gzip NDJSON
+# segment files, one per tick bucket and archival pass, listed in a small index.json.
+
+_INDEX_FILE = "index.json"
+
+
+@dataclass(frozen=True)
+class Segment:
+    file: str
+    tick_min: int
+    tick_max: int
+    id_min: int
+    id_max: int
+    count: int
+
+
+def _event_from_line(line: bytes) -> DbEvent:
+    d = json.loads(line)
+    return DbEvent(
+        id=int(d["id"]),
+        tick=int(d["tick"]),
+        type=str(d["type"]),
+        agent_id=str(d["agent_id"]) if d.get("agent_id") is not None else None,
+        payload=d.get("payload") or {},
+        created_at=str(d["created_at"]),
+    )
+
+
+class EventArchive:
+    def __init__(self, directory: str, segment_ticks: int = 500) -> None:
+        self.directory = Path(directory)
+        self.segment_ticks = max(1, int(segment_ticks))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._segments: list[Segment] = self._load_index()
+
+    def _load_index(self) -> list[Segment]:
+        path = self.directory / _INDEX_FILE
+        if not path.exists():
+            return []
+        return [Segment(**s) for s in json.loads(path.read_text(encoding="utf-8"))]
+
+    def _save_index(self) -> None:
+        tmp = self.directory / (_INDEX_FILE + ".tmp")
+        tmp.write_text(json.dumps([asdict(s) for s in self._segments], indent=0), encoding="utf-8")
+        os.replace(tmp, self.directory / _INDEX_FILE)
+
+    def segments(self) -> list[Segment]:
+        return list(self._segments)
+
+    def write_segment(self, rows: list[Any]) -> Segment:
+        """Write rows (ordered by id) to a new immutable segment file. Not yet indexed."""
+        ticks = [int(r["tick"]) for r in rows]
+        seg = Segment(
+            file=f"events_t{min(ticks):010d}-{max(ticks):010d}_i{int(rows[0]['id']):012d}-{int(rows[-1]['id']):012d}.ndjson.gz",
+            tick_min=min(ticks),
+            tick_max=max(ticks),
+            id_min=int(rows[0]["id"]),
+            id_max=int(rows[-1]["id"]),
+            count=len(rows),
+        )
+        tmp = self.directory / (seg.file + ".tmp")
+        with open(tmp, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as gz:
+                for r in rows:
+                    gz.write(event_ndjson_line(r))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp, self.directory / seg.file)
+        return seg
+
+    def add_segment(self, seg: Segment) -> None:
+        self._segments.append(seg)
+        self._segments.sort(key=lambda s: s.id_max)
+        self._save_index()
+
+    def unindexed_files(self) -> list[Path]:
+        known = {s.file for s in self._segments}
+        return sorted(p for p in self.directory.glob("events_*.ndjson.gz") if p.name not in known)
+
+    def scan_file(self, path: Path) -> Optional[Segment]:
+        events = list(self._iter_file(path))
+        if not events:
+            return None
+        return Segment(
+            file=path.name,
+            tick_min=min(e.tick for e in events),
+            tick_max=max(e.tick for e in events),
+            id_min=min(e.id for e in events),
+            id_max=max(e.id for e in events),
+            count=len(events),
+        )
+
+    def _iter_file(self, path: Path) -> Iterator[DbEvent]:
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield _event_from_line(line)
+
+    def read_segment(
+        self,
+        seg: Segment,
+        flt: EventFilter,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+    ) -> list[DbEvent]:
+        return [
+            e
+            for e in self._iter_file(self.directory / seg.file)
+            if flt.matches(e) and (before_id is None or e.id < before_id) and (after_id is None or e.id > after_id)
+        ]
+
+    def candidates(
+        self, flt: EventFilter, before_id: Optional[int] = None, after_id: Optional[int] = None
+    ) -> list[Segment]:
+        """Segments that may hold matching rows, in ascending id order."""
+        return [
+            s
+            for s in sorted(self._segments, key=lambda s: s.id_min)
+            if flt.overlaps_ticks(s.tick_min, s.tick_max)
+            and (before_id is None or s.id_min < before_id)
+            and (after_id is None or s.id_max > after_id)
+        ]
+
+    def clusters(self, flt: EventFilter, after_id: Optional[int] = None) -> list[list[Segment]]:
+        """Candidate segments grouped so that groups have disjoint, ascending id ranges."""
+        out: list[list[Segment]] = []
+        hi = -1
+        for seg in self.candidates(flt, after_id=after_id):
+            if out and seg.id_min <= hi:
+                out[-1].append(seg)
+            else:
+                out.append([seg])
+            hi = max(hi, seg.id_max)
+        return out
+
+    def read_cluster(self, segs: list[Segment], flt: EventFilter, after_id: Optional[int] = None) -> list[DbEvent]:
+        rows = [e for seg in segs for e in self.read_segment(seg, flt, None, after_id)]
+        rows.sort(key=lambda e: e.id)
+        return rows
+
+    def read_events(
+        self,
+        limit: int,
+        flt: EventFilter,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+    ) -> list[DbEvent]:
+        """Up to `limit` archived events: newest first below before_id, or oldest first above after_id."""
+        ascending = after_id is not None
+        segs = self.candidates(flt, before_id, after_id)
+        if not ascending:
+            segs.sort(key=lambda s: s.id_max, reverse=True)
+        out: list[DbEvent] = []
+        for seg in segs:
+            if len(out) >= limit:
+                boundary = out[limit - 1].id
+                if (ascending and seg.id_min > boundary) or (not ascending and seg.id_max < boundary):
+                    break
+            out.extend(self.read_segment(seg, flt, before_id, after_id))
+            out.sort(key=lambda e: e.id, reverse=not ascending)
+        return out[:limit]
+
+
+async def recover_segments(conn: aiosqlite.Connection, archive: EventArchive) -> None:
+    """Finish or roll back archival passes interrupted between file write, delete and index update."""
+    for path in archive.unindexed_files():
+        seg = await asyncio.to_thread(archive.scan_file, path)
+        if seg is None:
+            path.unlink()
+            continue
+        cur = await conn.execute("SELECT 1 FROM events WHERE id = ? LIMIT 1", (seg.id_min,))
+        if await cur.fetchone() is not None:
+            # rows were never deleted from the live table: drop the orphan file
+            path.unlink()
+        else:
+            archive.add_segment(seg)
+
+
+async def archive_events(
+    conn: aiosqlite.Connection,
+    open_reader: Callable[[], AsyncContextManager[aiosqlite.Connection]],
+    write_lock: Callable[[], AsyncContextManager[Any]],
+    archive: EventArchive,
+    horizon_tick: int,
+) -> int:
+    """Move events with tick below `horizon_tick` (bucket-aligned), and everything recorded before the
+    last world reset, out of the live table into segment files. Returns the number of rows moved.
+
+    Rows are read on a reader connection and segment files written without the write lock; only
+    each bucket's DELETE on the writer `conn` holds it, so ticks keep persisting in between.
+    """
+    seg_ticks = archive.segment_ticks
+    cutoff = (max(0, horizon_tick) // seg_ticks) * seg_ticks
+    async with open_reader() as rconn:
+        reset_id = await get_last_reset_event_id(rconn)
+        cur = await rconn.execute(
+            "SELECT DISTINCT tick / ? AS b FROM events WHERE tick < ? OR id < ? ORDER BY b",
+            (seg_ticks, cutoff, reset_id),
+        )
+        buckets = [int(r["b"]) for r in await cur.fetchall()]
+
+    moved = 0
+    for b in buckets:
+        lo, hi = b * seg_ticks, (b + 1) * seg_ticks
+        async with open_reader() as rconn:
+            cur = await rconn.execute(
+                "SELECT id, tick, type, agent_id, payload_json, created_at FROM events "
+                "WHERE tick >= ? AND tick < ? AND (tick < ? OR id < ?) ORDER BY id ASC",
+                (lo, hi, cutoff, reset_id),
+            )
+            rows = await cur.fetchall()
+        if not rows:
+            continue
+        seg = await asyncio.to_thread(archive.write_segment, rows)
+        # rows added since the read have larger ids, so id_max bounds the delete to what was written
+        async with write_lock():
+            await conn.execute(
+                "DELETE FROM events WHERE tick >= ? AND tick < ? AND (tick < ? OR id < ?) AND id <= ?",
+                (lo, hi, cutoff, reset_id, seg.id_max),
+            )
+            await conn.commit()
+        archive.add_segment(seg)
+        moved += seg.count
+    return moved
+
+
+async def compact_database(conn: aiosqlite.Connection, vacuum_pages: int = 2000) -> None:
+    await conn.commit()
+    # PASSIVE copies what it can without waiting for readers (dashboards, exports) to finish
+    cur = await conn.execute("PRAGMA wal_checkpoint(PASSIVE);")
+    await cur.fetchall()
+    # incremental_vacuum frees one page per step, so the cursor has to be drained
+    cur = await conn.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)});")
+    await cur.fetchall()
+
+
+async def run_maintenance(
+    conn: aiosqlite.Connection,
+    open_reader: Callable[[], AsyncContextManager[aiosqlite.Connection]],
+    write_lock: Callable[[], AsyncContextManager[Any]],
+    archive: Optional[EventArchive],
+    world_tick: int,
+    retention_ticks: int,
+) -> int:
+    """Archive old events and compact the live database. Never archives events that replay from
+    a retained snapshot still needs. Takes `write_lock` only around writes on `conn`."""
+    moved = 0
+    if archive is not None and retention_ticks > 0:
+        horizon = world_tick - retention_ticks
+        async with open_reader() as rconn:
+            oldest_frame = await get_oldest_frame_tick(rconn)
+        if oldest_frame is not None:
+            horizon = min(horizon, oldest_frame)
+        moved = await archive_events(conn, open_reader, write_lock, archive, horizon)
+    async with write_lock():
+        await compact_database(conn)
+    return moved
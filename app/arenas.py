@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Optional
+
+from .action_log import ActionLog
+from .api.routes import AppState, resolved_tick_events
+from .api.ticks import Lockstep, TickSignal
+from .metrics import (
+    ALIVE_AGENTS,
+    EVENT_STREAM_VIEWERS,
+    PENDING_ACTIONS,
+    RATE_LIMITED,
+    RESPONSE_CACHE,
+    TICK_INTERVAL_SECONDS,
+    TICK_OVERRUNS,
+    TICK_SECONDS,
+    TICKS_SKIPPED,
+    WORLD_TICK,
+    TimedLock,
+)
+from .scheduler import TickScheduler
+from .settings import arena_path, settings
+from .shared_world import WorldPublisher, WorldReader, decode_world
+from .storage import MemoryStorage, SqliteStorage, create_storage
+from .world.engine import AgentState, WorldState
+from .world.snapshot import load_world, maybe_snapshot
+
+# An arena is one independent world: its own storage files, locks, pending actions and tick task.
+# A deployment hosts any number of them side by side on one event loop.
+
+logger = logging.getLogger("last_oasis")
+
+
+def shared_world_path(file_id: Optional[str]) -> str:
+    return arena_path(settings.shared_world_path or f"{settings.db_path}.world", file_id)
+
+
+class Arena:
+    def __init__(self, world_id: str, state: AppState) -> None:
+        self.world_id = world_id
+        self.state = state
+        self.tick_task: Optional[asyncio.Task] = None
+        self.maintenance_task: Optional[asyncio.Task] = None
+        self.action_log_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def open(cls, world_id: str, named: bool = True) -> "Arena":
+        """Open storage and load the world. `named` arenas use per-arena file names; the single
+        unnamed arena of a plain deployment keeps DB_PATH as it is."""
+        tag = f"[{world_id}] " if named else ""
+        file_id = world_id if named else None
+
+        if settings.tick_mode not in ("timer", "lockstep"):
+            raise ValueError(f"unknown TICK_MODE: {settings.tick_mode!r}")
+
+        print(f"\n📊 {tag}Step 1: Opening storage...", flush=True)
+        storage = create_storage(settings, file_id)
+        storage.world_id = world_id
+        db_lock = storage.db_lock = TimedLock(world_id, "db")
+        print(f"✅ {tag}Storage backend selected ({storage.name})", flush=True)
+
+        print(f"\n📊 {tag}Step 2: Initializing storage...", flush=True)
+        await storage.open()
+        print(f"✅ {tag}Storage initialized", flush=True)
+        if isinstance(storage, SqliteStorage):
+            if storage.archive is not None:
+                print(f"✅ {tag}Event archive ready ({len(storage.archive.segments())} segments)", flush=True)
+            if storage.read_pool is not None:
+                print(f"✅ {tag}Read pool opened ({settings.read_pool_size} connections)", flush=True)
+
+        action_log = None
+        if settings.action_log_flush_ms > 0 and storage.name != "memory":
+            db_path = arena_path(settings.db_path, file_id)
+            action_log = ActionLog(
+                arena_path(settings.action_log_path, file_id) if settings.action_log_path else f"{db_path}.actions",
+                flush_interval_ms=settings.action_log_flush_ms,
+            )
+            print(f"✅ {tag}Action log enabled ({action_log.path}, fsync every {settings.action_log_flush_ms}ms)", flush=True)
+
+        print(f"\n📊 {tag}Step 3: Loading world state...", flush=True)
+        world = await load_world(storage, size=settings.map_size, action_log=action_log)
+        print(f"✅ {tag}World loaded successfully (current tick: {world.tick})", flush=True)
+
+        print(f"\n📊 {tag}Step 4: Loading agents...", flush=True)
+        agents = await storage.list_agents()
+        print(f"✅ {tag}Found {len(agents)} existing agents", flush=True)
+
+        tokens: dict[str, str] = {}
+        for agent_id, api_key, state in agents:
+            tokens[api_key] = agent_id
+            if agent_id not in world.agents:
+                world.add_agent(agent_id)
+            world.agents[agent_id] = AgentState.from_dict(state)
+        world.reindex()
+        print(f"✅ {tag}Agents loaded into world", flush=True)
+
+        print(f"\n📊 {tag}Step 5: Creating app state...", flush=True)
+        app_state = AppState(
+            storage=storage,
+            world=world,
+            world_lock=TimedLock(world_id, "world"),
+            db_lock=db_lock,
+            pending_actions=action_log.pending_for(world.tick + 1) if action_log is not None else {},
+            agent_names={},
+            tokens=tokens,
+            action_log=action_log,
+            ticks=TickSignal(world.tick),
+            scheduler=TickScheduler.from_settings(settings, world_id),
+            lockstep=Lockstep() if settings.tick_mode == "lockstep" else None,
+        )
+        if app_state.lockstep is not None:
+            app_state.lockstep.arm(world, app_state.pending_actions)
+        print(f"✅ {tag}App state created", flush=True)
+
+        if settings.server_role == "sim":
+            app_state.publisher = WorldPublisher(shared_world_path(file_id))
+            app_state.publisher.publish(app_state)
+            print(f"✅ {tag}Publishing world to {app_state.publisher.path}", flush=True)
+
+        print(f"\n📊 {tag}Step 6: Recording startup event...", flush=True)
+        async with app_state.db_lock:
+            await storage.insert_event(tick=world.tick, type="WORLD_STARTED", payload={"tick": world.tick})
+        print(f"✅ {tag}Startup event recorded", flush=True)
+        return cls(world_id, app_state)
+
+    def start(self) -> None:
+        self.tick_task = asyncio.create_task(self._tick_loop())
+        st = self.state
+        if st.action_log is not None:
+            self.action_log_task = asyncio.create_task(st.action_log.run(st.storage, st.db_lock))
+
+    async def close(self) -> None:
+        for task in (self.tick_task, self.maintenance_task, self.action_log_task):
+            if task is not None:
+                task.cancel()
+        st = self.state
+        if st.feed is not None:
+            st.feed.close()
+        if st.action_log is not None:
+            await st.action_log.flush(st.storage, st.db_lock)
+        await st.storage.close()
+        if st.publisher is not None:
+            st.publisher.close()
+
+    async def _maintenance(self, world_tick: int) -> None:
+        st = self.state
+        try:
+            # takes db_lock itself, around each write only
+            moved = await st.storage.maintenance(world_tick)
+            if moved:
+                logger.info("events_archived world=%s tick=%s rows=%s", self.world_id, world_tick, moved)
+        except Exception:
+            logger.exception("maintenance_failed world=%s tick=%s", self.world_id, world_tick)
+        finally:
+            self.maintenance_task = None
+
+    async def _tick_loop(self) -> None:
+        scheduler = self.state.scheduler
+        while True:
+            await scheduler.wait(self.state.lockstep.ready if self.state.lockstep is not None else None)
+            stepped = True
+            try:
+                stepped = await self._tick()
+            finally:
+                if stepped:
+                    scheduler.finish(self.state.world.tick)
+                else:
+                    scheduler.pass_idle()
+
+    async def _tick(self) -> bool:
+        """Step the world once; False when there was nothing to step."""
+        st = self.state
+        async with st.world_lock:
+            if sum(1 for a in st.world.agents.values() if a.alive) == 0 and not st.pending_actions:
+                return False
+            started = time.perf_counter()
+            actions = dict(st.pending_actions)
+            st.pending_actions.clear()
+            events = st.world.step(actions)
+            tick = st.world.tick
+            if st.lockstep is not None:
+                st.lockstep.arm(st.world, st.pending_actions)
+            agent_states: dict[str, Any] = {aid: a.to_dict() for aid, a in st.world.agents.items()}
+            TICK_SECONDS.observe(time.perf_counter() - started, self.world_id, "engine")
+            if st.publisher is not None:
+                st.publisher.publish(st)
+        await st.ticks.notify(tick)
+
+        started = time.perf_counter()
+        async with st.db_lock:
+            await st.storage.insert_events(resolved_tick_events(tick, actions, events))
+            await st.storage.update_agent_states(agent_states)
+
+            await maybe_snapshot(
+                st.storage,
+                st.world,
+                settings.snapshot_every_ticks,
+                keyframe_every=settings.snapshot_keyframe_every,
+                keep_keyframes=settings.snapshot_keep_keyframes,
+            )
+        TICK_SECONDS.observe(time.perf_counter() - started, self.world_id, "persistence")
+
+        if (
+            settings.maintenance_every_ticks > 0
+            and tick % settings.maintenance_every_ticks == 0
+            and self.maintenance_task is None
+        ):
+            self.maintenance_task = asyncio.create_task(self._maintenance(tick))
+
+        # Check for STATE_ANCHORED events and submit to chain
+        for e in events:
+            if e.get("type") == "STATE_ANCHORED":
+                from app.chain.state_anchor import get_state_anchor_service
+                anchor_svc = get_state_anchor_service()
+                state_hash = e.get("state_hash", "")
+                alive_count = e.get("alive_agents", 0)
+                if state_hash:
+                    asyncio.create_task(anchor_svc.anchor_state(tick, state_hash, alive_count))
+        return True
+
+    def export_metrics(self) -> None:
+        st, wid = self.state, self.world_id
+        WORLD_TICK.set(st.world.tick, wid)
+        ALIVE_AGENTS.set(sum(1 for a in st.world.agents.values() if a.alive), wid)
+        PENDING_ACTIONS.set(len(st.pending_actions), wid)
+        if st.scheduler is not None:
+            TICK_INTERVAL_SECONDS.set(st.scheduler.interval_s, wid)
+            TICK_OVERRUNS.set(st.scheduler.overruns, wid)
+            TICKS_SKIPPED.set(st.scheduler.skipped, wid)
+        for route_class, n in st.limiter.rejected.items():
+            RATE_LIMITED.set(n, wid, route_class)
+        RESPONSE_CACHE.set(st.responses.hits, wid, "hit")
+        RESPONSE_CACHE.set(st.responses.misses, wid, "miss")
+        if st.feed is not None:
+            EVENT_STREAM_VIEWERS.set(st.feed.viewers, wid)
+
+    def summary(self) -> dict[str, Any]:
+        world = self.state.world
+        return {
+            "world_id": self.world_id,
+            "tick": world.tick,
+            "agents": len(world.agents),
+            "alive_agents": sum(1 for a in world.agents.values() if a.alive),
+        }
+
+
+class ReplicaArena(Arena):
+    """Read-only copy of an arena whose simulation runs in another process (SERVER_ROLE=api).
+
+    The state is rebuilt from the shared world buffer whenever the simulation publishes; routes
+    that write are not mounted for it, so its storage is an empty placeholder.
+    """
+
+    def __init__(self, world_id: str, state: AppState, reader: WorldReader) -> None:
+        super().__init__(world_id, state)
+        self.reader = reader
+        self.poll_task: Optional[asyncio.Task] = None
+        self._refresh_lock = asyncio.Lock()
+
+    @classmethod
+    async def open(cls, world_id: str, named: bool = True) -> "ReplicaArena":
+        tag = f"[{world_id}] " if named else ""
+        path = shared_world_path(world_id if named else None)
+        print(f"\n📊 {tag}Attaching to shared world {path}...", flush=True)
+        deadline = time.monotonic() + 60.0
+        while True:
+            try:
+                reader = WorldReader(path)
+                frame = reader.read()
+                if frame is not None:
+                    break
+                reader.close()
+            except (FileNotFoundError, ValueError):
+                pass  # simulation not up yet, or still writing the first header
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"no world published at {path}; is the SERVER_ROLE=sim process running?")
+            await asyncio.sleep(0.25)
+        extras, keyframe = frame
+        world = decode_world(extras, keyframe)
+        state = AppState(
+            storage=MemoryStorage(),
+            world=world,
+            world_lock=asyncio.Lock(),
+            db_lock=asyncio.Lock(),
+            pending_actions={},
+            agent_names=dict(extras["names"]),
+            tokens=dict(extras["tokens"]),
+            ticks=TickSignal(world.tick),
+        )
+        print(f"✅ {tag}Replica ready (tick {world.tick})", flush=True)
+        return cls(world_id, state, reader)
+
+    def start(self) -> None:
+        self.poll_task = asyncio.create_task(self._poll())
+
+    async def close(self) -> None:
+        if self.poll_task is not None:
+            self.poll_task.cancel()
+        self.reader.close()
+
+    async def refresh(self) -> None:
+        """Swap in the latest published version, if there is a newer one.
+
+        One caller reads and decodes each frame, off the event loop; callers that arrive meanwhile
+        wait for it and find nothing left to do. Normally that caller is `_poll`.
+        """
+        if not self.reader.changed():
+            return
+        async with self._refresh_lock:
+            if not self.reader.changed():
+                return  # decoded while we waited
+            latest = await asyncio.to_thread(self._read_latest)
+            if latest is None:
+                return
+            st = self.state
+            st.world, extras = latest
+            st.agent_names = dict(extras["names"])
+            st.tokens = dict(extras["tokens"])
+        await st.ticks.notify(st.world.tick)
+
+    def _read_latest(self) -> Optional[tuple[WorldState, dict[str, Any]]]:
+        frame = self.reader.read()
+        if frame is None:
+            return None
+        extras, keyframe = frame
+        return decode_world(extras, keyframe), extras
+
+    async def _poll(self) -> None:
+        # wakes long-polls; request paths also call refresh() so a fresh token works at once
+        while True:
+            await asyncio.sleep(settings.replica_poll_ms / 1000.0)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("replica_refresh_failed world=%s", self.world_id)
+
+
+class ReplicaRefreshMiddleware:
+    """Brings every replica up to date before an HTTP request is routed, so a token the
+    simulation issued a moment ago already authenticates here. Costs one 8-byte read per arena
+    when nothing changed, and waits out a decode already in progress rather than repeating it."""
+
+    def __init__(self, app: Any, replicas: dict[str, ReplicaArena]) -> None:
+        self.app = app
+        self.replicas = replicas
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] == "http":
+            for replica in self.replicas.values():
+                try:
+                    await replica.refresh()
+                except Exception:
+                    # serve from the version we have; the poller retries
+                    logger.exception("replica_refresh_failed world=%s", replica.world_id)
+        await self.app(scope, receive, send)
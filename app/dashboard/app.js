@@ -543,11 +543,76 @@ async function refreshStatus() {
   } catch {}
 }
 
+// Delta sync for /world/grid: send our tick + epoch, merge changed tiles/agents into gridData.
+let gridEtag = null;
+
+function mergeGrid(data) {
+  if (data.full || !gridData || gridData.epoch !== data.epoch) return data;
+  for (const t of data.tiles) gridData.tiles[t.y * gridData.size + t.x] = t;
+  const byId = new Map(gridData.agents.map(a => [a.agent_id, a]));
+  for (const a of data.agents) byId.set(a.agent_id, a);
+  return { ...gridData, tick: data.tick, agents: [...byId.values()] };
+}
+
+// Packed /world/grid.bin frame (layout in app/api/grid_binary.py) -> the /world/grid JSON shape.
+function decodeGridBin(buf) {
+  const dv = new DataView(buf);
+  const dtype = dv.getUint8(5), recSize = dv.getUint16(6, true);
+  const tick = Number(dv.getBigInt64(8, true)), size = dv.getUint32(16, true), count = dv.getUint32(20, true);
+  const epoch = new TextDecoder().decode(new Uint8Array(buf, 24, 16)).replace(/\0+$/, "");
+  const n = size * size;
+  let off = 40;
+  let deg, haz;
+  if (dtype === 0) {
+    const q = new Uint8Array(buf, off, 2 * n);
+    deg = i => q[i] / 255;
+    haz = i => q[n + i] / 255;
+    off += 2 * n;
+  } else {
+    const base = off;
+    deg = i => f16(dv.getUint16(base + 2 * i, true));
+    haz = i => f16(dv.getUint16(base + 2 * (n + i), true));
+    off += 4 * n;
+  }
+  const res = new Uint8Array(buf, off, n);
+  const tiles = new Array(n);
+  for (let i = 0; i < n; i++) {
+    tiles[i] = { x: i % size, y: Math.floor(i / size), degradation: deg(i), resource: res[i], hazard: haz(i) };
+  }
+  off += n;
+  const agents = [];
+  let soff = off + count * recSize;
+  const bytes = new Uint8Array(buf);
+  const str = () => { const len = bytes[soff]; const v = new TextDecoder().decode(bytes.subarray(soff + 1, soff + 1 + len)); soff += 1 + len; return v; };
+  for (let k = 0; k < count; k++, off += recSize) {
+    const resource = dv.getInt32(off + 8, true);
+    const hp = dv.getInt16(off + 4, true);
+    const agent_id = str(), name = str();
+    agents.push({
+      agent_id, name, x: dv.getUint16(off, true), y: dv.getUint16(off + 2, true), hp,
+      alive: dv.getUint8(off + 6) === 1, betrayals: dv.getUint8(off + 7), resource,
+      score: hp + resource, trust_score: Math.round(dv.getFloat32(off + 12, true) * 10) / 10,
+    });
+  }
+  return { tick, size, epoch, tiles, agents, full: true };
+}
+
+function f16(h) {
+  const e = (h >> 10) & 0x1f, m = h & 0x3ff, s = h & 0x8000 ? -1 : 1;
+  if (e === 0) return s * m * 2 ** -24;
+  if (e === 31) return m ? NaN : s * Infinity;
+  return s * (1 + m / 1024) * 2 ** (e - 15);
+}
+
 async function refreshGrid() {
   try {
-    const res = await fetch("/world/grid");
+    // full frames come packed; after that, JSON deltas since our tick
+    const url = gridData ? `/world/grid?since_tick=${gridData.tick}&epoch=${gridData.epoch}` : "/world/grid.bin";
+    const res = await fetch(url, { headers: gridEtag ? { "If-None-Match": gridEtag } : {} });
+    if (res.status === 304) return;
     if (!res.ok) return;
-    gridData = await res.json();
+    gridData = gridData ? mergeGrid(await res.json()) : decodeGridBin(await res.arrayBuffer());
+    gridEtag = res.headers.get("ETag");
     if (gridData.agents) {
       for (const a of gridData.agents) {
         if (a.name) agentNames[a.agent_id] = a.name;
@@ -558,116 +623,116 @@ async function refreshGrid() {
   } catch {}
 }
 
-async function refreshEvents() {
-  try {
-    const res = await fetch("/admin/events?limit=100");
-    if (!res.ok) return;
-    const data = await res.json();
-    const items = data.items || [];
-    if (!items.length) return;
-
-    for (const ev of items) {
-      if (ev.type === "AGENT_ENTERED" && ev.payload) {
-        const aid = ev.payload.agent_id || ev.agent_id;
-        const name = ev.payload.name;
-        if (aid && name) agentNames[aid] = name;
-      }
-    }
-
-    const feed = $("feed");
-    if (!feed) return;
-    feed.innerHTML = "";
-    let tc = 0, cc = 0;
-
-    const filtered = items.filter(ev =>
-      ev.type !== "TICK_RESOLVED" && ev.type !== "TICK_DONE" && ev.type !== "ACTION_SUBMITTED"
-    );
-
-    for (const ev of filtered.reverse()) {
-      if (ev.type === "TRADE_COMPLETED") tc++;
-      if (ev.type === "COMBAT_HIT" || ev.type === "COMBAT_KILL") cc++;
-
-      const div = document.createElement("div");
-      const evCls = ev.type.includes("TRADE") ? "ev-trade" :
-                    ev.type.includes("DIED") || ev.type.includes("KILL") ? "ev-death" :
-                    ev.type.includes("COMBAT") ? "ev-combat" :
-                    ev.type.includes("ENTERED") ? "ev-enter" : "";
-      div.className = `event ${evCls}`;
-
-      const ts = ev.created_at ? new Date(ev.created_at).toLocaleTimeString() : "";
-      const agentName = ev.agent_id ? (agentNames[ev.agent_id] || ev.agent_id.slice(0, 8)) : "";
-
-      let detail = "";
-      if (ev.payload) {
-        if (ev.type === "AGENT_ENTERED") detail = "joined the oasis";
-        else if (ev.type === "AGENT_MOVED") detail = `moved to (${ev.payload.x},${ev.payload.y})`;
-        else if (ev.type === "COMBAT_HIT") {
-          const tgt = agentNames[ev.payload.target_id] || (ev.payload.target_id || "").slice(0, 8);
-          detail = `hit ${tgt} for ${ev.payload.damage} dmg`;
-        }
-        else if (ev.type === "COMBAT_KILL") {
-          const tgt = agentNames[ev.payload.target_id] || (ev.payload.target_id || "").slice(0, 8);
-          detail = `killed ${tgt}!`;
-        }
-        else if (ev.type === "TRADE_COMPLETED") detail = `traded ${ev.payload.amount} res`;
-        else if (ev.type === "AGENT_GATHERED") detail = `+${ev.payload.amount} res`;
-        else if (ev.type === "AGENT_DAMAGED") detail = `took ${ev.payload.amount} dmg`;
-        else if (ev.type === "AGENT_DIED") detail = `died at (${ev.payload.x},${ev.payload.y})`;
-        else detail = ev.type;
-      }
+// New events arrive over Server-Sent Events; EventSource reconnects on its own and sends
+// Last-Event-ID, so the server replays whatever was missed in between.
+const FEED_MAX = 100;
+const FEED_HIDDEN = ["TICK_RESOLVED", "TICK_DONE", "ACTION_SUBMITTED"];
+
+function startEventStream() {
+  const qs = "backlog=" + FEED_MAX + FEED_HIDDEN.map(t => "&exclude=" + t).join("");
+  const source = new EventSource("/admin/events/stream?" + qs);
+  source.onmessage = (msg) => {
+    try {
+      const ev = JSON.parse(msg.data);
+      if (ev.type === "DQN_LOG") renderDQN(ev.payload);
+      else appendEvent(ev);
+    } catch {}
+  };
+}
 
-      div.innerHTML = `
-        <div class="event-content"><span class="event-type">${agentName}</span> ${detail}</div>
-        <div class="event-time">t=${ev.tick} ${ts}</div>
-      `;
-      feed.appendChild(div);
+function appendEvent(ev) {
+  if (ev.type === "AGENT_ENTERED" && ev.payload) {
+    const aid = ev.payload.agent_id || ev.agent_id;
+    const name = ev.payload.name;
+    if (aid && name) agentNames[aid] = name;
+  }
+  if (ev.type === "TRADE_COMPLETED") tradeCount++;
+  if (ev.type === "COMBAT_HIT" || ev.type === "COMBAT_KILL") combatCount++;
+  if ($("trades")) $("trades").textContent = tradeCount;
+  if ($("combats")) $("combats").textContent = combatCount;
+
+  const feed = $("feed");
+  if (!feed) return;
+  const div = document.createElement("div");
+  const evCls = ev.type.includes("TRADE") ? "ev-trade" :
+                ev.type.includes("DIED") || ev.type.includes("KILL") ? "ev-death" :
+                ev.type.includes("COMBAT") ? "ev-combat" :
+                ev.type.includes("ENTERED") ? "ev-enter" : "";
+  div.className = `event ${evCls}`;
+
+  const ts = ev.created_at ? new Date(ev.created_at).toLocaleTimeString() : "";
+  const agentName = ev.agent_id ? (agentNames[ev.agent_id] || ev.agent_id.slice(0, 8)) : "";
+
+  let detail = "";
+  if (ev.payload) {
+    if (ev.type === "AGENT_ENTERED") detail = "joined the oasis";
+    else if (ev.type === "AGENT_MOVED") detail = `moved to (${ev.payload.x},${ev.payload.y})`;
+    else if (ev.type === "COMBAT_HIT") {
+      const tgt = agentNames[ev.payload.target_id] || (ev.payload.target_id || "").slice(0, 8);
+      detail = `hit ${tgt} for ${ev.payload.damage} dmg`;
     }
-    tradeCount += tc;
-    combatCount += cc;
-    if ($("trades")) $("trades").textContent = tradeCount;
-    if ($("combats")) $("combats").textContent = combatCount;
-    feed.scrollTop = feed.scrollHeight;
-  } catch {}
+    else if (ev.type === "COMBAT_KILL") {
+      const tgt = agentNames[ev.payload.target_id] || (ev.payload.target_id || "").slice(0, 8);
+      detail = `killed ${tgt}!`;
+    }
+    else if (ev.type === "TRADE_COMPLETED") detail = `traded ${ev.payload.amount} res`;
+    else if (ev.type === "AGENT_GATHERED") detail = `+${ev.payload.amount} res`;
+    else if (ev.type === "AGENT_DAMAGED") detail = `took ${ev.payload.amount} dmg`;
+    else if (ev.type === "AGENT_DIED") detail = `died at (${ev.payload.x},${ev.payload.y})`;
+    else detail = ev.type;
+  }
+
+  div.innerHTML = `
+    <div class="event-content"><span class="event-type">${agentName}</span> ${detail}</div>
+    <div class="event-time">t=${ev.tick} ${ts}</div>
+  `;
+  const atBottom = feed.scrollTop + feed.clientHeight >= feed.scrollHeight - 4;
+  feed.appendChild(div);
+  while (feed.childElementCount > FEED_MAX) feed.firstElementChild.remove();
+  if (atBottom) feed.scrollTop = feed.scrollHeight;
 }
 
+// the latest DQN_LOG once at startup; later ones come in on the event stream
 async function refreshDQN() {
   try {
-    const res = await fetch("/admin/events?limit=200");
+    const res = await fetch("/admin/events?type=DQN_LOG&limit=1");
     if (!res.ok) return;
     const data = await res.json();
     const dqnEvents = (data.items || []).filter(e => e.type === "DQN_LOG");
-    if (!dqnEvents.length) return;
-
-    const d = dqnEvents[0].payload;
-    const eps = d.epsilon != null ? d.epsilon.toFixed(3) : "?";
-    const steps = d.step_count || 0;
-    const totalR = d.total_reward != null ? d.total_reward.toFixed(1) : "0";
-    const epCount = (d.episode_rewards || []).length;
-    const mistCount = (d.mistakes || []).length;
-
-    const dqnInfo = $("dqnInfo");
-    if (dqnInfo) {
-      dqnInfo.innerHTML =
-        `Steps: <b>${steps}</b> | Eps: <b>${epCount}</b><br>` +
-        `\u03B5: <b>${eps}</b> | Reward: <b>${totalR}</b><br>` +
-        `Mistakes: <b>${mistCount}</b>`;
-    }
+    if (dqnEvents.length) renderDQN(dqnEvents[0].payload);
+  } catch {}
+}
 
-    const mc = $("dqnMistakes");
-    if (mc) {
-      mc.innerHTML = "";
-      for (const m of (d.mistakes || []).slice(-6)) {
-        const div = document.createElement("div");
-        div.className = "mistake";
-        div.innerHTML = `t=${m.tick}: <span class="bad">${m.bad_action}</span> &rarr; <span class="fix">${m.correction}</span>`;
-        mc.appendChild(div);
-      }
+function renderDQN(d) {
+  if (!d) return;
+  const eps = d.epsilon != null ? d.epsilon.toFixed(3) : "?";
+  const steps = d.step_count || 0;
+  const totalR = d.total_reward != null ? d.total_reward.toFixed(1) : "0";
+  const epCount = (d.episode_rewards || []).length;
+  const mistCount = (d.mistakes || []).length;
+
+  const dqnInfo = $("dqnInfo");
+  if (dqnInfo) {
+    dqnInfo.innerHTML =
+      `Steps: <b>${steps}</b> | Eps: <b>${epCount}</b><br>` +
+      `\u03B5: <b>${eps}</b> | Reward: <b>${totalR}</b><br>` +
+      `Mistakes: <b>${mistCount}</b>`;
+  }
+
+  const mc = $("dqnMistakes");
+  if (mc) {
+    mc.innerHTML = "";
+    for (const m of (d.mistakes || []).slice(-6)) {
+      const div = document.createElement("div");
+      div.className = "mistake";
+      div.innerHTML = `t=${m.tick}: <span class="bad">${m.bad_action}</span> &rarr; <span class="fix">${m.correction}</span>`;
+      mc.appendChild(div);
     }
+  }
 
-    const rewards = d.episode_rewards || [];
-    const losses = d.loss_history || [];
-    drawRewardChart(rewards.length >= 2 ? rewards : losses);
-  } catch {}
+  const rewards = d.episode_rewards || [];
+  const losses = d.loss_history || [];
+  drawRewardChart(rewards.length >= 2 ? rewards : losses);
 }
 
 function drawRewardChart(rewards) {
@@ -795,7 +860,7 @@ document.querySelectorAll(".layer-btn").forEach(btn => {
 
 // ─── MAIN LOOP ───
 async function refreshAll() {
-  await Promise.all([refreshStatus(), refreshGrid(), refreshEvents(), refreshDQN()]);
+  await Promise.all([refreshStatus(), refreshGrid()]);
 }
 
 async function loop() {
@@ -806,4 +871,6 @@ async function loop() {
 // Init
 setupZones();
 checkAndAutoSpawn();  // Auto-spawn agents if world is empty
+refreshDQN();
+startEventStream();
 loop();
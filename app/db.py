@@ -1,12 +1,22 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
+import time
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Optional
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncContextManager, AsyncIterator, Callable, Optional
 
 import aiosqlite
 
+logger = logging.getLogger("last_oasis")
+
+if TYPE_CHECKING:
+    from .archive import EventArchive
+
 
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
@@ -22,6 +32,69 @@ class DbEvent:
     created_at: str
 
 
+@dataclass(frozen=True)
+class EventFilter:
+    tick_min: Optional[int] = None
+    tick_max: Optional[int] = None
+    types: tuple[str, ...] = ()
+    agent_id: Optional[str] = None
+
+    def where(self) -> tuple[list[str], list[Any]]:
+        clauses: list[str] = []
+        params: list[Any] = []
+        if self.tick_min is not None:
+            clauses.append("tick >= ?")
+            params.append(self.tick_min)
+        if self.tick_max is not None:
+            clauses.append("tick <= ?")
+            params.append(self.tick_max)
+        if self.types:
+            clauses.append("type IN (" + ",".join("?" * len(self.types)) + ")")
+            params.extend(self.types)
+        if self.agent_id is not None:
+            clauses.append("agent_id = ?")
+            params.append(self.agent_id)
+        return clauses, params
+
+    def matches(self, e: DbEvent) -> bool:
+        if self.tick_min is not None and e.tick < self.tick_min:
+            return False
+        if self.tick_max is not None and e.tick > self.tick_max:
+            return False
+        if self.types and e.type not in self.types:
+            return False
+        if self.agent_id is not None and e.agent_id != self.agent_id:
+            return False
+        return True
+
+    def overlaps_ticks(self, tick_min: int, tick_max: int) -> bool:
+        if self.tick_min is not None and tick_max < self.tick_min:
+            return False
+        if self.tick_max is not None and tick_min > self.tick_max:
+            return False
+        return True
+
+
+def _event_from_row(r: Any) -> DbEvent:
+    return DbEvent(
+        id=int(r["id"]),
+        tick=int(r["tick"]),
+        type=str(r["type"]),
+        agent_id=str(r["agent_id"]) if r["agent_id"] is not None else None,
+        payload=json.loads(r["payload_json"]),
+        created_at=str(r["created_at"]),
+    )
+
+
+def event_ndjson_line(r: Any) -> bytes:
+    """One NDJSON line for an events row; payload_json is spliced in verbatim, never re-encoded."""
+    head = json.dumps(
+        {"id": r["id"], "tick": r["tick"], "type": r["type"], "agent_id": r["agent_id"], "created_at": r["created_at"]},
+        separators=(",", ":"),
+    )
+    return (head[:-1] + ',"payload":' + str(r["payload_json"]) + "}\n").encode("utf-8")
+
+
 async def connect(db_path: str) -> aiosqlite.Connection:
     conn = await aiosqlite.connect(db_path)
     await conn.execute("PRAGMA journal_mode=WAL;")
@@ -30,7 +103,55 @@ async def connect(db_path: str) -> aiosqlite.Connection:
     return conn
 
 
+async def connect_readonly(db_path: str) -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    await conn.execute("PRAGMA query_only=ON;")
+    conn.row_factory = aiosqlite.Row
+    return conn
+
+
+class ReadPool:
+    """Read-only connections for query paths. In WAL mode they read the last committed state
+    concurrently with the single writer connection, so they never wait on db_lock."""
+
+    def __init__(self, conns: list[aiosqlite.Connection]) -> None:
+        self._conns = conns
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        for c in conns:
+            self._idle.put_nowait(c)
+
+    @classmethod
+    async def open(cls, db_path: str, size: int) -> "ReadPool":
+        return cls([await connect_readonly(db_path) for _ in range(max(1, size))])
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        conn = await self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    async def close(self) -> None:
+        for c in self._conns:
+            await c.close()
+
+
 async def init_db(conn: aiosqlite.Connection) -> None:
+    cur = await conn.execute("PRAGMA auto_vacuum;")
+    row = await cur.fetchone()
+    if row is not None and int(row[0]) != 2:
+        # INCREMENTAL lets maintenance hand freed pages back; existing files need one VACUUM to switch.
+        # It rewrites the whole file once, so say so: on a large database startup pauses here.
+        cur = await conn.execute("SELECT count(*) FROM sqlite_master")
+        existing = int((await cur.fetchone())[0]) > 0
+        if existing:
+            logger.warning("db_vacuum_for_auto_vacuum: one-time full VACUUM of the existing database")
+        started = time.perf_counter()
+        await conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        await conn.execute("VACUUM;")
+        if existing:
+            logger.warning("db_vacuum_for_auto_vacuum done elapsed=%.3fs", time.perf_counter() - started)
     await conn.executescript(
         """
         CREATE TABLE IF NOT EXISTS agents (
@@ -58,11 +179,22 @@ async def init_db(conn: aiosqlite.Connection) -> None:
           created_at TEXT NOT NULL
         );
 
+        CREATE INDEX IF NOT EXISTS idx_events_type_tick ON events (type, tick);
+        CREATE INDEX IF NOT EXISTS idx_events_tick ON events (tick);
+
         CREATE TABLE IF NOT EXISTS world_snapshots (
           tick INTEGER PRIMARY KEY,
           state_json TEXT NOT NULL,
           created_at TEXT NOT NULL
         );
+
+        CREATE TABLE IF NOT EXISTS world_snapshot_frames (
+          tick INTEGER PRIMARY KEY,
+          kind TEXT NOT NULL,
+          key_tick INTEGER NOT NULL,
+          data BLOB NOT NULL,
+          created_at TEXT NOT NULL
+        );
         """
     )
     await conn.commit()
@@ -83,52 +215,141 @@ async def insert_event(
     return int(cur.lastrowid)
 
 
-async def list_events(conn: aiosqlite.Connection, limit: int) -> list[DbEvent]:
-    cur = await conn.execute(
-        "SELECT id, tick, type, agent_id, payload_json, created_at FROM events ORDER BY id DESC LIMIT ?",
-        (limit,),
+async def insert_events(
+    conn: aiosqlite.Connection, events: list[tuple[int, str, Optional[str], dict[str, Any]]]
+) -> list[int]:
+    """Insert (tick, type, agent_id, payload) rows in one transaction; returns their ids in order."""
+    if not events:
+        return []
+    now = utc_now_iso()
+    await conn.executemany(
+        "INSERT INTO events (tick, type, agent_id, payload_json, created_at) VALUES (?, ?, ?, ?, ?)",
+        [(tick, type, agent_id, json.dumps(payload, separators=(",", ":")), now) for tick, type, agent_id, payload in events],
     )
-    rows = await cur.fetchall()
-    out: list[DbEvent] = []
-    for r in rows:
-        out.append(
-            DbEvent(
-                id=int(r["id"]),
-                tick=int(r["tick"]),
-                type=str(r["type"]),
-                agent_id=str(r["agent_id"]) if r["agent_id"] is not None else None,
-                payload=json.loads(r["payload_json"]),
-                created_at=str(r["created_at"]),
-            )
-        )
-    return out
+    cur = await conn.execute("SELECT last_insert_rowid() AS i")
+    row = await cur.fetchone()
+    await conn.commit()
+    # a single writer connection inserts the batch with consecutive AUTOINCREMENT ids
+    last = int(row["i"])
+    return list(range(last - len(events) + 1, last + 1))
 
 
-async def list_actions_for_tick(conn: aiosqlite.Connection, tick: int) -> list[DbEvent]:
+async def list_events(
+    conn: aiosqlite.Connection,
+    limit: int,
+    archive: Optional["EventArchive"] = None,
+    flt: Optional[EventFilter] = None,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+) -> list[DbEvent]:
+    """Keyset-paginated events matching `flt`.
+
+    Newest first below `before_id` by default; oldest first above `after_id` when it is given.
+    Archived segments are read transparently when the live table cannot fill the page.
+    """
+    flt = flt or EventFilter()
+    clauses, params = flt.where()
+    ascending = after_id is not None
+    if ascending:
+        clauses.append("id > ?")
+        params.append(after_id)
+    elif before_id is not None:
+        clauses.append("id < ?")
+        params.append(before_id)
+    where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
     cur = await conn.execute(
-        "SELECT id, tick, type, agent_id, payload_json, created_at FROM events WHERE tick = ? AND type = ? ORDER BY id ASC",
-        (tick, "ACTION_SUBMITTED"),
+        "SELECT id, tick, type, agent_id, payload_json, created_at FROM events"
+        + where
+        + (" ORDER BY id ASC LIMIT ?" if ascending else " ORDER BY id DESC LIMIT ?"),
+        (*params, limit),
     )
-    rows = await cur.fetchall()
-    out: list[DbEvent] = []
-    for r in rows:
-        out.append(
-            DbEvent(
-                id=int(r["id"]),
-                tick=int(r["tick"]),
-                type=str(r["type"]),
-                agent_id=str(r["agent_id"]) if r["agent_id"] is not None else None,
-                payload=json.loads(r["payload_json"]),
-                created_at=str(r["created_at"]),
-            )
-        )
+    out = [_event_from_row(r) for r in await cur.fetchall()]
+    if archive is None:
+        return out
+
+    if ascending:
+        older = await asyncio.to_thread(archive.read_events, limit, flt, None, after_id)
+        if older:
+            out = sorted(older + out, key=lambda e: e.id)[:limit]
+    elif len(out) < limit:
+        floor_id = out[-1].id if out else before_id
+        out.extend(await asyncio.to_thread(archive.read_events, limit - len(out), flt, floor_id, None))
     return out
 
 
-async def get_latest_snapshot(conn: aiosqlite.Connection) -> Optional[tuple[int, dict[str, Any]]]:
+async def iter_event_ndjson(
+    open_reader: Callable[[], AsyncContextManager[aiosqlite.Connection]],
+    flt: Optional[EventFilter] = None,
+    archive: Optional["EventArchive"] = None,
+    after_id: int = 0,
+    limit: Optional[int] = None,
+    chunk_size: int = 1000,
+) -> AsyncIterator[bytes]:
+    """Stream matching events oldest first as NDJSON lines, archive first, then the live table.
+
+    Live rows are read in keyset chunks, each on a briefly borrowed reader connection, so an export
+    never pins a connection or a read transaction for its whole duration.
+    """
+    flt = flt or EventFilter()
+    remaining = limit
+    last_id = after_id  # archived rows are gone from the live table, so its cursor starts at after_id
+    if archive is not None:
+        for cluster in archive.clusters(flt, after_id=after_id):
+            for e in await asyncio.to_thread(archive.read_cluster, cluster, flt, after_id):
+                if remaining is not None and remaining <= 0:
+                    return
+                yield (json.dumps(
+                    {"id": e.id, "tick": e.tick, "type": e.type, "agent_id": e.agent_id, "created_at": e.created_at,
+                     "payload": e.payload},
+                    separators=(",", ":"),
+                ) + "\n").encode("utf-8")
+                if remaining is not None:
+                    remaining -= 1
+
+    clauses, params = flt.where()
+    where = " AND ".join(clauses + ["id > ?"])
+    while remaining is None or remaining > 0:
+        n = chunk_size if remaining is None else min(chunk_size, remaining)
+        async with open_reader() as conn:
+            cur = await conn.execute(
+                "SELECT id, tick, type, agent_id, payload_json, created_at FROM events WHERE "
+                + where
+                + " ORDER BY id ASC LIMIT ?",
+                (*params, last_id, n),
+            )
+            rows = await cur.fetchall()
+        if not rows:
+            return
+        for r in rows:
+            yield event_ndjson_line(r)
+        last_id = int(rows[-1]["id"])
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < n:
+            return
+
+
+async def list_actions_for_tick(conn: aiosqlite.Connection, tick: int, after_id: int = 0) -> list[DbEvent]:
     cur = await conn.execute(
-        "SELECT tick, state_json FROM world_snapshots ORDER BY tick DESC LIMIT 1"
+        "SELECT id, tick, type, agent_id, payload_json, created_at FROM events "
+        "WHERE tick = ? AND type = ? AND id > ? ORDER BY id ASC",
+        (tick, "ACTION_SUBMITTED", after_id),
     )
+    return [_event_from_row(r) for r in await cur.fetchall()]
+
+
+async def get_latest_snapshot(
+    conn: aiosqlite.Connection, at_or_before: Optional[int] = None
+) -> Optional[tuple[int, dict[str, Any]]]:
+    if at_or_before is None:
+        cur = await conn.execute(
+            "SELECT tick, state_json FROM world_snapshots ORDER BY tick DESC LIMIT 1"
+        )
+    else:
+        cur = await conn.execute(
+            "SELECT tick, state_json FROM world_snapshots WHERE tick <= ? ORDER BY tick DESC LIMIT 1",
+            (at_or_before,),
+        )
     row = await cur.fetchone()
     if row is None:
         return None
@@ -144,14 +365,137 @@ async def upsert_snapshot(conn: aiosqlite.Connection, tick: int, state: dict[str
     await conn.commit()
 
 
-async def get_max_resolved_tick(conn: aiosqlite.Connection) -> int:
-    cur = await conn.execute("SELECT MAX(tick) AS t FROM events WHERE type = ?", ("TICK_RESOLVED",))
+@dataclass(frozen=True)
+class SnapshotFrame:
+    tick: int
+    kind: str  # "key" or "delta"
+    key_tick: int
+    data: bytes
+
+
+async def insert_snapshot_frame(conn: aiosqlite.Connection, frame: SnapshotFrame) -> None:
+    await conn.execute(
+        "INSERT INTO world_snapshot_frames (tick, kind, key_tick, data, created_at) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(tick) DO UPDATE SET kind=excluded.kind, key_tick=excluded.key_tick, "
+        "data=excluded.data, created_at=excluded.created_at",
+        (frame.tick, frame.kind, frame.key_tick, frame.data, utc_now_iso()),
+    )
+    await conn.commit()
+
+
+async def get_latest_frame_tick(conn: aiosqlite.Connection, at_or_before: Optional[int] = None) -> Optional[int]:
+    if at_or_before is None:
+        cur = await conn.execute("SELECT MAX(tick) AS t FROM world_snapshot_frames")
+    else:
+        cur = await conn.execute("SELECT MAX(tick) AS t FROM world_snapshot_frames WHERE tick <= ?", (at_or_before,))
+    row = await cur.fetchone()
+    if row is None or row["t"] is None:
+        return None
+    return int(row["t"])
+
+
+async def get_oldest_frame_tick(conn: aiosqlite.Connection) -> Optional[int]:
+    cur = await conn.execute("SELECT MIN(tick) AS t FROM world_snapshot_frames")
+    row = await cur.fetchone()
+    if row is None or row["t"] is None:
+        return None
+    return int(row["t"])
+
+
+async def list_frame_chain(conn: aiosqlite.Connection, tick: int) -> list[SnapshotFrame]:
+    """Keyframe plus the deltas needed to rebuild the frame at `tick`, oldest first."""
+    cur = await conn.execute("SELECT key_tick FROM world_snapshot_frames WHERE tick = ?", (tick,))
+    row = await cur.fetchone()
+    if row is None:
+        return []
+    cur = await conn.execute(
+        "SELECT tick, kind, key_tick, data FROM world_snapshot_frames "
+        "WHERE key_tick = ? AND tick <= ? ORDER BY tick ASC",
+        (int(row["key_tick"]), tick),
+    )
+    rows = await cur.fetchall()
+    return [
+        SnapshotFrame(tick=int(r["tick"]), kind=str(r["kind"]), key_tick=int(r["key_tick"]), data=bytes(r["data"]))
+        for r in rows
+    ]
+
+
+async def prune_snapshot_frames(conn: aiosqlite.Connection, keep_keyframes: int) -> int:
+    """Drop every frame (and legacy JSON snapshot) older than the oldest retained keyframe."""
+    if keep_keyframes <= 0:
+        return 0
+    cur = await conn.execute(
+        "SELECT tick FROM world_snapshot_frames WHERE kind = 'key' ORDER BY tick DESC LIMIT 1 OFFSET ?",
+        (keep_keyframes - 1,),
+    )
+    row = await cur.fetchone()
+    if row is None:
+        return 0
+    cutoff = int(row["tick"])
+    cur = await conn.execute("DELETE FROM world_snapshot_frames WHERE tick < ?", (cutoff,))
+    removed = cur.rowcount
+    await conn.execute("DELETE FROM world_snapshots WHERE tick < ?", (cutoff,))
+    await conn.commit()
+    return int(removed)
+
+
+async def clear_snapshots(conn: aiosqlite.Connection) -> None:
+    await conn.execute("DELETE FROM world_snapshot_frames")
+    await conn.execute("DELETE FROM world_snapshots")
+    await conn.commit()
+
+
+async def get_max_resolved_tick(conn: aiosqlite.Connection, after_id: int = 0) -> int:
+    cur = await conn.execute(
+        "SELECT MAX(tick) AS t FROM events WHERE type = ? AND id > ?", ("TICK_RESOLVED", after_id)
+    )
     row = await cur.fetchone()
     if row is None or row["t"] is None:
         return 0
     return int(row["t"])
 
 
+async def get_last_reset_event_id(conn: aiosqlite.Connection) -> int:
+    """Events at or before this id belong to a world that /admin/reset-world discarded."""
+    cur = await conn.execute("SELECT MAX(id) AS i FROM events WHERE type = ?", ("WORLD_RESET",))
+    row = await cur.fetchone()
+    if row is None or row["i"] is None:
+        return 0
+    return int(row["i"])
+
+
+async def iter_replay_rows(
+    conn: aiosqlite.Connection,
+    from_tick: int,
+    to_tick: int,
+    after_id: int = 0,
+    chunk_size: int = 512,
+) -> AsyncIterator[tuple[int, str, Optional[str]]]:
+    """Stream (tick, type, value) for a tick range over one ordered cursor.
+
+    TICK_RESOLVED rows yield the raw JSON of the resolved actions, STATE_ANCHORED rows the anchored
+    hash, and AGENT_ENTERED / WORLD_RESET_IF_EXTINCT rows the agent id; the per-event payloads are
+    never decoded. Within a tick the resolution comes first, since entries logged at tick T happened
+    after step T.
+    """
+    cur = await conn.execute(
+        "SELECT tick, type, CASE type "
+        "WHEN 'TICK_RESOLVED' THEN json_extract(payload_json, '$.actions') "
+        "WHEN 'STATE_ANCHORED' THEN json_extract(payload_json, '$.state_hash') "
+        "ELSE agent_id END AS value "
+        "FROM events WHERE type IN ('TICK_RESOLVED', 'STATE_ANCHORED', 'AGENT_ENTERED', 'WORLD_RESET_IF_EXTINCT') "
+        "AND tick BETWEEN ? AND ? AND id > ? "
+        "ORDER BY tick ASC, CASE type WHEN 'TICK_RESOLVED' THEN 0 ELSE 1 END ASC, id ASC",
+        (from_tick, to_tick, after_id),
+    )
+    cur.iter_chunk_size = chunk_size
+    try:
+        async for r in cur:
+            yield int(r["tick"]), str(r["type"]), r["value"]
+    finally:
+        await cur.close()
+
+
 async def upsert_agent(conn: aiosqlite.Connection, agent_id: str, api_key: str, state: dict[str, Any]) -> None:
     await conn.execute(
         "INSERT INTO agents (agent_id, api_key, state_json, created_at) VALUES (?, ?, ?, ?) "
@@ -161,6 +505,24 @@ async def upsert_agent(conn: aiosqlite.Connection, agent_id: str, api_key: str,
     await conn.commit()
 
 
+async def update_agent_states(conn: aiosqlite.Connection, states: dict[str, dict[str, Any]]) -> None:
+    await conn.executemany(
+        "UPDATE agents SET state_json = ? WHERE agent_id = ?",
+        [(json.dumps(state, separators=(",", ":")), agent_id) for agent_id, state in states.items()],
+    )
+    await conn.commit()
+
+
+async def delete_agents(conn: aiosqlite.Connection) -> None:
+    await conn.execute("DELETE FROM agents")
+    await conn.commit()
+
+
+async def delete_entries(conn: aiosqlite.Connection) -> None:
+    await conn.execute("DELETE FROM entries")
+    await conn.commit()
+
+
 async def get_agent_by_token(conn: aiosqlite.Connection, api_key: str) -> Optional[tuple[str, dict[str, Any]]]:
     cur = await conn.execute(
         "SELECT agent_id, state_json FROM agents WHERE api_key = ? LIMIT 1",
@@ -172,12 +534,12 @@ async def get_agent_by_token(conn: aiosqlite.Connection, api_key: str) -> Option
     return str(row["agent_id"]), json.loads(row["state_json"])
 
 
-async def list_agents(conn: aiosqlite.Connection) -> list[tuple[str, dict[str, Any]]]:
-    cur = await conn.execute("SELECT agent_id, state_json FROM agents")
+async def list_agents(conn: aiosqlite.Connection) -> list[tuple[str, str, dict[str, Any]]]:
+    cur = await conn.execute("SELECT agent_id, api_key, state_json FROM agents")
     rows = await cur.fetchall()
-    out: list[tuple[str, dict[str, Any]]] = []
+    out: list[tuple[str, str, dict[str, Any]]] = []
     for r in rows:
-        out.append((str(r["agent_id"]), json.loads(r["state_json"])))
+        out.append((str(r["agent_id"]), str(r["api_key"]), json.loads(r["state_json"])))
     return out
 
 
@@ -11,13 +11,15 @@ from fastapi import FastAPI
 from fastapi import Request
 from fastapi.responses import JSONResponse
 from fastapi.responses import RedirectResponse
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
 
-from .api.routes import AppState, make_router
-from .db import connect, init_db, insert_event, list_agents, upsert_agent
-from .settings import settings
-from .world.snapshot import load_world, maybe_snapshot
-from .world.engine import AgentState
+from .api.arena_proxy import assign_workers, make_proxy_router, make_sim_router
+from .api.negotiation import NegotiationMiddleware
+from .api.routes import make_read_router, make_router
+from .arenas import Arena, ReplicaArena, ReplicaRefreshMiddleware
+from .metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware, monitor_loop_lag
+from .settings import ARENA_ID, settings
 
 # Configure logging IMMEDIATELY
 logging.basicConfig(
@@ -34,6 +36,11 @@ print("=" * 60, flush=True)
 def create_app() -> FastAPI:
     print("📦 Creating FastAPI app...", flush=True)
     app = FastAPI(title="The Last Oasis", version="0.1.0")
+    app.add_middleware(NegotiationMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    replicas: dict[str, ReplicaArena] = {}
+    if settings.server_role == "api":
+        app.add_middleware(ReplicaRefreshMiddleware, replicas=replicas)
     logger = logging.getLogger("last_oasis")
 
     dashboard_dir = Path(__file__).parent / "dashboard"
@@ -60,10 +67,30 @@ def create_app() -> FastAPI:
         """Simple health check endpoint for Railway/deployment platforms"""
         return {"status": "ok"}
 
+    def export_arena_metrics() -> None:
+        for arena in getattr(app.state, "arenas", {}).values():
+            arena.export_metrics()
+
+    REGISTRY.on_scrape(export_arena_metrics)
+
+    @app.get("/metrics")
+    async def metrics() -> Response:
+        """Prometheus text format. With ARENA_WORKERS each worker serves its own arenas' metrics."""
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
     @app.get("/")
     async def root() -> RedirectResponse:
         return RedirectResponse(url="/dashboard/")
 
+    if settings.arena_workers <= 0:
+
+        @app.get("/arenas")
+        async def list_arenas() -> dict[str, Any]:
+            arenas: dict[str, Arena] = getattr(app.state, "arenas", {})
+            root = getattr(app.state, "app_state", None)
+            root_id = next((wid for wid, a in arenas.items() if a.state is root), None)
+            return {"root": root_id, "items": [a.summary() for a in arenas.values()]}
+
     print("✅ Routes registered", flush=True)
 
     @app.on_event("startup")
@@ -71,96 +98,72 @@ def create_app() -> FastAPI:
         print("\n" + "=" * 60, flush=True)
         print("🚀 STARTUP EVENT TRIGGERED", flush=True)
         print("=" * 60, flush=True)
+        print(f"🗄️  STORAGE_BACKEND: {settings.storage_backend}", flush=True)
         print(f"📁 DB_PATH: {settings.db_path}", flush=True)
         print(f"📏 MAP_SIZE: {settings.map_size}", flush=True)
         print(f"⏱️  TICK_INTERVAL: {settings.tick_interval_ms}ms", flush=True)
+        if settings.arenas:
+            print(f"🏟️  ARENAS: {', '.join(settings.arenas)}", flush=True)
+        if settings.server_role:
+            print(f"🧩 SERVER_ROLE: {settings.server_role}", flush=True)
 
         try:
-            print("\n📊 Step 1: Connecting to database...", flush=True)
-            conn = await connect(settings.db_path)
-            print("✅ Database connection established", flush=True)
-
-            print("\n📊 Step 2: Initializing database schema...", flush=True)
-            await init_db(conn)
-            print("✅ Database schema initialized", flush=True)
-
-            print("\n📊 Step 3: Loading world state...", flush=True)
-            world = await load_world(conn, size=settings.map_size)
-            print(f"✅ World loaded successfully (current tick: {world.tick})", flush=True)
-
-            print("\n📊 Step 4: Loading agents...", flush=True)
-            agents = await list_agents(conn)
-            print(f"✅ Found {len(agents)} existing agents", flush=True)
-
-            for agent_id, state in agents:
-                if agent_id not in world.agents:
-                    world.add_agent(agent_id)
-                world.agents[agent_id] = AgentState.from_dict(state)
-            print("✅ Agents loaded into world", flush=True)
-
-            print("\n📊 Step 5: Creating app state...", flush=True)
-            app.state.app_state = AppState(
-                conn=conn,
-                world=world,
-                world_lock=asyncio.Lock(),
-                db_lock=asyncio.Lock(),
-                pending_actions={},
-                agent_names={},
-            )
-            print("✅ App state created", flush=True)
-
-            print("\n📊 Step 6: Including API router...", flush=True)
-            app.include_router(make_router(app.state.app_state))
-            print("✅ API router included", flush=True)
-
-            print("\n📊 Step 7: Recording startup event...", flush=True)
-            async with app.state.app_state.db_lock:
-                await insert_event(conn, tick=world.tick, type="WORLD_STARTED", payload={"tick": world.tick})
-            print("✅ Startup event recorded", flush=True)
-
-            print("\n📊 Step 8: Starting tick loop...", flush=True)
-
-            async def tick_loop() -> None:
-                while True:
-                    await asyncio.sleep(settings.tick_interval_ms / 1000.0)
-                    st: AppState = app.state.app_state
-                    async with st.world_lock:
-                        if sum(1 for a in st.world.agents.values() if a.alive) == 0 and not st.pending_actions:
-                            continue
-                        actions = dict(st.pending_actions)
-                        st.pending_actions.clear()
-                        events = st.world.step(actions)
-                        tick = st.world.tick
-                        agent_states: dict[str, Any] = {aid: a.to_dict() for aid, a in st.world.agents.items()}
-
-                    async with st.db_lock:
-                        await insert_event(conn, tick=tick, type="TICK_RESOLVED", payload={"actions": actions, "events": events})
-                        for e in events:
-                            et = str(e.get("type") or "EVENT")
-                            await insert_event(conn, tick=tick, type=et, agent_id=e.get("agent_id"), payload=e)
-
-                        for agent_id, state in agent_states.items():
-                            cur = await conn.execute("SELECT api_key FROM agents WHERE agent_id = ? LIMIT 1", (agent_id,))
-                            row = await cur.fetchone()
-                            if row is None:
-                                continue
-                            api_key = str(row["api_key"])
-                            await upsert_agent(conn, agent_id, api_key, state)
-
-                        await maybe_snapshot(conn, st.world, settings.snapshot_every_ticks)
-
-                    # Check for STATE_ANCHORED events and submit to chain
-                    for e in events:
-                        if e.get("type") == "STATE_ANCHORED":
-                            from app.chain.state_anchor import get_state_anchor_service
-                            anchor_svc = get_state_anchor_service()
-                            state_hash = e.get("state_hash", "")
-                            alive_count = e.get("alive_agents", 0)
-                            if state_hash:
-                                asyncio.create_task(anchor_svc.anchor_state(tick, state_hash, alive_count))
-
-            app.state.tick_task = asyncio.create_task(tick_loop())
-            print("✅ Tick loop started", flush=True)
+            world_ids = settings.arenas or ["default"]
+            for wid in world_ids:
+                if not ARENA_ID.match(wid):
+                    raise ValueError(f"invalid arena id: {wid!r}")
+            root_id = world_ids[0] if settings.arena_root is None else (settings.arena_root or None)
+            if root_id is not None and root_id not in world_ids:
+                raise ValueError(f"ARENA_ROOT {root_id!r} is not one of the arenas")
+            if settings.server_role not in ("", "sim", "api"):
+                raise ValueError(f"unknown SERVER_ROLE: {settings.server_role!r}")
+            if settings.server_role and settings.arena_workers > 0:
+                raise ValueError("SERVER_ROLE does not combine with ARENA_WORKERS")
+
+            if settings.server_role == "api":
+                app.state.arenas = replicas
+                for wid in world_ids:
+                    replica = await ReplicaArena.open(wid, named=bool(settings.arenas))
+                    replicas[wid] = replica
+                    app.include_router(make_read_router(replica.state), prefix=f"/arenas/{wid}")
+                    if wid == root_id:
+                        app.state.app_state = replica.state
+                        app.include_router(make_read_router(replica.state))
+                app.include_router(make_sim_router(settings.sim_url, world_ids))
+                for replica in replicas.values():
+                    replica.start()
+                print(f"✅ Serving reads from {len(replicas)} replica(s), forwarding the rest to {settings.sim_url}", flush=True)
+            elif settings.arena_workers > 0:
+                if not settings.arenas:
+                    raise ValueError("ARENA_WORKERS needs ARENAS")
+                workers = assign_workers(world_ids, settings.arena_workers, settings.arena_worker_base_port)
+                app.state.arena_workers = workers
+                print(f"\n📊 Starting {len(workers)} arena worker processes...", flush=True)
+                for w in workers:
+                    await w.start()
+                for w in workers:
+                    await w.wait_ready()
+                    print(f"✅ Worker on port {w.port}: {', '.join(w.world_ids)}", flush=True)
+                app.include_router(make_proxy_router(workers, root_id))
+                print("✅ Arena router included", flush=True)
+            else:
+                arenas: dict[str, Arena] = {}
+                app.state.arenas = arenas
+                for wid in world_ids:
+                    arena = await Arena.open(wid, named=bool(settings.arenas))
+                    arenas[wid] = arena
+                    app.include_router(make_router(arena.state), prefix=f"/arenas/{wid}")
+                    if wid == root_id:
+                        app.state.app_state = arena.state
+                        app.include_router(make_router(arena.state))
+                print("✅ API routers included", flush=True)
+
+                print("\n📊 Starting tick loops...", flush=True)
+                for arena in arenas.values():
+                    arena.start()
+                print(f"✅ {len(arenas)} tick loop(s) started", flush=True)
+
+            app.state.loop_lag_task = asyncio.create_task(monitor_loop_lag())
 
             print("\n" + "=" * 60, flush=True)
             print("🎉 STARTUP COMPLETE - Server is ready!", flush=True)
@@ -178,12 +181,13 @@ def create_app() -> FastAPI:
     @app.on_event("shutdown")
     async def on_shutdown() -> None:
         print("\n🛑 Shutting down...", flush=True)
-        task = getattr(app.state, "tick_task", None)
-        if task is not None:
-            task.cancel()
-        st = getattr(app.state, "app_state", None)
-        if st is not None:
-            await st.conn.close()
+        lag_task = getattr(app.state, "loop_lag_task", None)
+        if lag_task is not None:
+            lag_task.cancel()
+        for arena in getattr(app.state, "arenas", {}).values():
+            await arena.close()
+        for w in getattr(app.state, "arena_workers", []):
+            await w.stop()
         print("✅ Shutdown complete", flush=True)
 
     return app
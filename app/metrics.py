@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from bisect import bisect_left
+from typing import Any, Callable
+
+# Process-wide metrics in the Prometheus text format, without a client library. Recording is a
+# dict lookup plus an increment (histograms add a bisect), so it can sit on the tick path and on
+# every request. Values that already live elsewhere (pending actions, scheduler and limiter
+# counters) are copied into gauges by on_scrape() callbacks when /metrics is read.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; fine at the low end where lock waits and steps live
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1_000, 4_000, 16_000, 64_000, 256_000, 1_000_000, 4_000_000, 16_000_000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def _labelstr(self, values: tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{k}="{_escape(str(v))}"' for k, v in zip(self.labels, values)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def set(self, value: float, *labels: str) -> None:
+        """For counts kept elsewhere and mirrored here at scrape time."""
+        self._values[labels] = value
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{self._labelstr(k)} {_fmt(v)}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def remove(self, *labels: str) -> None:
+        self._values.pop(labels, None)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{self._labelstr(k)} {_fmt(v)}" for k, v in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (last one is +Inf, not cumulative), sum]
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return 0 if series is None else sum(series[0])
+
+    def samples(self) -> list[str]:
+        out: list[str] = []
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, math.inf), counts):
+                cumulative += n
+                le = 'le="' + _fmt(bound) + '"'
+                out.append(f"{self.name}_bucket{self._labelstr(labels, le)} {cumulative}")
+            out.append(f"{self.name}_sum{self._labelstr(labels)} {_fmt(total[0])}")
+            out.append(f"{self.name}_count{self._labelstr(labels)} {cumulative}")
+        return out
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[_Metric] = []
+        self._on_scrape: list[Callable[[], None]] = []
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(
+        self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def _add(self, metric: Any) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def on_scrape(self, fn: Callable[[], None]) -> None:
+        """Run `fn` before every render, to copy values kept elsewhere into gauges."""
+        self._on_scrape.append(fn)
+
+    def render(self) -> str:
+        for fn in self._on_scrape:
+            fn()
+        lines: list[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+TICK_SECONDS = REGISTRY.histogram(
+    "last_oasis_tick_seconds", "Tick time by phase: engine step under world_lock, persistence under db_lock.",
+    ("world", "phase"),
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "last_oasis_http_request_seconds", "HTTP request latency by route template.", ("method", "route", "status"),
+)
+LOCK_WAIT_SECONDS = REGISTRY.histogram(
+    "last_oasis_lock_wait_seconds", "Time spent waiting to acquire world_lock / db_lock.", ("world", "lock"),
+)
+EVENTS = REGISTRY.counter("last_oasis_events_total", "Events written to storage, by type.", ("world", "type"))
+SNAPSHOT_SECONDS = REGISTRY.histogram(
+    "last_oasis_snapshot_seconds", "Time to encode and write a snapshot frame.", ("kind",),
+)
+SNAPSHOT_BYTES = REGISTRY.histogram(
+    "last_oasis_snapshot_bytes", "Encoded snapshot frame size.", ("kind",), buckets=SIZE_BUCKETS,
+)
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "last_oasis_event_loop_lag_seconds", "How late a periodic asyncio sleep woke up.",
+)
+
+# mirrored from AppState at scrape time, see Arena.export_metrics
+WORLD_TICK = REGISTRY.gauge("last_oasis_world_tick", "Current world tick.", ("world",))
+ALIVE_AGENTS = REGISTRY.gauge("last_oasis_alive_agents", "Alive agents.", ("world",))
+PENDING_ACTIONS = REGISTRY.gauge("last_oasis_pending_actions", "Actions queued for the next tick.", ("world",))
+TICK_INTERVAL_SECONDS = REGISTRY.gauge(
+    "last_oasis_tick_interval_seconds", "Current tick interval (grows under TICK_ADAPTIVE).", ("world",)
+)
+TICK_OVERRUNS = REGISTRY.counter("last_oasis_tick_overruns_total", "Ticks that finished past the next deadline.", ("world",))
+TICKS_SKIPPED = REGISTRY.counter("last_oasis_ticks_skipped_total", "Deadlines dropped by the catch-up policy.", ("world",))
+RATE_LIMITED = REGISTRY.counter(
+    "last_oasis_rate_limited_total", "Requests rejected by the per-agent rate limiter.", ("world", "route_class")
+)
+RESPONSE_CACHE = REGISTRY.counter(
+    "last_oasis_response_cache_total", "Cached read responses served (hit) or built (miss).", ("world", "result")
+)
+EVENT_STREAM_VIEWERS = REGISTRY.gauge(
+    "last_oasis_event_stream_viewers", "Open /admin/events/stream connections.", ("world",)
+)
+
+
+class TimedLock(asyncio.Lock):
+    """asyncio.Lock that records how long each acquire() waited."""
+
+    def __init__(self, world_id: str, name: str) -> None:
+        super().__init__()
+        self._labels = (world_id, name)
+
+    async def acquire(self) -> bool:
+        started = time.perf_counter()
+        await super().acquire()
+        LOCK_WAIT_SECONDS.observe(time.perf_counter() - started, *self._labels)
+        return True
+
+
+class MetricsMiddleware:
+    """Times every HTTP request. Routes are labelled by their path template (mounts by their
+    prefix) so label values stay bounded; requests that matched nothing share one label."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", None) or scope.get("root_path") or "unmatched",
+                str(status[0]),
+            )
+
+
+async def monitor_loop_lag(interval_s: float = 0.5) -> None:
+    """Runs until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval_s)
+        LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - started - interval_s))
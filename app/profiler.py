@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from types import CodeType
+from typing import Iterator, Optional
+
+# On-demand profiling of the running server. Tick loops and request handlers all run on the
+# event-loop thread, so both modes look at that thread only:
+#
+#   sample   a SIGALRM interval timer records the interrupted stack every `interval_s`; cheap
+#            enough to run under load. Signals only reach the main thread, which is where
+#            uvicorn runs the loop; elsewhere (e.g. a test client's loop thread) a helper thread
+#            reads the loop thread's stack via sys._current_frames() instead, which is biased
+#            towards the points where the loop releases the GIL. Output is collapsed stacks
+#            ("root;caller;callee weight" per line, weight in microseconds of wall time), the
+#            input format of flamegraph.pl/speedscope.
+#   cprofile cProfile on the loop thread for the window. Exact call counts but every call pays
+#            for it, so expect the server to slow down while it runs.
+#
+# Only one capture runs at a time (process-wide); callers get ProfilerBusy otherwise.
+
+MODES = ("sample", "cprofile")
+SORT_KEYS = frozenset(pstats.Stats.sort_arg_dict_default)  # type: ignore[attr-defined]
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+_busy = False
+
+
+@lru_cache(maxsize=8192)
+def _code_name(code: CodeType) -> str:
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_qualname}".replace(";", ":").replace(" ", "_")
+
+
+def _stack(frame: Optional[object]) -> str:
+    names = []
+    while frame is not None:
+        names.append(_code_name(frame.f_code))  # type: ignore[attr-defined]
+        frame = frame.f_back  # type: ignore[attr-defined]
+    return ";".join(reversed(names))
+
+
+def _sample_thread(thread_id: int, duration_s: float, interval_s: float) -> Counter[str]:
+    # The sampler only runs while it holds the GIL, which the loop thread gives up at once when
+    # it blocks in select() but only after the switch interval when it is busy. Weighting each
+    # sample by the time since the previous one corrects for part of that.
+    stacks: Counter[str] = Counter()
+    prev = time.perf_counter()
+    deadline = prev + duration_s
+    while prev < deadline:
+        time.sleep(interval_s)
+        frame = sys._current_frames().get(thread_id)
+        now = time.perf_counter()
+        if frame is None:
+            break
+        stacks[_stack(frame)] += round((now - prev) * 1_000_000)
+        del frame
+        prev = now
+    return stacks
+
+
+def collapsed(stacks: Counter[str]) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common())
+
+
+async def _sample_signal(duration_s: float, interval_s: float) -> Counter[str]:
+    stacks: Counter[str] = Counter()
+    prev = time.perf_counter()
+
+    def on_alarm(signum: int, frame: Optional[object]) -> None:
+        nonlocal prev
+        now = time.perf_counter()
+        stacks[_stack(frame)] += round((now - prev) * 1_000_000)
+        prev = now
+
+    old = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, interval_s, interval_s)
+    try:
+        await asyncio.sleep(duration_s)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old)
+    return stacks
+
+
+async def sample(duration_s: float, interval_s: float = 0.005) -> Counter[str]:
+    """Collapsed-stack weights for the calling event loop's thread over `duration_s`."""
+    interval_s = max(0.001, interval_s)
+    with _claim():
+        if hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread():
+            return await _sample_signal(duration_s, interval_s)
+        return await asyncio.to_thread(_sample_thread, threading.get_ident(), duration_s, interval_s)
+
+
+async def cprofile(duration_s: float) -> pstats.Stats:
+    with _claim():
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            await asyncio.sleep(duration_s)
+        finally:
+            prof.disable()
+    return pstats.Stats(prof)
+
+
+def stats_text(stats: pstats.Stats, sort: str = "cumulative", limit: int = 60) -> str:
+    out = io.StringIO()
+    stats.stream = out  # type: ignore[attr-defined]
+    stats.sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def stats_dump(stats: pstats.Stats) -> bytes:
+    """The binary .pstats format, readable with pstats.Stats(path) or snakeviz."""
+    return marshal.dumps(stats.stats)  # type: ignore[attr-defined]
+
+
+@contextmanager
+def _claim() -> Iterator[None]:
+    global _busy
+    if _busy:
+        raise ProfilerBusy("a profile capture is already running")
+    _busy = True
+    try:
+        yield
+    finally:
+        _busy = False
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from .settings import Settings
+
+# Ticks are due at fixed deadlines (origin + n * interval) rather than "interval after the last
+# one finished", so step and database time no longer stretch the period. When a tick finishes
+# after the next deadline has already passed, the catch-up policy decides what happens:
+#
+#   skip      drop the missed deadlines and stay on the original phase (default)
+#   compress  run missed ticks back to back, at most `max_catchup` of them, then skip the rest
+#   slow      re-anchor: the next tick is due one interval after the late one finished
+#
+# With `adaptive`, the interval grows while ticks use most of their budget and shrinks back
+# towards the configured interval once load drops.
+
+logger = logging.getLogger("last_oasis")
+
+POLICIES = ("skip", "compress", "slow")
+
+
+class TickScheduler:
+    def __init__(
+        self,
+        interval_ms: int,
+        policy: str = "skip",
+        adaptive: bool = False,
+        max_interval_ms: int = 0,
+        max_catchup: int = 5,
+        name: str = "",
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"unknown tick catch-up policy: {policy!r}")
+        self.base_interval_s = max(1, int(interval_ms)) / 1000.0
+        self.interval_s = self.base_interval_s
+        self.max_interval_s = max(self.base_interval_s, (max_interval_ms or 4 * interval_ms) / 1000.0)
+        self.policy = policy
+        self.adaptive = adaptive
+        self.max_catchup = max(1, max_catchup)
+        self.name = name
+        self.clock = clock
+        self.sleep = sleep
+        self._next: Optional[float] = None
+        self._started = 0.0
+
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.early = 0  # lockstep ticks that ran before their deadline
+        self.idle = 0  # deadlines that passed with nothing to step
+        self.last_work_s = 0.0
+        self.max_work_s = 0.0
+        self.max_lateness_s = 0.0
+        self.load = 0.0  # EWMA of work time / interval
+
+    @classmethod
+    def from_settings(cls, s: Settings, name: str = "") -> "TickScheduler":
+        return cls(
+            s.tick_interval_ms,
+            policy=s.tick_catchup,
+            adaptive=s.tick_adaptive,
+            max_interval_ms=s.tick_max_interval_ms,
+            max_catchup=s.tick_max_catchup,
+            name=name,
+        )
+
+    def until_next(self) -> float:
+        """Seconds until the next tick is due (0 when it is already due or not yet scheduled)."""
+        if self._next is None:
+            return 0.0
+        return max(0.0, self._next - self.clock())
+
+    async def wait(self, ready: Optional[asyncio.Event] = None) -> None:
+        """Sleep until the next tick is due, or until `ready` is set (lockstep mode). An early
+        tick re-anchors the deadline, so the timer stays a fallback one interval behind it."""
+        now = self.clock()
+        if self._next is None:
+            self._next = now + self.interval_s
+        early = False
+        if self._next > now:
+            if ready is None:
+                await self.sleep(self._next - now)
+            else:
+                try:
+                    await asyncio.wait_for(ready.wait(), self._next - now)
+                    early = True
+                except asyncio.TimeoutError:
+                    pass
+        self._started = self.clock()
+        if early:
+            self.early += 1
+            self._next = self._started
+        self.max_lateness_s = max(self.max_lateness_s, self._started - self._next)
+
+    def finish(self, tick: Optional[int] = None) -> None:
+        """Record the tick that started at the last wait() and schedule the next one."""
+        now = self.clock()
+        work = now - self._started
+        self.ticks += 1
+        self.last_work_s = work
+        self.max_work_s = max(self.max_work_s, work)
+        self.load = work / self.interval_s if self.ticks == 1 else 0.8 * self.load + 0.2 * (work / self.interval_s)
+
+        due = self._next if self._next is not None else self._started
+        self._next = due + self.interval_s
+        if now > self._next:
+            self.overruns += 1
+            missed = int((now - self._next) // self.interval_s) + 1
+            if self.policy == "skip":
+                dropped = missed
+                self._next += missed * self.interval_s
+            elif self.policy == "compress":
+                dropped = max(0, missed - self.max_catchup)
+                self._next += dropped * self.interval_s
+            else:
+                dropped = 0
+                self._next = now + self.interval_s
+            self.skipped += dropped
+            logger.warning(
+                "tick_overrun world=%s tick=%s work_ms=%.1f interval_ms=%.0f policy=%s behind=%s dropped=%s",
+                self.name, tick, work * 1000, self.interval_s * 1000, self.policy, missed, dropped,
+            )
+
+        if self.adaptive:
+            if self.load > 0.8 and self.interval_s < self.max_interval_s:
+                self.interval_s = min(self.max_interval_s, self.interval_s * 1.25)
+                logger.info("tick_interval_raised world=%s interval_ms=%.0f load=%.2f", self.name, self.interval_s * 1000, self.load)
+            elif self.load < 0.4 and self.interval_s > self.base_interval_s:
+                self.interval_s = max(self.base_interval_s, self.interval_s * 0.9)
+
+    def pass_idle(self) -> None:
+        """Move on from a deadline at which nothing was stepped. No work is recorded, so idle
+        deadlines stay out of the load average, the interval adaptation and the overrun stats."""
+        self.idle += 1
+        due = self._next if self._next is not None else self._started
+        self._next = due + self.interval_s
+        now = self.clock()
+        if now > self._next:
+            self._next += (int((now - self._next) // self.interval_s) + 1) * self.interval_s
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "adaptive": self.adaptive,
+            "interval_ms": round(self.interval_s * 1000, 1),
+            "base_interval_ms": round(self.base_interval_s * 1000, 1),
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "early": self.early,
+            "idle": self.idle,
+            "last_work_ms": round(self.last_work_s * 1000, 2),
+            "max_work_ms": round(self.max_work_s * 1000, 2),
+            "max_lateness_ms": round(self.max_lateness_s * 1000, 2),
+            "load": round(self.load, 3),
+        }
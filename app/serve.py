@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Optional
+
+from .settings import settings
+
+# python -m app.serve runs the split deployment: one simulation process (SERVER_ROLE=sim) on
+# 127.0.0.1:SIM_PORT that owns the worlds, storage and tick loops, and API_WORKERS uvicorn worker
+# processes (SERVER_ROLE=api) sharing $PORT that answer reads from the shared world buffers and
+# forward everything else to the simulation. If either side exits, the other is stopped too.
+
+
+def _uvicorn(role: str, host: str, port: int, workers: int = 1) -> subprocess.Popen:
+    env = dict(os.environ, SERVER_ROLE=role, SIM_URL=settings.sim_url)
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", host, "--port", str(port)]
+    if workers > 1:
+        cmd += ["--workers", str(workers)]
+    return subprocess.Popen(cmd, env=env)
+
+
+def _wait_ready(proc: subprocess.Popen, url: str, timeout_s: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while True:
+        if proc.poll() is not None:
+            raise RuntimeError(f"simulation process exited with {proc.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=2.0) as resp:
+                if resp.status == 200:
+                    return
+        except OSError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("simulation process did not become ready")
+        time.sleep(0.25)
+
+
+def _stop(proc: Optional[subprocess.Popen]) -> None:
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(15.0)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def main() -> int:
+    port = int(os.environ.get("PORT", "8000"))
+    workers = settings.api_workers or os.cpu_count() or 1
+    sim: Optional[subprocess.Popen] = None
+    api: Optional[subprocess.Popen] = None
+
+    def on_signal(signum: int, frame: object) -> None:
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, on_signal)
+    try:
+        print(f"🧩 Starting simulation process on 127.0.0.1:{settings.sim_port}...", flush=True)
+        sim = _uvicorn("sim", "127.0.0.1", settings.sim_port)
+        # uvicorn answers only after the startup event, i.e. once the worlds are loaded
+        _wait_ready(sim, f"{settings.sim_url}/health")
+        print(f"✅ Simulation ready; starting {workers} API worker(s) on port {port}", flush=True)
+        api = _uvicorn("api", os.environ.get("HOST", "0.0.0.0"), port, workers)
+        while sim.poll() is None and api.poll() is None:
+            time.sleep(0.5)
+        code = sim.returncode if sim.returncode is not None else api.returncode
+        print(f"❌ {'Simulation' if sim.returncode is not None else 'API workers'} exited with {code}", flush=True)
+        return code or 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        _stop(api)
+        _stop(sim)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
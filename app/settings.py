@@ -1,15 +1,58 @@
 from __future__ import annotations
 
 import os
+import re
+from pathlib import Path
+from typing import Optional
 
 
 class Settings:
     def __init__(self) -> None:
+        # Comma-separated arena ids; empty runs one unnamed arena on DB_PATH as before
+        self.arenas = [a.strip() for a in os.environ.get("ARENAS", "").split(",") if a.strip()]
+        # Arena also served at the root paths (/world/...); defaults to the first, "" for none
+        self.arena_root = os.environ.get("ARENA_ROOT")
+        self.arena_workers = int(os.environ.get("ARENA_WORKERS", "0"))
+        self.arena_worker_base_port = int(os.environ.get("ARENA_WORKER_BASE_PORT", "9100"))
+        # "" runs everything in one process; "sim" also publishes every world version to
+        # SHARED_WORLD_PATH; "api" serves reads from those buffers and forwards the rest to SIM_URL
+        self.server_role = os.environ.get("SERVER_ROLE", "").strip().lower()
+        self.shared_world_path = os.environ.get("SHARED_WORLD_PATH", "")
+        self.sim_port = int(os.environ.get("SIM_PORT", "9200"))
+        self.sim_url = os.environ.get("SIM_URL") or f"http://127.0.0.1:{self.sim_port}"
+        self.api_workers = int(os.environ.get("API_WORKERS", "0"))  # python -m app.serve; 0 = one per CPU
+        self.replica_poll_ms = int(os.environ.get("REPLICA_POLL_MS", "10"))
+        self.storage_backend = os.environ.get("STORAGE_BACKEND", "sqlite").strip().lower()
         self.db_path = os.environ.get("DB_PATH", "last_oasis.sqlite3")
+        self.storage_log_path = os.environ.get("STORAGE_LOG_PATH", "")
+        self.action_log_path = os.environ.get("ACTION_LOG_PATH", "")
+        self.action_log_flush_ms = int(os.environ.get("ACTION_LOG_FLUSH_MS", "50"))
+        self.read_pool_size = int(os.environ.get("READ_POOL_SIZE", "4"))
         self.tick_interval_ms = int(os.environ.get("TICK_INTERVAL_MS", "1200"))
+        # "timer" ticks every interval; "lockstep" also ticks as soon as every alive agent has acted
+        self.tick_mode = os.environ.get("TICK_MODE", "timer").strip().lower()
+        self.tick_catchup = os.environ.get("TICK_CATCHUP", "skip").strip().lower()
+        self.tick_max_catchup = int(os.environ.get("TICK_MAX_CATCHUP", "5"))
+        self.tick_adaptive = os.environ.get("TICK_ADAPTIVE", "0").strip().lower() in ("1", "true", "yes")
+        self.tick_max_interval_ms = int(os.environ.get("TICK_MAX_INTERVAL_MS", "0"))
         self.snapshot_every_ticks = int(os.environ.get("SNAPSHOT_EVERY_TICKS", "10"))
+        self.snapshot_keyframe_every = int(os.environ.get("SNAPSHOT_KEYFRAME_EVERY", "10"))
+        self.snapshot_keep_keyframes = int(os.environ.get("SNAPSHOT_KEEP_KEYFRAMES", "3"))
+        self.event_archive_dir = os.environ.get("EVENT_ARCHIVE_DIR", "")
+        self.event_retention_ticks = int(os.environ.get("EVENT_RETENTION_TICKS", "2000"))
+        self.event_segment_ticks = int(os.environ.get("EVENT_SEGMENT_TICKS", "500"))
+        self.maintenance_every_ticks = int(os.environ.get("MAINTENANCE_EVERY_TICKS", "100"))
+        self.time_travel_cache_size = int(os.environ.get("TIME_TRAVEL_CACHE_SIZE", "16"))
         self.map_size = int(os.environ.get("MAP_SIZE", "20"))
         self.obs_radius = int(os.environ.get("OBS_RADIUS", "3"))
+        self.long_poll_max_s = float(os.environ.get("LONG_POLL_MAX_S", "30"))
+        self.profile_max_s = float(os.environ.get("PROFILE_MAX_S", "30"))
+        self.batch_max_agents = int(os.environ.get("BATCH_MAX_AGENTS", "5000"))
+        self.grid_delta_max_ticks = int(os.environ.get("GRID_DELTA_MAX_TICKS", "50"))
+        self.rate_limit_observation_per_s = float(os.environ.get("RATE_LIMIT_OBSERVATION_PER_S", "5"))
+        self.rate_limit_observation_burst = float(os.environ.get("RATE_LIMIT_OBSERVATION_BURST", "10"))
+        self.rate_limit_action_per_s = float(os.environ.get("RATE_LIMIT_ACTION_PER_S", "5"))
+        self.rate_limit_action_burst = float(os.environ.get("RATE_LIMIT_ACTION_BURST", "10"))
         self.entry_price_asset = os.environ.get("ENTRY_PRICE_ASSET", "USDC")
         self.entry_price_amount = os.environ.get("ENTRY_PRICE_AMOUNT", "1.0")
         self.entry_demo_secret = os.environ.get("ENTRY_DEMO_SECRET", "demo")
@@ -17,4 +60,15 @@ class Settings:
         self.entry_fee_contract_address = os.environ.get("ENTRY_FEE_CONTRACT_ADDRESS")
 
 
+ARENA_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def arena_path(path: str, world_id: Optional[str]) -> str:
+    """Per-arena variant of a file path: last_oasis.sqlite3 -> last_oasis.<world_id>.sqlite3."""
+    if not world_id:
+        return path
+    p = Path(path)
+    return str(p.with_name(f"{p.stem}.{world_id}{p.suffix}"))
+
+
 settings = Settings()
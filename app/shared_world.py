@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import time
+from typing import TYPE_CHECKING, Any, Optional
+
+from .world.engine import WorldState
+from .world.snapshot import decode_keyframe, world_keyframe
+
+if TYPE_CHECKING:
+    from .api.routes import AppState
+
+# With SERVER_ROLE=sim the simulation process publishes every world version into a memory-mapped
+# file, and API worker processes (SERVER_ROLE=api) rebuild a read-only replica from it.
+#
+#   header (64 bytes): magic "LOWB" | u32 layout | u64 seq | u64 tick | u64 extras_len | u64 frame_len
+#   extras: JSON with epoch, version, dirty stamps, agent names and tokens
+#   frame:  a snapshot keyframe (world/snapshot.py)
+#
+# The header works as a seqlock: the writer makes `seq` odd, writes the body, then makes it even
+# again. A reader copies the body and keeps it only if `seq` was even and unchanged around the
+# copy. The file only grows, so a reader's older, shorter mapping stays valid until it remaps.
+# Tokens are in the file, so it is created 0600 like the database that already holds them.
+
+_MAGIC = b"LOWB"
+_LAYOUT = 1
+_HEADER = struct.Struct("<4sIQQQQ")
+_HEADER_SIZE = 64
+_SEQ_OFFSET = 8
+_INITIAL_SIZE = 1 << 20
+
+
+class WorldPublisher:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        # never shrink: readers from a previous run may still map the old length
+        size = max(os.fstat(self._fd).st_size, _INITIAL_SIZE)
+        os.ftruncate(self._fd, size)
+        self._mm = mmap.mmap(self._fd, size)
+        # start from the clock so a restarted simulation never repeats a seq readers have seen
+        self._seq = time.time_ns() // 1000 * 2
+        _HEADER.pack_into(self._mm, 0, _MAGIC, _LAYOUT, self._seq, 0, 0, 0)
+        self.published = 0
+
+    def publish(self, state: "AppState") -> None:
+        """Write the current world, names and tokens. Synchronous, so it sees one consistent version."""
+        world = state.world
+        extras = json.dumps(
+            {
+                "epoch": world.epoch,
+                "version": world.version,
+                "tile_changed": world.tile_changed,
+                "agent_changed": world.agent_changed,
+                "names": state.agent_names,
+                "tokens": state.tokens,
+            },
+            separators=(",", ":"),
+        ).encode("utf-8")
+        frame = world_keyframe(world, level=1)
+        end = _HEADER_SIZE + len(extras) + len(frame)
+        if end > len(self._mm):
+            size = max(end * 2, len(self._mm) * 2)
+            self._mm.close()
+            os.ftruncate(self._fd, size)
+            self._mm = mmap.mmap(self._fd, size)
+
+        mm = self._mm
+        self._seq += 1
+        struct.pack_into("<Q", mm, _SEQ_OFFSET, self._seq)
+        # everything, lengths included, is written while seq is odd; the even seq goes last
+        _HEADER.pack_into(mm, 0, _MAGIC, _LAYOUT, self._seq, world.tick, len(extras), len(frame))
+        mm[_HEADER_SIZE : _HEADER_SIZE + len(extras)] = extras
+        mm[_HEADER_SIZE + len(extras) : end] = frame
+        self._seq += 1
+        struct.pack_into("<Q", mm, _SEQ_OFFSET, self._seq)
+        self.published += 1
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+
+class WorldReader:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._fd = os.open(path, os.O_RDONLY)
+        try:
+            self._mm = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+        except ValueError:  # still empty
+            os.close(self._fd)
+            raise
+        self.seq = 0  # last seq returned by read()
+
+    def changed(self) -> bool:
+        """Cheap check (one 8-byte read) for a version newer than the last read()."""
+        return struct.unpack_from("<Q", self._mm, _SEQ_OFFSET)[0] != self.seq
+
+    def read(self, timeout_s: float = 0.5) -> Optional[tuple[dict[str, Any], bytes]]:
+        """(extras, keyframe) of the latest published version, or None if nothing was published.
+
+        Blocks while a publish is in progress, for up to `timeout_s`; callers on the event loop
+        run it in a thread.
+        """
+        deadline = time.monotonic() + timeout_s
+        while True:
+            magic, layout, seq, _tick, extras_len, frame_len = _HEADER.unpack_from(self._mm, 0)
+            if magic != _MAGIC or layout != _LAYOUT:
+                raise ValueError(f"{self.path} is not a shared world buffer")
+            if not seq & 1:
+                if frame_len == 0:
+                    return None
+                end = _HEADER_SIZE + extras_len + frame_len
+                if end > len(self._mm):
+                    self._remap()
+                    continue
+                body = self._mm[_HEADER_SIZE:end]
+                if struct.unpack_from("<Q", self._mm, _SEQ_OFFSET)[0] == seq:
+                    self.seq = seq
+                    return json.loads(body[:extras_len]), body[extras_len:]
+                # the writer moved on during the copy
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"no consistent read of {self.path}")
+            time.sleep(0.0002)
+
+    def _remap(self) -> None:
+        self._mm.close()
+        self._mm = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+
+def decode_world(extras: dict[str, Any], frame: bytes) -> WorldState:
+    world = decode_keyframe(frame)
+    world.epoch = extras["epoch"]
+    world.version = int(extras["version"])
+    world.tile_changed = list(extras["tile_changed"])
+    world.agent_changed = dict(extras["agent_changed"])
+    return world
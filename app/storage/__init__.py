@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING, Optional
+
+from ..settings import arena_path
+from .base import NewEvent, Storage
+from .logfile import LogFileStorage
+from .memory import MemoryStorage
+from .sqlite import SqliteStorage
+
+if TYPE_CHECKING:
+    from ..settings import Settings
+
+__all__ = ["LogFileStorage", "MemoryStorage", "NewEvent", "SqliteStorage", "Storage", "create_storage"]
+
+
+def create_storage(settings: "Settings", world_id: Optional[str] = None) -> Storage:
+    """The backend selected by STORAGE_BACKEND (sqlite, memory or logfile), not yet opened.
+
+    Each named arena gets its own files, derived from the configured paths.
+    """
+    backend = settings.storage_backend
+    db_path = arena_path(settings.db_path, world_id)
+    if backend == "sqlite":
+        archive_dir = settings.event_archive_dir
+        if archive_dir and world_id:
+            archive_dir = os.path.join(archive_dir, world_id)
+        return SqliteStorage(
+            db_path,
+            read_pool_size=settings.read_pool_size,
+            archive_dir=archive_dir or f"{db_path}.segments",
+            segment_ticks=settings.event_segment_ticks,
+            retention_ticks=settings.event_retention_ticks,
+        )
+    if backend == "memory":
+        return MemoryStorage(retention_ticks=settings.event_retention_ticks)
+    if backend == "logfile":
+        return LogFileStorage(
+            arena_path(settings.storage_log_path, world_id) if settings.storage_log_path else f"{db_path}.log",
+            retention_ticks=settings.event_retention_ticks,
+        )
+    raise ValueError(f"unknown STORAGE_BACKEND: {backend!r}")
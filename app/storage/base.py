@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from typing import Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Optional
+
+from ..db import DbEvent, EventFilter, SnapshotFrame
+from ..metrics import EVENTS
+
+NewEvent = tuple[int, str, Optional[str], dict[str, Any]]  # (tick, type, agent_id, payload)
+ReplayRow = tuple[int, str, Optional[str]]  # (tick, type, value)
+
+
+async def fill_replay_gaps(
+    rows: AsyncIterator[ReplayRow],
+    from_tick: int,
+    to_tick: int,
+    actions_for_tick: Callable[[int], Awaitable[list[DbEvent]]],
+) -> AsyncIterator[ReplayRow]:
+    """Pass `rows` through, adding (tick, "ACTION_SUBMITTED", actions JSON) for every tick in
+    (from_tick, to_tick] that has no TICK_RESOLVED row (e.g. crash mid-write).
+
+    The actions are the raw submissions, a later one for the same agent overwriting an earlier
+    one. Backends pass a lookup on the connection that serves `rows`, so a replay never needs a
+    second reader while its cursor is open.
+    """
+    stepped = from_tick
+
+    async def gaps(until: int) -> AsyncIterator[ReplayRow]:
+        nonlocal stepped
+        while stepped < until:
+            stepped += 1
+            actions: dict[str, dict[str, Any]] = {}
+            for ev in await actions_for_tick(stepped):
+                if ev.agent_id is not None:
+                    actions[ev.agent_id] = dict(ev.payload)
+            yield stepped, "ACTION_SUBMITTED", json.dumps(actions, separators=(",", ":"))
+
+    async for tick, kind, value in rows:
+        # entries and anchors at tick T happened after step T, so T itself must be stepped first
+        async for gap in gaps(tick - 1 if kind == "TICK_RESOLVED" else tick):
+            yield gap
+        stepped = max(stepped, tick)
+        yield tick, kind, value
+    async for gap in gaps(to_tick):
+        yield gap
+
+
+class Storage(ABC):
+    """Persistence for events, snapshots, agents and entries.
+
+    Write methods are called under AppState.db_lock, one writer at a time. Read methods may be
+    called concurrently with writes and with each other.
+    """
+
+    name: str = "storage"
+    world_id: str = ""  # metrics label, set by Arena.open
+    # AppState.db_lock, set by Arena.open; for backends whose reads can share the writer connection
+    db_lock: Optional[asyncio.Lock] = None
+
+    async def open(self) -> None:
+        """Create schema / load existing data. Called once before any other method."""
+
+    async def close(self) -> None:
+        """Flush and release resources."""
+
+    async def maintenance(self, world_tick: int) -> int:
+        """Periodic housekeeping (retention, compaction). Returns the number of events moved or dropped.
+
+        Called without db_lock; implementations take write_lock() around their own writes only.
+        """
+        return 0
+
+    def write_lock(self) -> AsyncContextManager[Any]:
+        """db_lock, or nothing when the storage is used on its own."""
+        return self.db_lock if self.db_lock is not None else nullcontext()
+
+    # events
+
+    def _count_events(self, events: list[NewEvent]) -> None:
+        for e in events:
+            EVENTS.inc(self.world_id, e[1])
+
+    @abstractmethod
+    async def insert_event(
+        self, tick: int, type: str, payload: dict[str, Any], agent_id: Optional[str] = None
+    ) -> int: ...
+
+    @abstractmethod
+    async def insert_events(self, events: list[NewEvent]) -> list[int]:
+        """Insert a batch atomically where the backend supports it; returns ids in order."""
+
+    @abstractmethod
+    async def list_events(
+        self,
+        limit: int,
+        flt: Optional[EventFilter] = None,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+    ) -> list[DbEvent]:
+        """Newest first below before_id, or oldest first above after_id when it is given."""
+
+    @abstractmethod
+    def iter_event_ndjson(
+        self, flt: Optional[EventFilter] = None, after_id: int = 0, limit: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """Matching events oldest first, one NDJSON line each."""
+
+    @abstractmethod
+    async def list_actions_for_tick(self, tick: int, after_id: int = 0) -> list[DbEvent]: ...
+
+    @abstractmethod
+    def iter_replay_rows(
+        self, from_tick: int, to_tick: int, after_id: int = 0
+    ) -> AsyncIterator[ReplayRow]:
+        """(tick, type, value) for replay, see db.iter_replay_rows; ticks without a TICK_RESOLVED
+        row are filled in from their submissions, see fill_replay_gaps."""
+
+    @abstractmethod
+    async def get_max_resolved_tick(self, after_id: int = 0) -> int: ...
+
+    @abstractmethod
+    async def get_last_reset_event_id(self) -> int: ...
+
+    # snapshots
+
+    @abstractmethod
+    async def insert_snapshot_frame(self, frame: SnapshotFrame) -> None: ...
+
+    @abstractmethod
+    async def get_latest_frame_tick(self, at_or_before: Optional[int] = None) -> Optional[int]: ...
+
+    @abstractmethod
+    async def get_oldest_frame_tick(self) -> Optional[int]: ...
+
+    @abstractmethod
+    async def list_frame_chain(self, tick: int) -> list[SnapshotFrame]: ...
+
+    @abstractmethod
+    async def prune_snapshot_frames(self, keep_keyframes: int) -> int: ...
+
+    @abstractmethod
+    async def clear_snapshots(self) -> None: ...
+
+    async def get_legacy_snapshot(self, at_or_before: Optional[int] = None) -> Optional[tuple[int, dict[str, Any]]]:
+        """Full-JSON snapshot from before keyframe/delta frames existed, if the backend has any."""
+        return None
+
+    # agents and entries
+
+    @abstractmethod
+    async def upsert_agent(self, agent_id: str, api_key: str, state: dict[str, Any]) -> None: ...
+
+    @abstractmethod
+    async def update_agent_states(self, states: dict[str, dict[str, Any]]) -> None:
+        """Overwrite the state of already registered agents; unknown agent ids are ignored."""
+
+    @abstractmethod
+    async def list_agents(self) -> list[tuple[str, str, dict[str, Any]]]:
+        """(agent_id, api_key, state) for every registered agent."""
+
+    @abstractmethod
+    async def delete_agents(self) -> None: ...
+
+    @abstractmethod
+    async def insert_entry(self, tx_ref: str, agent_id: str, paid_asset: str, paid_amount: str) -> None: ...
+
+    @abstractmethod
+    async def delete_entries(self) -> None: ...
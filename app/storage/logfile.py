@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import base64
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, BinaryIO, Optional
+
+from .memory import MemoryStorage
+
+logger = logging.getLogger("last_oasis")
+
+
+def _encode_op(op: dict[str, Any]) -> bytes:
+    if op["op"] == "frame":
+        op = {**op, "frame": {**op["frame"], "data": base64.b64encode(op["frame"]["data"]).decode("ascii")}}
+    return (json.dumps(op, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _decode_op(line: bytes) -> dict[str, Any]:
+    op = json.loads(line)
+    if op["op"] == "frame":
+        op["frame"]["data"] = base64.b64decode(op["frame"]["data"])
+    return op
+
+
+class LogFileStorage(MemoryStorage):
+    """MemoryStorage made durable by an append-only JSON-lines log of every mutation.
+
+    The log is replayed on open. Each write call is appended and flushed to the OS as one batch;
+    fsync happens on maintenance and close, so a machine crash can lose the last few batches but a
+    process crash cannot. Maintenance that drops events rewrites the log as a compact checkpoint.
+    """
+
+    name = "logfile"
+
+    def __init__(self, path: str, retention_ticks: int = 0) -> None:
+        super().__init__(retention_ticks=retention_ticks)
+        self.path = Path(path)
+        self._fh: Optional[BinaryIO] = None
+
+    async def open(self) -> None:
+        good = 0
+        if self.path.exists():
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn final write
+                    try:
+                        self._apply(_decode_op(line))
+                    except (ValueError, KeyError):
+                        break
+                    good += len(line)
+            if good < self.path.stat().st_size:
+                logger.warning("storage_log_truncated path=%s kept_bytes=%s", self.path, good)
+                with open(self.path, "r+b") as f:
+                    f.truncate(good)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "ab")
+
+    async def close(self) -> None:
+        if self._fh is not None:
+            self._sync()
+            self._fh.close()
+            self._fh = None
+
+    async def _commit(self, op: dict[str, Any]) -> None:
+        if self._fh is None:
+            raise RuntimeError("storage_not_open")
+        self._fh.write(_encode_op(op))
+        self._fh.flush()
+        self._apply(op)
+
+    def _sync(self) -> None:
+        if self._fh is not None:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    async def maintenance(self, world_tick: int) -> int:
+        dropped = await super().maintenance(world_tick)
+        async with self.write_lock():
+            if dropped:
+                self._checkpoint()
+            else:
+                self._sync()
+        return dropped
+
+    def _checkpoint(self) -> None:
+        """Rewrite the log as the minimal op stream that rebuilds the current state."""
+        ops: list[dict[str, Any]] = [{"op": "seq", "next_id": self._next_id}]
+        ops.extend(
+            {"op": "agent", "agent_id": aid, "api_key": key, "state_json": state_json}
+            for aid, (key, state_json) in self._agents.items()
+        )
+        ops.extend({"op": "entry", "entry": list(e)} for e in self._entries)
+        ops.extend(
+            {"op": "frame", "frame": {"tick": f.tick, "kind": f.kind, "key_tick": f.key_tick, "data": f.data}}
+            for f in sorted(self._frames.values(), key=lambda f: f.tick)
+        )
+        for i in range(0, len(self._events), 1000):
+            ops.append(
+                {
+                    "op": "events",
+                    "rows": [
+                        [r.id, r.tick, r.type, r.agent_id, r.payload_json, r.created_at]
+                        for r in self._events[i : i + 1000]
+                    ],
+                }
+            )
+
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            for op in ops:
+                f.write(_encode_op(op))
+            f.flush()
+            os.fsync(f.fileno())
+        if self._fh is not None:
+            self._fh.close()
+        os.replace(tmp, self.path)
+        self._fh = open(self.path, "ab")
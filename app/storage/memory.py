@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import bisect
+import json
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Optional
+
+from ..db import DbEvent, EventFilter, SnapshotFrame, event_ndjson_line, utc_now_iso
+from .base import NewEvent, ReplayRow, Storage, fill_replay_gaps
+
+_REPLAY_TYPES = ("TICK_RESOLVED", "STATE_ANCHORED", "AGENT_ENTERED", "WORLD_RESET_IF_EXTINCT")
+
+
+@dataclass(frozen=True)
+class _Row:
+    """An events row as SQLite would hold it; indexable like aiosqlite.Row for event_ndjson_line."""
+
+    id: int
+    tick: int
+    type: str
+    agent_id: Optional[str]
+    payload_json: str
+    created_at: str
+
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, key)
+
+    def event(self) -> DbEvent:
+        return DbEvent(
+            id=self.id,
+            tick=self.tick,
+            type=self.type,
+            agent_id=self.agent_id,
+            payload=json.loads(self.payload_json),
+            created_at=self.created_at,
+        )
+
+
+class MemoryStorage(Storage):
+    """Everything in process memory, nothing survives a restart. Meant for tests and benchmarks.
+
+    Every mutation is expressed as an op dict passed through _apply, so a subclass can persist the
+    op stream and rebuild the same state by replaying it (see LogFileStorage).
+    """
+
+    name = "memory"
+
+    def __init__(self, retention_ticks: int = 0) -> None:
+        self.retention_ticks = retention_ticks
+        self._events: list[_Row] = []
+        self._ids: list[int] = []
+        self._by_tick: dict[int, list[_Row]] = {}
+        self._next_id = 1
+        self._last_reset_id = 0
+        self._frames: dict[int, SnapshotFrame] = {}
+        self._agents: dict[str, tuple[str, str]] = {}  # agent_id -> (api_key, state_json)
+        self._entries: list[tuple[str, str, str, str, str]] = []
+
+    async def _commit(self, op: dict[str, Any]) -> None:
+        self._apply(op)
+
+    def _apply(self, op: dict[str, Any]) -> None:
+        kind = op["op"]
+        if kind == "events":
+            for values in op["rows"]:
+                self._add_row(_Row(*values))
+        elif kind == "seq":
+            self._next_id = max(self._next_id, int(op["next_id"]))
+        elif kind == "frame":
+            f = SnapshotFrame(**op["frame"])
+            self._frames[f.tick] = f
+        elif kind == "prune_frames":
+            for t in [t for t in self._frames if t < int(op["cutoff"])]:
+                del self._frames[t]
+        elif kind == "clear_snapshots":
+            self._frames.clear()
+        elif kind == "agent":
+            self._agents[op["agent_id"]] = (op["api_key"], op["state_json"])
+        elif kind == "agent_states":
+            for agent_id, state_json in op["states"].items():
+                if agent_id in self._agents:
+                    self._agents[agent_id] = (self._agents[agent_id][0], state_json)
+        elif kind == "delete_agents":
+            self._agents.clear()
+        elif kind == "entry":
+            self._entries.append(tuple(op["entry"]))
+        elif kind == "delete_entries":
+            self._entries.clear()
+        elif kind == "trim":
+            self._trim(int(op["cutoff_tick"]), int(op["reset_id"]))
+        else:
+            raise ValueError(f"unknown_storage_op:{kind}")
+
+    def _add_row(self, row: _Row) -> None:
+        self._events.append(row)
+        self._ids.append(row.id)
+        self._by_tick.setdefault(row.tick, []).append(row)
+        self._next_id = max(self._next_id, row.id + 1)
+        if row.type == "WORLD_RESET":
+            self._last_reset_id = row.id
+
+    def _trim(self, cutoff_tick: int, reset_id: int) -> int:
+        keep = [r for r in self._events if r.tick >= cutoff_tick and r.id >= reset_id]
+        dropped = len(self._events) - len(keep)
+        self._events = keep
+        self._ids = [r.id for r in keep]
+        self._by_tick = {}
+        for r in keep:
+            self._by_tick.setdefault(r.tick, []).append(r)
+        return dropped
+
+    async def maintenance(self, world_tick: int) -> int:
+        """Drop events past the retention horizon; there is no archive to move them to."""
+        if self.retention_ticks <= 0:
+            return 0
+        horizon = world_tick - self.retention_ticks
+        oldest_frame = await self.get_oldest_frame_tick()
+        if oldest_frame is not None:
+            horizon = min(horizon, oldest_frame)
+        async with self.write_lock():
+            before = len(self._events)
+            await self._commit({"op": "trim", "cutoff_tick": horizon, "reset_id": self._last_reset_id})
+            return before - len(self._events)
+
+    # events
+
+    async def insert_event(
+        self, tick: int, type: str, payload: dict[str, Any], agent_id: Optional[str] = None
+    ) -> int:
+        return (await self.insert_events([(tick, type, agent_id, payload)]))[0]
+
+    async def insert_events(self, events: list[NewEvent]) -> list[int]:
+        if not events:
+            return []
+        now = utc_now_iso()
+        first = self._next_id
+        rows = [
+            [first + i, tick, type, agent_id, json.dumps(payload, separators=(",", ":")), now]
+            for i, (tick, type, agent_id, payload) in enumerate(events)
+        ]
+        await self._commit({"op": "events", "rows": rows})
+        self._count_events(events)
+        return [r[0] for r in rows]
+
+    async def list_events(
+        self,
+        limit: int,
+        flt: Optional[EventFilter] = None,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+    ) -> list[DbEvent]:
+        flt = flt or EventFilter()
+        out: list[DbEvent] = []
+        if after_id is not None:
+            for r in self._events[bisect.bisect_right(self._ids, after_id):]:
+                if len(out) >= limit:
+                    break
+                if flt.matches(r):
+                    out.append(r.event())
+        else:
+            hi = len(self._ids) if before_id is None else bisect.bisect_left(self._ids, before_id)
+            for r in reversed(self._events[:hi]):
+                if len(out) >= limit:
+                    break
+                if flt.matches(r):
+                    out.append(r.event())
+        return out
+
+    async def iter_event_ndjson(
+        self, flt: Optional[EventFilter] = None, after_id: int = 0, limit: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        flt = flt or EventFilter()
+        remaining = limit
+        # rows are re-located by id on every step, so a concurrent trim cannot skip or repeat any
+        last_id = after_id
+        while remaining is None or remaining > 0:
+            i = bisect.bisect_right(self._ids, last_id)
+            if i >= len(self._events):
+                return
+            r = self._events[i]
+            last_id = r.id
+            if flt.matches(r):
+                yield event_ndjson_line(r)
+                if remaining is not None:
+                    remaining -= 1
+
+    async def list_actions_for_tick(self, tick: int, after_id: int = 0) -> list[DbEvent]:
+        return [
+            r.event()
+            for r in self._by_tick.get(tick, [])
+            if r.type == "ACTION_SUBMITTED" and r.id > after_id
+        ]
+
+    def iter_replay_rows(self, from_tick: int, to_tick: int, after_id: int = 0) -> AsyncIterator[ReplayRow]:
+        return fill_replay_gaps(
+            self._replay_rows(from_tick, to_tick, after_id),
+            from_tick,
+            to_tick,
+            lambda tick: self.list_actions_for_tick(tick, after_id),
+        )
+
+    async def _replay_rows(self, from_tick: int, to_tick: int, after_id: int) -> AsyncIterator[ReplayRow]:
+        for tick in range(from_tick, to_tick + 1):
+            rows = [r for r in self._by_tick.get(tick, []) if r.type in _REPLAY_TYPES and r.id > after_id]
+            rows.sort(key=lambda r: (r.type != "TICK_RESOLVED", r.id))
+            for r in rows:
+                if r.type == "TICK_RESOLVED":
+                    actions = json.loads(r.payload_json).get("actions")
+                    value = json.dumps(actions, separators=(",", ":")) if actions is not None else None
+                elif r.type == "STATE_ANCHORED":
+                    value = json.loads(r.payload_json).get("state_hash")
+                else:
+                    value = r.agent_id
+                yield r.tick, r.type, value
+
+    async def get_max_resolved_tick(self, after_id: int = 0) -> int:
+        ticks = [r.tick for r in self._events if r.type == "TICK_RESOLVED" and r.id > after_id]
+        return max(ticks) if ticks else 0
+
+    async def get_last_reset_event_id(self) -> int:
+        return self._last_reset_id
+
+    # snapshots
+
+    async def insert_snapshot_frame(self, frame: SnapshotFrame) -> None:
+        await self._commit(
+            {"op": "frame", "frame": {"tick": frame.tick, "kind": frame.kind, "key_tick": frame.key_tick, "data": frame.data}}
+        )
+
+    async def get_latest_frame_tick(self, at_or_before: Optional[int] = None) -> Optional[int]:
+        ticks = [t for t in self._frames if at_or_before is None or t <= at_or_before]
+        return max(ticks) if ticks else None
+
+    async def get_oldest_frame_tick(self) -> Optional[int]:
+        return min(self._frames) if self._frames else None
+
+    async def list_frame_chain(self, tick: int) -> list[SnapshotFrame]:
+        frame = self._frames.get(tick)
+        if frame is None:
+            return []
+        return sorted(
+            (f for f in self._frames.values() if f.key_tick == frame.key_tick and f.tick <= tick),
+            key=lambda f: f.tick,
+        )
+
+    async def prune_snapshot_frames(self, keep_keyframes: int) -> int:
+        if keep_keyframes <= 0:
+            return 0
+        keys = sorted((t for t, f in self._frames.items() if f.kind == "key"), reverse=True)
+        if len(keys) < keep_keyframes:
+            return 0
+        cutoff = keys[keep_keyframes - 1]
+        removed = sum(1 for t in self._frames if t < cutoff)
+        if removed:
+            await self._commit({"op": "prune_frames", "cutoff": cutoff})
+        return removed
+
+    async def clear_snapshots(self) -> None:
+        await self._commit({"op": "clear_snapshots"})
+
+    # agents and entries
+
+    async def upsert_agent(self, agent_id: str, api_key: str, state: dict[str, Any]) -> None:
+        await self._commit(
+            {"op": "agent", "agent_id": agent_id, "api_key": api_key, "state_json": json.dumps(state, separators=(",", ":"))}
+        )
+
+    async def update_agent_states(self, states: dict[str, dict[str, Any]]) -> None:
+        await self._commit(
+            {
+                "op": "agent_states",
+                "states": {aid: json.dumps(s, separators=(",", ":")) for aid, s in states.items() if aid in self._agents},
+            }
+        )
+
+    async def list_agents(self) -> list[tuple[str, str, dict[str, Any]]]:
+        return [(aid, key, json.loads(state_json)) for aid, (key, state_json) in self._agents.items()]
+
+    async def delete_agents(self) -> None:
+        await self._commit({"op": "delete_agents"})
+
+    async def insert_entry(self, tx_ref: str, agent_id: str, paid_asset: str, paid_amount: str) -> None:
+        await self._commit({"op": "entry", "entry": [tx_ref, agent_id, paid_asset, paid_amount, utc_now_iso()]})
+
+    async def delete_entries(self) -> None:
+        await self._commit({"op": "delete_entries"})
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+import aiosqlite
+
+from .. import db
+from ..archive import EventArchive, recover_segments, run_maintenance
+from ..db import DbEvent, EventFilter, ReadPool, SnapshotFrame
+from .base import NewEvent, ReplayRow, Storage, fill_replay_gaps
+
+
+class SqliteStorage(Storage):
+    """The aiosqlite store: one writer connection, an optional read-only pool for queries, and an
+    optional on-disk archive for events past the retention horizon."""
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        db_path: str,
+        read_pool_size: int = 4,
+        archive_dir: Optional[str] = None,
+        segment_ticks: int = 500,
+        retention_ticks: int = 0,
+    ) -> None:
+        self.db_path = db_path
+        self.read_pool_size = read_pool_size
+        self.archive_dir = archive_dir
+        self.segment_ticks = segment_ticks
+        self.retention_ticks = retention_ticks
+        self.conn: Optional[aiosqlite.Connection] = None
+        self.read_pool: Optional[ReadPool] = None
+        self.archive: Optional[EventArchive] = None
+
+    async def open(self) -> None:
+        self.conn = await db.connect(self.db_path)
+        await db.init_db(self.conn)
+        if self.read_pool_size > 0 and self.db_path != ":memory:":
+            self.read_pool = await ReadPool.open(self.db_path, self.read_pool_size)
+        if self.archive_dir and self.retention_ticks > 0:
+            self.archive = EventArchive(self.archive_dir, segment_ticks=self.segment_ticks)
+            await recover_segments(self.conn, self.archive)
+
+    async def close(self) -> None:
+        if self.read_pool is not None:
+            await self.read_pool.close()
+        if self.conn is not None:
+            await self.conn.close()
+
+    async def maintenance(self, world_tick: int) -> int:
+        return await run_maintenance(
+            self._w, self.reader, self.write_lock, self.archive, world_tick, self.retention_ticks
+        )
+
+    @property
+    def _w(self) -> aiosqlite.Connection:
+        if self.conn is None:
+            raise RuntimeError("storage_not_open")
+        return self.conn
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """A pooled read-only connection; in WAL mode it never waits on the writer.
+
+        Without a pool reads go to the writer connection, under db_lock so they never run in the
+        middle of a write's transaction.
+        """
+        if self.read_pool is None:
+            if self.db_lock is None:
+                yield self._w
+            else:
+                async with self.db_lock:
+                    yield self._w
+        else:
+            async with self.read_pool.acquire() as conn:
+                yield conn
+
+    # events
+
+    async def insert_event(
+        self, tick: int, type: str, payload: dict[str, Any], agent_id: Optional[str] = None
+    ) -> int:
+        event_id = await db.insert_event(self._w, tick=tick, type=type, payload=payload, agent_id=agent_id)
+        self._count_events([(tick, type, agent_id, payload)])
+        return event_id
+
+    async def insert_events(self, events: list[NewEvent]) -> list[int]:
+        ids = await db.insert_events(self._w, events)
+        self._count_events(events)
+        return ids
+
+    async def list_events(
+        self,
+        limit: int,
+        flt: Optional[EventFilter] = None,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+    ) -> list[DbEvent]:
+        async with self.reader() as conn:
+            return await db.list_events(
+                conn, limit, archive=self.archive, flt=flt, before_id=before_id, after_id=after_id
+            )
+
+    def iter_event_ndjson(
+        self, flt: Optional[EventFilter] = None, after_id: int = 0, limit: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        return db.iter_event_ndjson(self.reader, flt=flt, archive=self.archive, after_id=after_id, limit=limit)
+
+    async def list_actions_for_tick(self, tick: int, after_id: int = 0) -> list[DbEvent]:
+        async with self.reader() as conn:
+            return await db.list_actions_for_tick(conn, tick, after_id)
+
+    async def iter_replay_rows(
+        self, from_tick: int, to_tick: int, after_id: int = 0
+    ) -> AsyncIterator[ReplayRow]:
+        async with self.reader() as conn:
+            rows = db.iter_replay_rows(conn, from_tick, to_tick, after_id)
+            async for row in fill_replay_gaps(
+                rows, from_tick, to_tick, lambda tick: db.list_actions_for_tick(conn, tick, after_id)
+            ):
+                yield row
+
+    async def get_max_resolved_tick(self, after_id: int = 0) -> int:
+        async with self.reader() as conn:
+            return await db.get_max_resolved_tick(conn, after_id)
+
+    async def get_last_reset_event_id(self) -> int:
+        async with self.reader() as conn:
+            return await db.get_last_reset_event_id(conn)
+
+    # snapshots
+
+    async def insert_snapshot_frame(self, frame: SnapshotFrame) -> None:
+        await db.insert_snapshot_frame(self._w, frame)
+
+    async def get_latest_frame_tick(self, at_or_before: Optional[int] = None) -> Optional[int]:
+        async with self.reader() as conn:
+            return await db.get_latest_frame_tick(conn, at_or_before)
+
+    async def get_oldest_frame_tick(self) -> Optional[int]:
+        async with self.reader() as conn:
+            return await db.get_oldest_frame_tick(conn)
+
+    async def list_frame_chain(self, tick: int) -> list[SnapshotFrame]:
+        async with self.reader() as conn:
+            return await db.list_frame_chain(conn, tick)
+
+    async def prune_snapshot_frames(self, keep_keyframes: int) -> int:
+        return await db.prune_snapshot_frames(self._w, keep_keyframes)
+
+    async def clear_snapshots(self) -> None:
+        await db.clear_snapshots(self._w)
+
+    async def get_legacy_snapshot(self, at_or_before: Optional[int] = None) -> Optional[tuple[int, dict[str, Any]]]:
+        async with self.reader() as conn:
+            return await db.get_latest_snapshot(conn, at_or_before)
+
+    # agents and entries
+
+    async def upsert_agent(self, agent_id: str, api_key: str, state: dict[str, Any]) -> None:
+        await db.upsert_agent(self._w, agent_id, api_key, state)
+
+    async def update_agent_states(self, states: dict[str, dict[str, Any]]) -> None:
+        await db.update_agent_states(self._w, states)
+
+    async def list_agents(self) -> list[tuple[str, str, dict[str, Any]]]:
+        async with self.reader() as conn:
+            return await db.list_agents(conn)
+
+    async def delete_agents(self) -> None:
+        await db.delete_agents(self._w)
+
+    async def insert_entry(self, tx_ref: str, agent_id: str, paid_asset: str, paid_amount: str) -> None:
+        await db.insert_entry(self._w, tx_ref, agent_id, paid_asset, paid_amount)
+
+    async def delete_entries(self) -> None:
+        await db.delete_entries(self._w)
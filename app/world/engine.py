@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import hashlib
+import uuid
 from dataclasses import dataclass
 from typing import Any, Optional
 
+from .rankings import RankedIndex, score_key, trust_key
 from .rules import apply_world_tick, hazard_damage
 
 
@@ -57,6 +59,20 @@ class AgentState:
             "alliances": list(self.alliances),
         }
 
+    def view_key(self) -> tuple[Any, ...]:
+        """Cheap fingerprint of everything an observer can see; changes whenever the agent does."""
+        return (
+            self.x,
+            self.y,
+            self.hp,
+            self.alive,
+            tuple(self.inventory.items()),
+            self.trust_score,
+            self.betrayals,
+            len(self.trade_history),
+            len(self.alliances),
+        )
+
     @staticmethod
     def from_dict(d: dict[str, Any]) -> "AgentState":
         return AgentState(
@@ -74,12 +90,13 @@ class AgentState:
 
 
 class WorldState:
-    def __init__(self, size: int, tick: int = 0) -> None:
+    def __init__(self, size: int, tick: int = 0, grid: Optional[list[list[dict[str, Any]]]] = None) -> None:
         self.size = size
         self.tick = tick
-        self.grid: list[list[dict[str, Any]]] = [
-            [make_tile(x, y) for x in range(size)] for y in range(size)
-        ]
+        # `grid` lets loaders hand over tiles they already have instead of generating fresh ones
+        self.grid: list[list[dict[str, Any]]] = (
+            grid if grid is not None else [[make_tile(x, y) for x in range(size)] for y in range(size)]
+        )
         self.agents: dict[str, AgentState] = {}
         # Dynamic Market Pricing
         self.market_price: float = 1.0  # base price per resource unit
@@ -87,6 +104,17 @@ class WorldState:
         # On-chain State Anchoring
         self.last_anchor_tick: int = 0
         self.state_hash: str = ""
+        # Dirty tracking for delta views. Stamps hold the tick a tile/agent last changed in; changes
+        # made between ticks (entries) are stamped tick + 1 so a viewer already at `tick` still sees
+        # them. `version` counts every mutation; `epoch` changes whenever stamps stop being comparable.
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
+        self.tile_changed: list[int] = [tick] * (size * size)
+        self.agent_changed: dict[str, int] = {}
+        # Ranked views for the leaderboard and reputation endpoints, kept current by step();
+        # code that replaces entries of `agents` directly calls rerank() or reindex().
+        self.leaderboard = RankedIndex(score_key)
+        self.reputation = RankedIndex(trust_key)
 
     def to_dict(self) -> dict[str, Any]:
         return {
@@ -102,15 +130,24 @@ class WorldState:
 
     @staticmethod
     def from_dict(d: dict[str, Any]) -> "WorldState":
-        ws = WorldState(size=int(d["size"]), tick=int(d["tick"]))
-        ws.grid = d["grid"]
+        ws = WorldState(size=int(d["size"]), tick=int(d["tick"]), grid=d["grid"])
         ws.agents = {k: AgentState.from_dict(v) for k, v in dict(d.get("agents", {})).items()}
         ws.market_price = float(d.get("market_price", 1.0))
         ws.recent_trades = list(d.get("recent_trades", []))
         ws.last_anchor_tick = int(d.get("last_anchor_tick", 0))
         ws.state_hash = str(d.get("state_hash", ""))
+        ws.reindex()
         return ws
 
+    def rerank(self, agent: AgentState) -> None:
+        self.leaderboard.update(agent)
+        self.reputation.update(agent)
+
+    def reindex(self) -> None:
+        """Rebuild the ranked views from `agents`, after it was assigned or loaded wholesale."""
+        self.leaderboard.rebuild(self.agents.values())
+        self.reputation.rebuild(self.agents.values())
+
     def add_agent(self, agent_id: str) -> AgentState:
         center_x = self.size // 2 - 1
         center_y = self.size // 2 - 1
@@ -152,14 +189,22 @@ class WorldState:
             alive=True,
         )
         self.agents[agent_id] = a
+        self.agent_changed[agent_id] = self.tick + 1
+        self.rerank(a)
+        self.version += 1
         return a
 
     def reset_environment(self) -> None:
         self.grid = [[make_tile(x, y) for x in range(self.size)] for y in range(self.size)]
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version += 1
+        self.tile_changed = [self.tick] * (self.size * self.size)
 
     def reset_session(self) -> None:
         self.reset_environment()
         self.agents.clear()
+        self.agent_changed.clear()
+        self.reindex()
 
     def in_bounds(self, x: int, y: int) -> bool:
         return 0 <= x < self.size and 0 <= y < self.size
@@ -242,6 +287,7 @@ class WorldState:
         self.tick += 1
         tick = self.tick
         events: list[dict[str, Any]] = []
+        seen = {aid: a.view_key() for aid, a in self.agents.items()}
 
         # Update market price based on scarcity
         old_price = self.market_price
@@ -255,9 +301,13 @@ class WorldState:
             })
 
         # Apply world tick to all tiles
-        for y in range(self.size):
-            for x in range(self.size):
-                apply_world_tick(self.grid[y][x], tick)
+        stamps = self.tile_changed
+        i = 0
+        for row in self.grid:
+            for tile in row:
+                if apply_world_tick(tile, tick):
+                    stamps[i] = tick
+                i += 1
 
         # Reputation decay every 10 ticks (0.5 points toward neutral 100.0)
         if tick % 10 == 0:
@@ -303,6 +353,12 @@ class WorldState:
                 "alive_agents": sum(1 for a in self.agents.values() if a.alive),
             })
 
+        for agent_id, agent in self.agents.items():
+            if seen.get(agent_id) != agent.view_key():
+                self.agent_changed[agent_id] = tick
+                self.rerank(agent)
+        self.version += 1
+
         events.append({"type": "TICK_DONE", "tick": tick})
         return events
 
@@ -329,6 +385,7 @@ class WorldState:
                 events.append({"type": "ACTION_REJECTED", "tick": t, "agent_id": agent.agent_id, "reason": "no_resource"})
                 return events
             tile["resource"] = available - 1
+            self.tile_changed[agent.y * self.size + agent.x] = t
             agent.inventory["resource"] = int(agent.inventory.get("resource", 0)) + 1
             events.append({"type": "RESOURCE_GATHERED", "tick": t, "agent_id": agent.agent_id, "amount": 1})
             return events
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+from collections import OrderedDict
+from typing import Optional
+
+from ..storage.base import Storage
+from .engine import WorldState
+from .snapshot import load_snapshot, replay_world
+
+
+class WorldHistory:
+    """Rebuilds past world states from the nearest snapshot plus replayed TICK_RESOLVED actions.
+
+    Rebuilt states are kept in a small LRU and reused as replay starting points, so scrubbing back
+    and forth costs at most one snapshot interval of steps instead of a full replay.
+    """
+
+    def __init__(self, capacity: int = 16) -> None:
+        self.capacity = max(1, int(capacity))
+        self._states: "OrderedDict[int, WorldState]" = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    def clear(self) -> None:
+        self._states.clear()
+
+    def _nearest_cached(self, tick: int) -> Optional[WorldState]:
+        best: Optional[int] = None
+        for t in self._states:
+            if t <= tick and (best is None or t > best):
+                best = t
+        return self._states[best] if best is not None else None
+
+    async def at(self, storage: Storage, tick: int) -> Optional[WorldState]:
+        """World as of `tick`, or None when no retained snapshot reaches back that far.
+
+        The returned state is shared with the cache and must not be mutated.
+        """
+        async with self._lock:
+            cached = self._states.get(tick)
+            if cached is not None:
+                self._states.move_to_end(tick)
+                return cached
+
+            world = await load_snapshot(storage, at_tick=tick)
+            base = self._nearest_cached(tick)
+            if base is not None and (world is None or base.tick > world.tick):
+                world = copy.deepcopy(base)
+            if world is None:
+                return None
+
+            await replay_world(storage, world, to_tick=tick)
+            self._states[tick] = world
+            while len(self._states) > self.capacity:
+                self._states.popitem(last=False)
+            return world
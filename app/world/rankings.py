@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from typing import Any, Callable, Iterable, Optional
+
+# Sorted indexes over agents, updated by WorldState whenever an agent's ranked fields change so
+# leaderboard reads never sort. Entries are (*sort_key, agent_id) tuples in ascending order;
+# rank lookups bisect, pages slice, and an update is a bisect plus a list memmove.
+
+
+class RankedIndex:
+    def __init__(self, key: Callable[[Any], tuple[Any, ...]]) -> None:
+        self._key = key
+        self._entries: list[tuple[Any, ...]] = []
+        self._by_agent: dict[str, tuple[Any, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def update(self, agent: Any) -> None:
+        entry = (*self._key(agent), agent.agent_id)
+        old = self._by_agent.get(agent.agent_id)
+        if old == entry:
+            return
+        if old is not None:
+            del self._entries[bisect_left(self._entries, old)]
+        insort(self._entries, entry)
+        self._by_agent[agent.agent_id] = entry
+
+    def remove(self, agent_id: str) -> None:
+        old = self._by_agent.pop(agent_id, None)
+        if old is not None:
+            del self._entries[bisect_left(self._entries, old)]
+
+    def rebuild(self, agents: Iterable[Any]) -> None:
+        self._by_agent = {a.agent_id: (*self._key(a), a.agent_id) for a in agents}
+        self._entries = sorted(self._by_agent.values())
+
+    def rank(self, agent_id: str) -> Optional[int]:
+        """0-based position of `agent_id`, or None if it is not indexed."""
+        entry = self._by_agent.get(agent_id)
+        return None if entry is None else bisect_left(self._entries, entry)
+
+    def page(self, offset: int = 0, limit: Optional[int] = None) -> list[str]:
+        """Agent ids at positions [offset, offset + limit)."""
+        offset = max(0, offset)
+        end = len(self._entries) if limit is None else offset + max(0, limit)
+        return [e[-1] for e in self._entries[offset:end]]
+
+
+def score_key(agent: Any) -> tuple[Any, ...]:
+    # alive agents first, then highest hp + resource
+    return (not agent.alive, -(int(agent.hp) + int(agent.inventory.get("resource", 0))))
+
+
+def trust_key(agent: Any) -> tuple[Any, ...]:
+    return (-agent.trust_score,)
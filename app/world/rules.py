@@ -11,7 +11,8 @@ def clamp01(x: float) -> float:
     return x
 
 
-def apply_world_tick(tile: dict[str, Any], tick: int) -> None:
+def apply_world_tick(tile: dict[str, Any], tick: int) -> bool:
+    """Advance one tile by one tick in place; returns whether any of its values changed."""
     degradation = float(tile["degradation"])
     resource = int(tile["resource"])
     hazard = float(tile["hazard"])
@@ -24,9 +25,13 @@ def apply_world_tick(tile: dict[str, Any], tick: int) -> None:
     if degradation < 0.25:
         resource = min(100, resource + 1)
 
+    changed = (
+        degradation != tile["degradation"] or resource != tile["resource"] or hazard != tile["hazard"]
+    )
     tile["degradation"] = degradation
     tile["resource"] = resource
     tile["hazard"] = hazard
+    return changed
 
 
 def hazard_damage(hazard: float, degradation: float) -> int:
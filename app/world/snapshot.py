@@ -1,44 +1,318 @@
 from __future__ import annotations
 
-from typing import Any, Optional
+import json
+import logging
+import struct
+import sys
+import time
+import weakref
+import zlib
+from array import array
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Optional
 
-import aiosqlite
+from ..db import SnapshotFrame
+from ..metrics import SNAPSHOT_BYTES, SNAPSHOT_SECONDS
+from ..storage.base import Storage
+from .engine import AgentState, WorldState
 
-from ..db import get_latest_snapshot, get_max_resolved_tick, list_actions_for_tick, upsert_snapshot
-from .engine import WorldState
+if TYPE_CHECKING:
+    from ..action_log import ActionLog
 
+# Keyframes: magic + zlib(u32 meta length | meta json | f64 degradation[n] | f64 hazard[n] | i32 resource[n]),
+# tiles in row-major order, little-endian. Deltas: magic + zlib(json) of the tiles and agents that changed
+# since the previous frame. Floats are stored losslessly so state hashes survive a rebuild.
+_KEYFRAME_MAGIC = b"LOK1"
+_DELTA_MAGIC = b"LOD1"
 
-async def load_world(conn: aiosqlite.Connection, size: int) -> WorldState:
-    latest = await get_latest_snapshot(conn)
-    if latest is None:
-        world = WorldState(size=size, tick=0)
-        await upsert_snapshot(conn, 0, world.to_dict())
-        return world
+logger = logging.getLogger("last_oasis")
 
-    snap_tick, snap_state = latest
-    world = WorldState.from_dict(snap_state)
 
-    max_resolved = await get_max_resolved_tick(conn)
-    if max_resolved <= snap_tick:
-        return world
+@dataclass
+class _SnapshotBase:
+    tick: int
+    key_tick: int
+    deltas_since_key: int
+    tiles: list[tuple[float, int, float]]
+    agents: dict[str, dict[str, Any]]
+
+
+# Last frame written per live world, so the next snapshot can be encoded as a delta against it.
+_bases: "weakref.WeakKeyDictionary[WorldState, _SnapshotBase]" = weakref.WeakKeyDictionary()
+
+
+def _tile_tuples(world: WorldState) -> list[tuple[float, int, float]]:
+    return [
+        (float(t["degradation"]), int(t["resource"]), float(t["hazard"]))
+        for row in world.grid
+        for t in row
+    ]
+
+
+def _meta(world: WorldState) -> dict[str, Any]:
+    return {
+        "size": world.size,
+        "tick": world.tick,
+        "market_price": world.market_price,
+        "recent_trades": world.recent_trades,
+        "last_anchor_tick": world.last_anchor_tick,
+        "state_hash": world.state_hash,
+    }
+
+
+def _apply_meta(world: WorldState, meta: dict[str, Any]) -> None:
+    world.tick = int(meta["tick"])
+    world.market_price = float(meta.get("market_price", 1.0))
+    world.recent_trades = list(meta.get("recent_trades", []))
+    world.last_anchor_tick = int(meta.get("last_anchor_tick", 0))
+    world.state_hash = str(meta.get("state_hash", ""))
+
+
+def _le(a: array) -> array:
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a
+
+
+def encode_keyframe(
+    world: WorldState, tiles: list[tuple[float, int, float]], agents: dict[str, dict[str, Any]], level: int = 6
+) -> bytes:
+    meta = _meta(world)
+    meta["agents"] = agents
+    meta_bytes = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+    deg = _le(array("d", (t[0] for t in tiles)))
+    haz = _le(array("d", (t[2] for t in tiles)))
+    res = _le(array("i", (t[1] for t in tiles)))
+    body = struct.pack("<I", len(meta_bytes)) + meta_bytes + deg.tobytes() + haz.tobytes() + res.tobytes()
+    return _KEYFRAME_MAGIC + zlib.compress(body, level)
+
+
+def world_keyframe(world: WorldState, level: int = 6) -> bytes:
+    """A standalone keyframe of the whole world, for use outside the snapshot chain."""
+    return encode_keyframe(world, _tile_tuples(world), {k: v.to_dict() for k, v in world.agents.items()}, level)
+
+
+def decode_keyframe(data: bytes) -> WorldState:
+    if data[:4] != _KEYFRAME_MAGIC:
+        raise ValueError("not_a_keyframe")
+    body = zlib.decompress(data[4:])
+    (meta_len,) = struct.unpack_from("<I", body, 0)
+    meta = json.loads(body[4 : 4 + meta_len])
+    size = int(meta["size"])
+    n = size * size
+    off = 4 + meta_len
+    deg = array("d")
+    deg.frombytes(body[off : off + 8 * n])
+    off += 8 * n
+    haz = array("d")
+    haz.frombytes(body[off : off + 8 * n])
+    off += 8 * n
+    res = array("i")
+    res.frombytes(body[off : off + 4 * n])
+    _le(deg)
+    _le(haz)
+    _le(res)
+
+    grid = [
+        [
+            {"degradation": deg[y * size + x], "resource": res[y * size + x], "hazard": haz[y * size + x]}
+            for x in range(size)
+        ]
+        for y in range(size)
+    ]
+    world = WorldState(size=size, tick=int(meta["tick"]), grid=grid)
+    world.agents = {k: AgentState.from_dict(v) for k, v in dict(meta.get("agents", {})).items()}
+    world.reindex()
+    _apply_meta(world, meta)
+    return world
+
+
+def encode_delta(
+    world: WorldState,
+    base: _SnapshotBase,
+    tiles: list[tuple[float, int, float]],
+    agents: dict[str, dict[str, Any]],
+) -> bytes:
+    changed_tiles = [[i, *t] for i, t in enumerate(tiles) if t != base.tiles[i]]
+    changed_agents = {aid: a for aid, a in agents.items() if base.agents.get(aid) != a}
+    removed = [aid for aid in base.agents if aid not in agents]
+    payload = {"meta": _meta(world), "tiles": changed_tiles, "agents": changed_agents, "removed": removed}
+    return _DELTA_MAGIC + zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 6)
+
 
-    for t in range(snap_tick + 1, max_resolved + 1):
-        action_events = await list_actions_for_tick(conn, t)
-        actions: dict[str, dict[str, Any]] = {}
-        for ev in action_events:
-            if ev.agent_id is None:
-                continue
-            actions[ev.agent_id] = dict(ev.payload)
+def apply_delta(world: WorldState, data: bytes) -> None:
+    if data[:4] != _DELTA_MAGIC:
+        raise ValueError("not_a_delta")
+    payload = json.loads(zlib.decompress(data[4:]))
+    size = world.size
+    for i, deg, res, haz in payload.get("tiles", []):
+        world.grid[i // size][i % size] = {"degradation": deg, "resource": res, "hazard": haz}
+    for aid in payload.get("removed", []):
+        world.agents.pop(aid, None)
+        world.leaderboard.remove(aid)
+        world.reputation.remove(aid)
+    for aid, a in dict(payload.get("agents", {})).items():
+        world.agents[aid] = agent = AgentState.from_dict(a)
+        world.rerank(agent)
+    _apply_meta(world, payload["meta"])
+
+
+def rebuild_from_frames(frames: list[SnapshotFrame]) -> Optional[WorldState]:
+    if not frames or frames[0].kind != "key":
+        return None
+    world = decode_keyframe(frames[0].data)
+    for f in frames[1:]:
+        apply_delta(world, f.data)
+    return world
+
+
+async def load_snapshot(storage: Storage, at_tick: Optional[int] = None) -> Optional[WorldState]:
+    """Nearest snapshot at or before `at_tick` (latest if None), from frames or a legacy JSON snapshot."""
+    world: Optional[WorldState] = None
+    frame_tick = await storage.get_latest_frame_tick(at_tick)
+    if frame_tick is not None:
+        world = rebuild_from_frames(await storage.list_frame_chain(frame_tick))
+
+    legacy = await storage.get_legacy_snapshot(at_tick)
+    if legacy is not None and (world is None or legacy[0] > world.tick):
+        world = WorldState.from_dict(legacy[1])
+    return world
+
+
+@dataclass
+class ReplayStats:
+    from_tick: int
+    to_tick: int
+    ticks: int = 0
+    actions: int = 0
+    gaps: int = 0
+    anchors_verified: int = 0
+    anchor_mismatches: int = 0
+    elapsed_s: float = 0.0
+
+    @property
+    def ticks_per_s(self) -> float:
+        return self.ticks / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+
+async def replay_world(storage: Storage, world: WorldState, to_tick: Optional[int] = None) -> ReplayStats:
+    """Advance `world` to `to_tick` (latest resolved tick if None) from the authoritative TICK_RESOLVED log.
+
+    The whole range is streamed over a single ordered cursor; state hashes are checked against
+    STATE_ANCHORED events at anchor ticks along the way.
+    """
+    started = time.perf_counter()
+    after_id = await storage.get_last_reset_event_id()
+    if to_tick is None:
+        to_tick = await storage.get_max_resolved_tick(after_id)
+    stats = ReplayStats(from_tick=world.tick, to_tick=max(world.tick, to_tick))
+
+    # Entries logged at the snapshot tick may have landed after the snapshot was taken, so the range
+    # starts at the snapshot tick itself; re-applying an entry already in the snapshot is a no-op.
+    async for tick, kind, value in storage.iter_replay_rows(world.tick, to_tick, after_id):
+        if kind == "STATE_ANCHORED":
+            if tick == world.tick and tick > stats.from_tick and value:
+                if world.state_hash == value:
+                    stats.anchors_verified += 1
+                else:
+                    stats.anchor_mismatches += 1
+                    logger.warning("replay_anchor_mismatch tick=%s expected=%s got=%s", tick, value, world.state_hash)
+            continue
+        if kind == "WORLD_RESET_IF_EXTINCT":
+            if tick == world.tick and not any(a.alive for a in world.agents.values()):
+                world.reset_session()
+            continue
+        if kind == "AGENT_ENTERED":
+            if tick == world.tick and value and value not in world.agents:
+                world.add_agent(value)
+            continue
+        if tick <= world.tick:
+            continue
+        # TICK_RESOLVED, or ACTION_SUBMITTED: a tick without one, rebuilt from its submissions
+        actions: dict[str, dict[str, Any]] = json.loads(value) if value else {}
         world.step(actions)
+        stats.ticks += 1
+        stats.actions += len(actions)
+        if kind == "ACTION_SUBMITTED":
+            stats.gaps += 1
+
+    stats.elapsed_s = time.perf_counter() - started
+    return stats
+
+
+async def load_world(storage: Storage, size: int, action_log: Optional["ActionLog"] = None) -> WorldState:
+    """Latest snapshot plus replay. Submissions still only in the action log are ingested first."""
+    if action_log is not None:
+        recovered = await action_log.recover(storage)
+        if recovered:
+            logger.info("action_log_recovered records=%s", len(recovered))
+    world = await load_snapshot(storage)
+    if world is None:
+        world = WorldState(size=size, tick=0)
+        await write_snapshot(storage, world)
+        return world
 
+    stats = await replay_world(storage, world)
+    if stats.ticks:
+        logger.info(
+            "replay from_tick=%s to_tick=%s ticks=%s actions=%s gaps=%s elapsed=%.3fs rate=%.0f ticks/s "
+            "anchors_verified=%s anchor_mismatches=%s",
+            stats.from_tick,
+            stats.to_tick,
+            stats.ticks,
+            stats.actions,
+            stats.gaps,
+            stats.elapsed_s,
+            stats.ticks_per_s,
+            stats.anchors_verified,
+            stats.anchor_mismatches,
+        )
     return world
 
 
-async def maybe_snapshot(conn: aiosqlite.Connection, world: WorldState, every_ticks: int) -> Optional[int]:
+async def write_snapshot(
+    storage: Storage,
+    world: WorldState,
+    keyframe_every: int = 10,
+    keep_keyframes: int = 3,
+) -> SnapshotFrame:
+    """Write a keyframe every `keyframe_every` snapshots and compact deltas in between."""
+    started = time.perf_counter()
+    tiles = _tile_tuples(world)
+    agents = {k: v.to_dict() for k, v in world.agents.items()}
+    base = _bases.get(world)
+    if (
+        base is None
+        or base.tick >= world.tick
+        or len(base.tiles) != len(tiles)
+        or base.deltas_since_key + 1 >= max(1, keyframe_every)
+    ):
+        frame = SnapshotFrame(tick=world.tick, kind="key", key_tick=world.tick, data=encode_keyframe(world, tiles, agents))
+        _bases[world] = _SnapshotBase(world.tick, world.tick, 0, tiles, agents)
+    else:
+        frame = SnapshotFrame(
+            tick=world.tick, kind="delta", key_tick=base.key_tick, data=encode_delta(world, base, tiles, agents)
+        )
+        _bases[world] = _SnapshotBase(world.tick, base.key_tick, base.deltas_since_key + 1, tiles, agents)
+
+    await storage.insert_snapshot_frame(frame)
+    if frame.kind == "key":
+        await storage.prune_snapshot_frames(keep_keyframes)
+    SNAPSHOT_SECONDS.observe(time.perf_counter() - started, frame.kind)
+    SNAPSHOT_BYTES.observe(len(frame.data), frame.kind)
+    return frame
+
+
+async def maybe_snapshot(
+    storage: Storage,
+    world: WorldState,
+    every_ticks: int,
+    keyframe_every: int = 10,
+    keep_keyframes: int = 3,
+) -> Optional[int]:
     if every_ticks <= 0:
         return None
     if world.tick % every_ticks != 0:
         return None
-    await upsert_snapshot(conn, world.tick, world.to_dict())
+    await write_snapshot(storage, world, keyframe_every=keyframe_every, keep_keyframes=keep_keyframes)
     return world.tick
-
@@ -15,13 +15,14 @@ import math
 import os
 import random
 import sys
+from typing import Optional
 
 # Force demo mode
 os.environ.pop("CHAIN_RPC_URL", None)
 os.environ.pop("MONAD_RPC_URL", None)
 os.environ.pop("ENTRY_FEE_CONTRACT_ADDRESS", None)
 
-from agents.sdk import LastOasisClient
+from agents.sdk import LastOasisClient, websockets
 
 
 # ─── Helper: move towards a target position ───
@@ -473,44 +474,64 @@ async def run_agent(config: dict, base_url: str) -> None:
     dqn_tracker = DQNTracker() if agent_type == "dqn" else None
     step = 0
 
+    async def decide(obs: dict) -> Optional[dict]:
+        """Action for this observation, or None once the agent is dead."""
+        nonlocal step
+        agent = obs["agent"]
+        if not agent.get("alive", True):
+            inv = agent.get("inventory", {})
+            print(f"  [{name}] DIED at step {step}. Final res={inv.get('resource',0)}")
+            if dqn_tracker:
+                await dqn_tracker.report(base_url)
+            return None
+
+        scores = {}
+        if agent_type == "random":
+            action = pick_random_action(obs)
+        elif agent_type == "belief":
+            action = pick_belief_action(obs, belief)
+        elif agent_type == "trader":
+            action = pick_trader_action(obs)
+        elif agent_type == "dqn":
+            action, scores = pick_dqn_action(obs)
+        else:
+            action = pick_random_action(obs)
+        step += 1
+
+        # Track DQN decisions
+        if dqn_tracker:
+            dqn_tracker.record_step(obs, action, scores, action["type"])
+            # Report every 5 steps so dashboard updates frequently
+            if step % 5 == 0:
+                await dqn_tracker.report(base_url)
+
+        if step % 20 == 0:
+            inv = agent.get("inventory", {})
+            nearby_count = len(obs.get("nearby_agents", []))
+            print(f"  [{name}] ({agent_type}) step={step} hp={agent['hp']} pos=({agent['x']},{agent['y']}) res={inv.get('resource',0)} nearby={nearby_count} act={action['type']}")
+        return action
+
+    # Push channel: one observation per tick, no polling. Falls back to polling without websockets.
+    if websockets is not None:
+        while True:
+            try:
+                async with client.stream() as stream:
+                    async for obs in stream:
+                        action = await decide(obs)
+                        if action is None:
+                            return
+                        await stream.act(action)
+            except Exception as e:
+                print(f"  [{name}] Stream error: {e}")
+            await asyncio.sleep(2)
+
     while True:
         try:
             obs = await client.observation()
-            agent = obs["agent"]
-            if not agent.get("alive", True):
-                inv = agent.get("inventory", {})
-                print(f"  [{name}] DIED at step {step}. Final res={inv.get('resource',0)}")
-                if dqn_tracker:
-                    await dqn_tracker.report(base_url)
+            action = await decide(obs)
+            if action is None:
                 return
-
-            scores = {}
-            if agent_type == "random":
-                action = pick_random_action(obs)
-            elif agent_type == "belief":
-                action = pick_belief_action(obs, belief)
-            elif agent_type == "trader":
-                action = pick_trader_action(obs)
-            elif agent_type == "dqn":
-                action, scores = pick_dqn_action(obs)
-            else:
-                action = pick_random_action(obs)
-
             await client.submit_action(action)
-            step += 1
-
-            # Track DQN decisions
-            if dqn_tracker:
-                dqn_tracker.record_step(obs, action, scores, action["type"])
-                # Report every 5 steps so dashboard updates frequently
-                if step % 5 == 0:
-                    await dqn_tracker.report(base_url)
-
-            if step % 20 == 0:
-                inv = agent.get("inventory", {})
-                nearby_count = len(obs.get("nearby_agents", []))
-                print(f"  [{name}] ({agent_type}) step={step} hp={agent['hp']} pos=({agent['x']},{agent['y']}) res={inv.get('resource',0)} nearby={nearby_count} act={action['type']}")
-
         except Exception as e:
             print(f"  [{name}] Error: {e}")
             await asyncio.sleep(2)
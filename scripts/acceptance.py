@@ -1,14 +1,75 @@
 from __future__ import annotations
 
 import asyncio
+import gzip
+import json
 import os
+import struct
 import tempfile
-from typing import Any
+from typing import Any, Optional
 
-from app.db import connect, init_db, insert_event, list_actions_for_tick, upsert_snapshot
-from app.settings import Settings
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.action_log import ActionLog, ActionRecord, encode_record
+from agents.sdk import GridFrame
+from app.api.arena_proxy import assign_workers
+from app.api.event_feed import EventFeed
+from app.api.grid_binary import encode_grid
+from app.api.negotiation import MSGPACK, NegotiationMiddleware, accepts_msgpack, msgpack
+from app.api.ratelimit import RateLimiter
+from app.api.ticks import Lockstep, TickSignal
+from app.api.response_cache import ResponseCache
+from app.api.routes import (
+    READ_ROUTES,
+    AppState,
+    grid_delta_payload,
+    grid_payload,
+    leaderboard_payload,
+    make_read_router,
+    make_router,
+)
+from app.archive import EventArchive, recover_segments
+from app import arenas, profiler, shared_world
+from app.metrics import LOCK_WAIT_SECONDS, Registry, TimedLock
+from app.db import EventFilter, upsert_snapshot
+from app.scheduler import TickScheduler
+from app.settings import arena_path, settings
+from app.shared_world import WorldPublisher, WorldReader, decode_world
+from app.storage import LogFileStorage, MemoryStorage, SqliteStorage, Storage
+from app.world import engine
 from app.world.engine import WorldState
-from app.world.snapshot import load_world, maybe_snapshot
+from app.world.history import WorldHistory
+from app.world.snapshot import load_snapshot, load_world, maybe_snapshot, replay_world
+
+
+def _open_backend(backend: str, d: str) -> Storage:
+    if backend == "sqlite":
+        return SqliteStorage(os.path.join(d, "test.sqlite3"), read_pool_size=2)
+    if backend == "logfile":
+        return LogFileStorage(os.path.join(d, "test.log"))
+    return MemoryStorage()
+
+
+def _app_state(world: WorldState, storage: Storage | None = None, **kw: Any) -> AppState:
+    return AppState(
+        storage=storage or MemoryStorage(),
+        world=world,
+        world_lock=asyncio.Lock(),
+        db_lock=asyncio.Lock(),
+        pending_actions={},
+        agent_names={},
+        **kw,
+    )
+
+
+def _api(state: AppState) -> httpx.AsyncClient:
+    app = FastAPI()
+    app.add_middleware(NegotiationMiddleware)
+    app.include_router(make_router(state))
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://acceptance")
 
 
 async def run_engine_100_ticks() -> None:
@@ -18,37 +79,825 @@ async def run_engine_100_ticks() -> None:
         world.step({"a": {"type": "rest"}})
 
 
-async def run_event_sourcing_restart() -> None:
+async def run_event_sourcing_restart(backend: str) -> None:
     with tempfile.TemporaryDirectory() as d:
-        db_path = os.path.join(d, "test.sqlite3")
-        conn = await connect(db_path)
-        await init_db(conn)
+        storage = _open_backend(backend, d)
+        await storage.open()
 
         world = WorldState(size=20, tick=0)
         world.add_agent("a")
         world.add_agent("b")
-        await upsert_snapshot(conn, 0, world.to_dict())
+        if isinstance(storage, SqliteStorage):
+            await upsert_snapshot(storage.conn, 0, world.to_dict())  # legacy JSON snapshot path
+        else:
+            await maybe_snapshot(storage, world, every_ticks=10)
+        hashes: dict[int, str] = {}
 
-        for _ in range(25):
+        for _ in range(55):
             target_tick = world.tick + 1
-            await insert_event(conn, tick=target_tick, type="ACTION_SUBMITTED", agent_id="a", payload={"type": "rest"})
-            await insert_event(conn, tick=target_tick, type="ACTION_SUBMITTED", agent_id="b", payload={"type": "rest"})
+            await storage.insert_event(tick=target_tick, type="ACTION_SUBMITTED", agent_id="a", payload={"type": "rest"})
+            await storage.insert_event(tick=target_tick, type="ACTION_SUBMITTED", agent_id="b", payload={"type": "rest"})
             actions: dict[str, dict[str, Any]] = {}
-            for ev in await list_actions_for_tick(conn, target_tick):
+            for ev in await storage.list_actions_for_tick(target_tick):
                 if ev.agent_id:
                     actions[ev.agent_id] = dict(ev.payload)
-            world.step(actions)
-            await insert_event(conn, tick=world.tick, type="TICK_RESOLVED", payload={"actions": actions})
-            await maybe_snapshot(conn, world, every_ticks=10)
+            events = world.step(actions)
+            await storage.insert_events(
+                [(world.tick, "TICK_RESOLVED", None, {"actions": actions})]
+                + [(world.tick, "STATE_ANCHORED", None, e) for e in events if e["type"] == "STATE_ANCHORED"]
+            )
+            if world.tick != 50:
+                await maybe_snapshot(storage, world, every_ticks=10)
+            if world.tick == 43:
+                world.add_agent("c")
+                await storage.insert_event(tick=world.tick, type="AGENT_ENTERED", agent_id="c", payload={"agent_id": "c"})
+            hashes[world.tick] = world.compute_state_hash()
 
-        reloaded = await load_world(conn, size=20)
+        if backend != "memory":
+            await storage.close()
+            storage = _open_backend(backend, d)
+            await storage.open()
+
+        reloaded = await load_world(storage, size=20)
         assert reloaded.tick == world.tick
-        await conn.close()
+        assert reloaded.compute_state_hash() == world.compute_state_hash()
+
+        from_snapshot = await load_snapshot(storage, at_tick=45)
+        assert from_snapshot is not None and from_snapshot.tick == 40
+        stats = await replay_world(storage, from_snapshot)
+        assert stats.ticks == world.tick - 40
+        assert stats.anchors_verified == 1 and stats.anchor_mismatches == 0
+
+        history = WorldHistory(capacity=4)
+        for tick in (47, 33, 52, 45, 47):
+            past = await history.at(storage, tick)
+            assert past is not None and past.compute_state_hash() == hashes[tick]
+
+        lines = [json.loads(line) async for line in storage.iter_event_ndjson(EventFilter(types=("TICK_RESOLVED",)))]
+        assert [x["tick"] for x in lines] == list(range(1, 56))
+        await storage.close()
+
+
+async def run_replay_gaps(storage: Storage) -> None:
+    # ticks 2 and 4 have submissions but no TICK_RESOLVED row, and "c" entered during tick 2
+    await storage.open()
+    world = WorldState(size=20, tick=0)
+    world.add_agent("a")
+    world.add_agent("b")
+    await maybe_snapshot(storage, world, every_ticks=1)
+    for tick in range(1, 5):
+        actions = {"a": {"type": "gather"}, "b": {"type": "move", "dx": 1, "dy": 0}}
+        await storage.insert_events([(tick, "ACTION_SUBMITTED", aid, a) for aid, a in actions.items()])
+        world.step(actions)
+        if tick in (1, 3):
+            await storage.insert_event(tick, "TICK_RESOLVED", {"actions": actions})
+        if tick == 2:
+            world.add_agent("c")
+            await storage.insert_event(tick, "AGENT_ENTERED", {"agent_id": "c"}, agent_id="c")
+
+    replayed = await load_snapshot(storage)
+    assert replayed is not None and replayed.tick == 0
+    stats = await asyncio.wait_for(replay_world(storage, replayed, to_tick=4), 10)
+    assert (stats.ticks, stats.gaps) == (4, 2)
+    assert replayed.compute_state_hash() == world.compute_state_hash()
+    await storage.close()
+
+
+async def run_entry_tick() -> None:
+    # a tick resolving between the entry's world_lock and db_lock sections must not move the entry
+    world = WorldState(size=20, tick=0)
+    world.add_agent("a")
+    state = _app_state(world)
+    async with _api(state) as api:
+        async with state.db_lock:
+            entry = asyncio.create_task(api.post("/entry/confirm", json={"tx_ref": f"{settings.entry_demo_secret}_1"}))
+            while len(world.agents) < 2:
+                await asyncio.sleep(0.001)
+            world.step({})
+        r = await entry
+        r.raise_for_status()
+    (ev,) = await state.storage.list_events(1, flt=EventFilter(types=("AGENT_ENTERED",)))
+    assert ev.agent_id == r.json()["agent_id"] and ev.tick == 0 and world.tick == 1
+
+
+async def run_token_cache() -> None:
+    state = _app_state(WorldState(size=20, tick=0))
+    async with _api(state) as api:
+        r = await api.post("/entry/confirm", json={"tx_ref": f"{settings.entry_demo_secret}_t", "name": "T"})
+        entered = r.json()
+        assert state.tokens == {entered["api_key"]: entered["agent_id"]}
+        h = {"X-AGENT-TOKEN": entered["api_key"]}
+        assert (await api.get("/world/observation", headers=h)).status_code == 200
+        assert [a for a, _, _ in await state.storage.list_agents()] == [entered["agent_id"]]
+
+        (await api.post("/admin/reset-world")).raise_for_status()
+        assert state.tokens == {}
+        assert (await api.get("/world/observation", headers=h)).status_code == 401
+
+
+async def run_read_pool() -> None:
+    with tempfile.TemporaryDirectory() as d:
+        storage = SqliteStorage(os.path.join(d, "pool.sqlite3"), read_pool_size=1)
+        await storage.open()
+        await storage.insert_event(1, "X", {})
+        conn = storage.conn
+        assert conn is not None
+        await conn.execute("BEGIN IMMEDIATE")
+        await conn.execute(
+            "INSERT INTO events (tick, type, agent_id, payload_json, created_at) VALUES (2, 'Y', NULL, '{}', '')"
+        )
+        # the write transaction is still open: a pooled reader sees the last commit without waiting
+        evs = await asyncio.wait_for(storage.list_events(10), 2)
+        assert [e.type for e in evs] == ["X"]
+        await conn.commit()
+        assert [e.type for e in await storage.list_events(10)] == ["Y", "X"]
+        await storage.close()
+
+
+async def run_reader_without_pool() -> None:
+    with tempfile.TemporaryDirectory() as d:
+        storage = SqliteStorage(os.path.join(d, "nopool.sqlite3"), read_pool_size=0)
+        storage.db_lock = asyncio.Lock()
+        await storage.open()
+        async with storage.db_lock:
+            await storage.insert_event(1, "X", {})
+            read = asyncio.create_task(storage.list_events(10))
+            await asyncio.sleep(0.05)
+            assert not read.done()  # shares the writer connection, so it waits for the write to finish
+        assert len(await read) == 1
+        await storage.close()
+
+
+def run_world_stream() -> None:
+    world = WorldState(size=20, tick=0)
+    world.add_agent("a")
+    state = _app_state(world, tokens={"tok-a": "a"})
+    app = FastAPI()
+    app.include_router(make_router(state))
+    with TestClient(app) as client:
+        try:
+            with client.websocket_connect("/world/stream", headers={"X-AGENT-TOKEN": "nope"}) as ws:
+                ws.receive_json()
+            raise AssertionError("an unknown token must be refused")
+        except WebSocketDisconnect as e:
+            assert e.code == 1008
+
+        with client.websocket_connect("/world/stream", headers={"X-AGENT-TOKEN": "tok-a"}) as ws:
+
+            def next_msg(kind: str) -> dict[str, Any]:
+                while True:
+                    msg = ws.receive_json()
+                    if msg["type"] == kind:
+                        return msg
+
+            assert next_msg("observation")["observation"]["tick"] == 0  # current state on connect
+            ws.send_json({"type": "action", "action": {"type": "gather"}})
+            assert next_msg("ack")["queued_for_tick"] == 1
+            assert state.pending_actions["a"]["type"] == "gather"
+            ws.send_json({"type": "action", "action": {"dx": 1}})
+            assert next_msg("error")["detail"] == "invalid_action"
+            # malformed frames are answered, not fatal: the socket stays open
+            ws.send_text("{not json")
+            assert next_msg("error")["detail"] == "unknown_message_type"
+            ws.send_bytes(b"\x00\x01")
+            assert next_msg("error")["detail"] == "unknown_message_type"
+            ws.send_json({"type": "action", "action": {"type": "rest"}})
+            assert next_msg("ack")["queued_for_tick"] == 1
+
+            world.step(state.pending_actions)
+            client.portal.call(state.ticks.notify, world.tick)  # the app's loop runs in the client's thread
+            assert next_msg("observation")["observation"]["tick"] == 1
+
+
+async def run_observation_long_poll() -> None:
+    world = WorldState(size=20, tick=0)
+    world.add_agent("a")
+    state = _app_state(world, tokens={"tok-a": "a"})
+    h = {"X-AGENT-TOKEN": "tok-a"}
+    loop = asyncio.get_running_loop()
+    async with _api(state) as api:
+        # woken by the tick
+        started = loop.time()
+        poll = asyncio.create_task(api.get("/world/observation?after_tick=0&timeout=5", headers=h))
+        await asyncio.sleep(0.05)
+        assert not poll.done()
+        world.step({})
+        await state.ticks.notify(world.tick)
+        assert (await poll).json()["tick"] == 1 and loop.time() - started < 1.0
+
+        # nothing happens: the current observation once the timeout runs out
+        started = loop.time()
+        assert (await api.get("/world/observation?after_tick=1&timeout=0.2", headers=h)).json()["tick"] == 1
+        assert 0.2 <= loop.time() - started < 1.0
+
+        # a reset moves the tick backwards, which must end the wait too
+        started = loop.time()
+        poll = asyncio.create_task(api.get("/world/observation?after_tick=1&timeout=5", headers=h))
+        await asyncio.sleep(0.05)
+        state.world = WorldState(size=20, tick=0)
+        state.world.add_agent("a")
+        await state.ticks.notify(0)
+        assert (await poll).json()["tick"] == 0 and loop.time() - started < 1.0
+
+
+async def run_batch_endpoints() -> None:
+    world = WorldState(size=20, tick=0)
+    for aid in ("ok", "dead", "limited"):
+        world.add_agent(aid)
+    world.agents["dead"].alive = False
+    state = _app_state(
+        world,
+        tokens={f"tok-{aid}": aid for aid in world.agents},
+        limiter=RateLimiter({"action": (0.001, 1), "observation": (0.001, 1)}),
+    )
+    state.limiter.allow("action", "limited")  # spends its only token
+    state.limiter.allow("observation", "limited")
+    rest = {"type": "rest"}
+    async with _api(state) as api:
+        r = await api.post(
+            "/world/actions",
+            json={"actions": [{"token": f"tok-{t}", "action": rest} for t in ("nope", "dead", "limited", "ok")]},
+        )
+        body = r.json()
+        assert body["queued"] == 1
+        assert body["items"] == [
+            {"ok": False, "error": "invalid_token"},
+            {"ok": False, "agent_id": "dead", "error": "agent_dead"},
+            {"ok": False, "agent_id": "limited", "error": "rate_limited"},
+            {"ok": True, "agent_id": "ok", "queued_for_tick": 1},
+        ]
+        r = await api.post("/world/observations", json={"tokens": ["tok-limited", "nope", "tok-ok"]})
+        items = r.json()["items"]
+        assert [i.get("error") for i in items] == ["rate_limited", "invalid_token", None]
+        assert items[2]["agent_id"] == "ok" and "observation" in items[2]
+    assert state.pending_actions == {"ok": rest}
+    assert [(e.agent_id, e.payload) for e in await state.storage.list_actions_for_tick(1)] == [("ok", rest)]
+
+
+async def run_msgpack_negotiation() -> None:
+    assert accepts_msgpack("application/msgpack") and accepts_msgpack("application/json, application/x-msgpack;q=0.5")
+    assert not accepts_msgpack("*/*") and not accepts_msgpack("application/msgpack; q=0")
+
+    world = WorldState(size=20, tick=0)
+    world.add_agent("a")
+    state = _app_state(world, tokens={"tok-a": "a"})
+    packed = {"Accept": MSGPACK}
+    async with _api(state) as api:
+        for _ in range(2):  # the second round is served from the cache: the variants must not mix
+            r = await api.get("/world/status", headers=packed)
+            assert r.headers["content-type"] == MSGPACK and r.headers["etag"].endswith('-m"')
+            assert msgpack.unpackb(r.content)["tick"] == 0
+            j = await api.get("/world/status", headers={"Accept": "*/*"})
+            assert j.headers["content-type"] == "application/json" and not j.headers["etag"].endswith('-m"')
+            assert j.json()["tick"] == 0
+        # a JSON ETag does not validate the msgpack variant
+        r = await api.get("/world/status", headers={**packed, "If-None-Match": j.headers["etag"]})
+        assert r.status_code == 200 and r.headers["content-type"] == MSGPACK
+        assert (await api.get("/world/status", headers={"Accept": "application/msgpack;q=0"})).json()["tick"] == 0
+
+        # uncached routes negotiate through NegotiatedResponse
+        r = await api.get("/world/observation", headers={**packed, "X-AGENT-TOKEN": "tok-a"})
+        assert r.headers["content-type"] == MSGPACK and msgpack.unpackb(r.content)["tick"] == 0
+    assert (state.responses.hits, state.responses.misses) == (4, 2)  # one build per variant
+
+
+async def run_snapshot_frames_roundtrip() -> None:
+    with tempfile.TemporaryDirectory() as d:
+        storage = SqliteStorage(os.path.join(d, "frames.sqlite3"), read_pool_size=0)
+        await storage.open()
+
+        world = WorldState(size=20, tick=0)
+        world.add_agent("a")
+        world.add_agent("b")
+        for _ in range(70):
+            world.step({"a": {"type": "gather"}, "b": {"type": "move", "dx": 1, "dy": 0}})
+            await maybe_snapshot(storage, world, every_ticks=5, keyframe_every=4, keep_keyframes=2)
+
+        generated = 0
+        make_tile = engine.make_tile
+
+        def counting_make_tile(x: int, y: int) -> dict[str, Any]:
+            nonlocal generated
+            generated += 1
+            return make_tile(x, y)
+
+        engine.make_tile = counting_make_tile
+        try:
+            rebuilt = await load_snapshot(storage)
+        finally:
+            engine.make_tile = make_tile
+        assert rebuilt is not None
+        assert rebuilt.to_dict() == world.to_dict()
+        assert generated == 0  # decoding takes the stored tiles as they are
+        older = await load_snapshot(storage, at_tick=47)
+        assert older is not None and older.tick == 45
+
+        cur = await storage.conn.execute("SELECT COUNT(*) AS n FROM world_snapshot_frames WHERE kind = 'key'")
+        assert int((await cur.fetchone())["n"]) == 2
+        assert await storage.get_oldest_frame_tick() == 45
+        await storage.close()
+
+
+async def run_event_archival() -> None:
+    with tempfile.TemporaryDirectory() as d:
+        storage = SqliteStorage(
+            os.path.join(d, "archive.sqlite3"),
+            archive_dir=os.path.join(d, "segments"),
+            segment_ticks=25,
+            retention_ticks=30,
+        )
+        await storage.open()
+        for tick in range(1, 121):
+            await storage.insert_events(
+                [(tick, "TICK_RESOLVED", None, {"actions": {}}), (tick, "TICK_DONE", None, {"tick": tick})]
+            )
+
+        archive = storage.archive
+        assert archive is not None
+        storage.db_lock = asyncio.Lock()
+        write_segment = archive.write_segment
+
+        def write_unlocked(rows: Any) -> Any:
+            assert not storage.db_lock.locked()  # only the DELETE waits on tick persistence
+            return write_segment(rows)
+
+        archive.write_segment = write_unlocked  # type: ignore[method-assign]
+        moved = await storage.maintenance(world_tick=120)
+        assert moved == 2 * 74  # ticks 1..74 (horizon 90 aligned down to 75)
+        assert [(s.tick_min, s.tick_max) for s in archive.segments()] == [(1, 24), (25, 49), (50, 74)]
+
+        evs = await storage.list_events(limit=120)
+        assert len(evs) == 120 and evs[0].tick == 120 and evs[-1].tick == 61
+        assert [e.id for e in evs] == sorted((e.id for e in evs), reverse=True)
+
+        flt = EventFilter(tick_min=70, tick_max=79, types=("TICK_DONE",))
+        page1 = await storage.list_events(limit=6, flt=flt, after_id=0)
+        page2 = await storage.list_events(limit=6, flt=flt, after_id=page1[-1].id)
+        assert [e.tick for e in page1 + page2] == list(range(70, 80))
+
+        lines = [json.loads(line) async for line in storage.iter_event_ndjson(EventFilter())]
+        assert len(lines) == 240 and [x["id"] for x in lines] == sorted(x["id"] for x in lines)
+
+        reopened = EventArchive(os.path.join(d, "segments"), segment_ticks=25)
+        await recover_segments(storage.conn, reopened)
+        assert len(reopened.segments()) == 3
+        await storage.close()
+
+        # the log-file backend has no archive: retention drops old events and checkpoints the log
+        log = LogFileStorage(os.path.join(d, "events.log"), retention_ticks=30)
+        await log.open()
+        for tick in range(1, 121):
+            await log.insert_events([(tick, "TICK_DONE", None, {"tick": tick})])
+        assert await log.maintenance(world_tick=120) == 89
+        await log.close()
+        log = LogFileStorage(os.path.join(d, "events.log"))
+        await log.open()
+        assert [e.tick for e in await log.list_events(limit=200)] == list(range(120, 89, -1))
+        assert await log.insert_event(tick=121, type="TICK_DONE", payload={}) == 121
+        await log.close()
+
+
+async def run_action_log_recovery() -> None:
+    with tempfile.TemporaryDirectory() as d:
+        storage = MemoryStorage()
+        await storage.open()
+        lock = asyncio.Lock()
+        path = os.path.join(d, "actions.log")
+        log = ActionLog(path)
+        await log.recover(storage)
+        for agent in ("a", "b", "c"):
+            log.append(1, agent, {"type": "rest"})
+        assert await log.flush(storage, lock) == 3
+
+        # fsynced but never ingested, followed by a torn write
+        with open(path, "ab") as f:
+            f.write(encode_record(ActionRecord(2, "a", {"type": "gather"})))
+            f.write(encode_record(ActionRecord(2, "b", {"type": "move", "dx": 1, "dy": 0})))
+            f.write(encode_record(ActionRecord(2, "c", {"type": "rest"}))[:-3])
+        size = os.path.getsize(path)
+
+        reopened = ActionLog(path)
+        recovered = await reopened.recover(storage)
+        assert [r.agent_id for r in recovered] == ["a", "b"]
+        assert reopened.pending_for(2) == {"a": {"type": "gather"}, "b": {"type": "move", "dx": 1, "dy": 0}}
+        assert os.path.getsize(path) < size
+        assert len(await storage.list_actions_for_tick(1)) == 3 and len(await storage.list_actions_for_tick(2)) == 2
+        assert await ActionLog(path).recover(storage) == []
+
+
+async def run_grid_delta() -> None:
+    world = WorldState(size=20, tick=0)
+    world.add_agent("a")
+    world.add_agent("b")
+    names: dict[str, str] = {}
+    client = grid_payload(world, names)
+    tiles = {(t["x"], t["y"]): t for t in client["tiles"]}
+    agents = {a["agent_id"]: a for a in client["agents"]}
+    for _ in range(150):
+        world.step({"a": {"type": "gather"}, "b": {"type": "move", "dx": 1, "dy": 0}})
+        if world.tick == 60:
+            world.add_agent("c")  # between ticks, after the client has seen tick 60 below
+        if world.tick % 3 == 0:
+            delta = grid_delta_payload(world, names, client["tick"])
+            tiles.update({(t["x"], t["y"]): t for t in delta["tiles"]})
+            agents.update({a["agent_id"]: a for a in delta["agents"]})
+            client = delta
+            full = grid_payload(world, names)
+            assert sorted(tiles.values(), key=lambda t: (t["y"], t["x"])) == full["tiles"]
+            assert sorted(agents.values(), key=lambda a: a["agent_id"]) == sorted(full["agents"], key=lambda a: a["agent_id"])
+    for _ in range(600):
+        world.step({})
+    assert grid_delta_payload(world, names, world.tick - 1)["tiles"] == []  # fully degraded tiles stop changing
+
+
+async def run_response_cache() -> None:
+    world = WorldState(size=20, tick=0)
+    world.add_agent("a")
+    cache = ResponseCache()
+    version = (world.epoch, world.version)
+    assert cache.get("grid", version) is None
+    body = cache.put("grid", version, grid_payload(world, {}))
+    assert cache.get("grid", version) is body and cache.hits == 1
+    assert json.loads(gzip.decompress(body.gzip)) == json.loads(body.raw)
+    resp = body.response("br;q=0, gzip", None)
+    assert resp.headers["content-encoding"] == "gzip" and resp.body == body.gzip
+    assert body.response(None, body.etag).status_code == 304
+    # the gzip body has its own validator: it never revalidates the identity body, or the reverse
+    gz_etag = resp.headers["etag"]
+    assert gz_etag == body.etag[:-1] + '-gz"'
+    assert body.response(None, gz_etag).status_code == 200
+    assert body.response("gzip", body.etag).status_code == 200
+    assert body.response("gzip", f'"other", {gz_etag}').status_code == 304
+    world.step({})
+    assert cache.get("grid", (world.epoch, world.version)) is None  # next tick drops the old bodies
+
+    small = ResponseCache(max_entries=2)
+    version = (world.epoch, world.version)
+    for key in ("a", "b"):
+        small.get(key, version)
+        small.put(key, version, {})
+    small.get("a", version)  # "b" is now the least recently used
+    small.put("c", version, {})
+    assert len(small) == 2 and small.get("b", version) is None and small.get("a", version) is not None
+
+    # every full-frame grid request shares one entry, whatever epoch it sent
+    state = _app_state(world)
+    async with _api(state) as api:
+        for i in range(5):
+            assert (await api.get(f"/world/grid?since_tick=0&epoch=bogus-{i}")).json()["full"]
+        await api.get("/world/grid")
+        assert (await api.get(f"/world/grid?since_tick={world.tick}&epoch={world.epoch}")).json()["full"] is False
+    assert len(state.responses) == 2
+
+
+async def run_grid_binary() -> None:
+    world = WorldState(size=20, tick=0)
+    world.add_agent("a")
+    world.add_agent("b")
+    for _ in range(30):
+        world.step({"a": {"type": "gather"}})
+    names = {"a": "Alpha"}
+    full = grid_payload(world, names)
+    for dtype, tol in (("u8", 1 / 255), ("f16", 1e-3)):
+        frame = GridFrame.decode(encode_grid(world, names, dtype))
+        assert (frame.tick, frame.size, frame.epoch) == (world.tick, 20, world.epoch)
+        for i, t in enumerate(full["tiles"]):
+            assert abs(frame.degradation[i] * frame.scale - t["degradation"]) <= tol
+            assert abs(frame.hazard[i] * frame.scale - t["hazard"]) <= tol
+            assert frame.resource[i] == t["resource"]
+        for got, want in zip(frame.agents, full["agents"]):
+            assert abs(got.pop("trust_score") - want["trust_score"]) < 0.1
+            assert got == {k: v for k, v in want.items() if k not in ("trust_score", "score")}
+
+
+async def run_rate_limiter() -> None:
+    now = [0.0]
+    lim = RateLimiter({"observation": (2.0, 4.0), "action": (0.0, 1.0)}, clock=lambda: now[0])
+    assert [lim.allow("observation", "a") for _ in range(5)] == [True] * 4 + [False]
+    assert lim.allow("observation", "b")  # buckets are per agent
+    now[0] += 0.5  # refills one token at 2/s
+    assert lim.allow("observation", "a") and not lim.allow("observation", "a")
+    assert all(lim.allow("action", "a") for _ in range(100))  # rate 0 disables the class
+    assert lim.rejected["observation"] == 2 and lim.rejected_by_agent["a"] == 2
+
+
+async def run_rankings() -> None:
+    def brute(world: WorldState) -> tuple[list[str], list[str]]:
+        agents = list(world.agents.values())
+        by_score = sorted(agents, key=lambda a: (not a.alive, -(a.hp + a.inventory.get("resource", 0)), a.agent_id))
+        by_trust = sorted(agents, key=lambda a: (-a.trust_score, a.agent_id))
+        return [a.agent_id for a in by_score], [a.agent_id for a in by_trust]
+
+    world = WorldState(size=20, tick=0)
+    for i in range(12):
+        world.add_agent(f"a{i}")
+    kinds = ["gather", "rest", "attack", "trade"]
+    for t in range(120):
+        ids = sorted(world.agents)
+        actions = {aid: {"type": kinds[(t + n) % 4], "target": ids[(n + 1) % len(ids)], "amount": 1} for n, aid in enumerate(ids)}
+        world.step(actions)
+        if t == 40:
+            world.add_agent("late")
+        assert (world.leaderboard.page(), world.reputation.page()) == brute(world), t
+    assert any(not a.alive for a in world.agents.values())
+    board = leaderboard_payload(world, {}, offset=3, limit=4, agent_id="a5")
+    assert [i["rank"] for i in board["items"]] == [4, 5, 6, 7]
+    assert board["agent_rank"] == brute(world)[0].index("a5") + 1
+    copy = WorldState.from_dict(world.to_dict())
+    assert (copy.leaderboard.page(), copy.reputation.page()) == brute(world)
+
+
+async def run_arena_layout() -> None:
+    assert arena_path("data/last_oasis.sqlite3", None) == "data/last_oasis.sqlite3"
+    assert arena_path("data/last_oasis.sqlite3", "east") == os.path.join("data", "last_oasis.east.sqlite3")
+    workers = assign_workers(["a", "b", "c", "d", "e"], 2, 9100)
+    assert [w.world_ids for w in workers] == [["a", "c", "e"], ["b", "d"]]
+    assert [w.port for w in workers] == [9100, 9101]
+    assert len(assign_workers(["a"], 4, 9100)) == 1
+
+
+async def run_tick_scheduler() -> None:
+    def run(policy: str, work: list[Optional[float]], adaptive: bool = False) -> tuple[TickScheduler, list[float], Any]:
+        """A scheduler on a fake clock plus a loop that spends `work` seconds per tick (None: idle)."""
+        now = [0.0]
+
+        async def sleep(d: float) -> None:
+            now[0] += d
+
+        sched = TickScheduler(1000, policy=policy, adaptive=adaptive, max_catchup=2, clock=lambda: now[0], sleep=sleep)
+        starts = []
+
+        async def loop() -> None:
+            for w in work:
+                await sched.wait()
+                starts.append(now[0])
+                if w is None:
+                    sched.pass_idle()
+                    continue
+                now[0] += w
+                sched.finish()
+
+        return sched, starts, loop
+
+    sched, starts, loop = run("skip", [0.2, 0.5, 0.1])
+    await loop()
+    assert starts == [1.0, 2.0, 3.0] and sched.overruns == 0  # work time does not shift the cadence
+    sched, starts, loop = run("skip", [0.1, 2.5, 0.1])
+    await loop()
+    assert starts == [1.0, 2.0, 5.0] and sched.overruns == 1 and sched.skipped == 2
+    sched, starts, loop = run("compress", [0.1, 2.5, 0.1, 0.1])
+    await loop()
+    assert starts == [1.0, 2.0, 4.5, 4.6] and sched.skipped == 0
+    sched, starts, loop = run("slow", [0.1, 2.5, 0.1])
+    await loop()
+    assert starts == [1.0, 2.0, 5.5]
+    sched, _, loop = run("skip", [0.95] * 10, adaptive=True)
+    await loop()
+    assert sched.interval_s > sched.base_interval_s and sched.snapshot()["ticks"] == 10
+    sched, starts, loop = run("skip", [0.5, None, None, 0.3])
+    await loop()
+    assert starts == [1.0, 2.0, 3.0, 4.0]  # idle deadlines keep the cadence...
+    snap = sched.snapshot()
+    assert (snap["ticks"], snap["idle"], snap["overruns"], snap["load"]) == (2, 2, 0, 0.46)  # ...but are not ticks
+
+
+async def run_lockstep() -> None:
+    world = WorldState(size=20)
+    world.add_agent("a")
+    world.add_agent("b")
+    lock = Lockstep()
+    pending: dict[str, Any] = {}
+    lock.arm(world, pending)
+    assert not lock.ready.is_set()
+    pending["a"] = {"type": "rest"}
+    lock.acted("a")
+    assert not lock.ready.is_set() and lock.waiting == {"b"}
+    pending["b"] = {"type": "rest"}
+    lock.acted("b")
+    assert lock.ready.is_set()
+
+    # a ready lockstep wakes the scheduler long before its 60s deadline, then re-anchors on it
+    sched = TickScheduler(60_000)
+    await asyncio.wait_for(sched.wait(lock.ready), 5.0)
+    sched.finish()
+    assert sched.early == 1 and 59.0 < sched.until_next() <= 60.0
+    pending.clear()
+    lock.arm(world, pending)  # new tick: everyone owes an action again
+    assert not lock.ready.is_set() and lock.waiting == {"a", "b"}
+    lock.arm(WorldState(size=20), {})  # nobody alive: leave it to the timer
+    assert not lock.ready.is_set()
+
+
+async def run_metrics() -> None:
+    reg = Registry()
+    h = reg.histogram("t_seconds", "help", ("world",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3.0):
+        h.observe(v, 'a"b')
+    c = reg.counter("t_total", "help", ("type",))
+    c.inc("X")
+    c.inc("X", amount=2)
+    lines = reg.render().splitlines()
+    assert 't_seconds_bucket{world="a\\"b",le="0.1"} 2' in lines
+    assert 't_seconds_bucket{world="a\\"b",le="1"} 3' in lines
+    assert 't_seconds_bucket{world="a\\"b",le="+Inf"} 4' in lines
+    assert 't_seconds_count{world="a\\"b"} 4' in lines and 't_total{type="X"} 3' in lines
+    assert "# TYPE t_seconds histogram" in lines
+
+    lock = TimedLock("acceptance", "world")
+    async with lock:
+        pass
+    assert LOCK_WAIT_SECONDS.count("acceptance", "world") == 1
+
+
+async def run_profiler() -> None:
+    async def busy() -> None:
+        while True:
+            sum(range(200_000))
+            await asyncio.sleep(0)
+
+    task = asyncio.create_task(busy())
+    try:
+        capture = asyncio.create_task(profiler.sample(0.3, 0.002))
+        await asyncio.sleep(0.05)
+        try:
+            await profiler.cprofile(0.1)
+            raise AssertionError("second capture should be refused")
+        except profiler.ProfilerBusy:
+            pass
+        stacks = await capture
+    finally:
+        task.cancel()
+    assert any(stack.endswith("acceptance:run_profiler.<locals>.busy") for stack in stacks)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in profiler.collapsed(stacks).splitlines())
+    stats = await profiler.cprofile(0.05)  # free again
+    assert "function calls" in profiler.stats_text(stats, "tottime", 5)
+
+
+async def run_shared_world() -> None:
+    world = WorldState(size=20)
+    for aid in ("a", "b", "c"):
+        world.add_agent(aid)
+    world.step({"a": {"type": "gather"}, "b": {"type": "move", "dx": 1, "dy": 0}})
+    state = AppState(
+        storage=MemoryStorage(),
+        world=world,
+        world_lock=asyncio.Lock(),
+        db_lock=asyncio.Lock(),
+        pending_actions={},
+        agent_names={"a": "Alpha"},
+        tokens={"tok-a": "a"},
+    )
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "w.world")
+        pub = WorldPublisher(path)
+        reader = WorldReader(path)
+        assert reader.read() is None  # nothing published yet
+        pub.publish(state)
+        assert reader.changed()
+        extras, frame = reader.read()
+        replica = decode_world(extras, frame)
+        assert not reader.changed()
+        assert extras["tokens"] == {"tok-a": "a"} and extras["names"] == {"a": "Alpha"}
+        assert (replica.epoch, replica.version, replica.tick) == (world.epoch, world.version, world.tick)
+        assert grid_payload(replica, {}) == grid_payload(world, {})
+        assert grid_delta_payload(replica, {}, world.tick - 1) == grid_delta_payload(world, {}, world.tick - 1)
+        assert leaderboard_payload(replica, {}) == leaderboard_payload(world, {})
+
+        # past the initial mapping: the writer grows the file and the open reader remaps
+        state.agent_names = {f"agent-{i}": "x" * 40 for i in range(40_000)}
+        pub.publish(state)
+        extras, _ = reader.read()
+        assert len(extras["names"]) == 40_000
+
+        # concurrent requests on a new frame: one decodes it, the rest wait and reuse the result
+        replica_state = _app_state(decode_world(*reader.read()), ticks=TickSignal(world.tick))
+        replica = arenas.ReplicaArena("w", replica_state, reader)
+        decodes = 0
+        decode = arenas.decode_world
+
+        def counting_decode(*args: Any) -> WorldState:
+            nonlocal decodes
+            decodes += 1
+            return decode(*args)
+
+        arenas.decode_world = counting_decode
+        try:
+            world.step({"a": {"type": "gather"}})
+            pub.publish(state)
+            await asyncio.gather(*(replica.refresh() for _ in range(5)))
+        finally:
+            arenas.decode_world = decode
+        assert decodes == 1
+        assert replica.state.world.tick == world.tick and replica.state.ticks.version == 1
+
+        # a reader that races a publish in progress (seq odd) waits for it and gets the new frame
+        def begin_publish() -> None:
+            struct.pack_into("<Q", pub._mm, shared_world._SEQ_OFFSET, pub._seq + 1)
+
+        world.step({"a": {"type": "gather"}})
+        begin_publish()
+        racing = asyncio.create_task(asyncio.to_thread(reader.read, 2.0))
+        await asyncio.sleep(0.05)
+        assert not racing.done()
+        pub.publish(state)
+        extras, frame = await racing
+        assert decode_world(extras, frame).tick == world.tick
+
+        # a publish that never finishes: read() gives up, requests are served from the current replica
+        served = replica.state.world.tick
+        world.step({"a": {"type": "gather"}})
+        begin_publish()
+        try:
+            reader.read(0.05)
+            raise AssertionError("a read during an unfinished publish must time out")
+        except TimeoutError:
+            pass
+        app = FastAPI()
+        app.add_middleware(NegotiationMiddleware)
+        app.include_router(make_read_router(replica.state))
+        app.add_middleware(arenas.ReplicaRefreshMiddleware, replicas={"w": replica})
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://acceptance") as api:
+            r = await api.get("/world/status")
+            assert r.status_code == 200 and r.json()["tick"] == served
+            pub.publish(state)
+            r = await api.get("/world/status")
+            assert r.status_code == 200 and r.json()["tick"] == world.tick
+        reader.close()
+        pub.close()
+
+    routes = {(m, rt.path) for rt in make_read_router(state).routes for m in rt.methods}
+    assert routes == READ_ROUTES
+
+
+async def run_event_feed() -> None:
+    state = AppState(
+        storage=MemoryStorage(),
+        world=WorldState(size=10),
+        world_lock=asyncio.Lock(),
+        db_lock=asyncio.Lock(),
+        pending_actions={},
+        agent_names={},
+    )
+    feed = EventFeed(state)
+    first = await state.storage.insert_events([(0, "OLD", None, {"n": i}) for i in range(3)])
+
+    def ids(chunk: bytes) -> list[int]:
+        return [int(line[4:]) for line in chunk.decode().splitlines() if line.startswith("id: ")]
+
+    live = feed.stream(backlog=2, exclude={"TICK_DONE"})
+    resumed = feed.stream(after_id=first[0])  # reconnect after the first event
+    assert await live.__anext__() == b"retry: 2000\n\n" and await resumed.__anext__() == b"retry: 2000\n\n"
+    assert ids(await live.__anext__()) == first[1:]
+    assert ids(await resumed.__anext__()) == first[1:]
+    assert feed.viewers == 2
+
+    new = await state.storage.insert_events([(1, "AGENT_MOVED", "a", {"x": 1}), (1, "TICK_DONE", None, {})])
+    await state.ticks.notify(1)
+    assert ids(await live.__anext__()) == new[:1]
+    assert ids(await resumed.__anext__()) == new  # no gap, no repeat between catch-up and live
+
+    # every viewer gets the same encoded bytes
+    await state.storage.insert_event(2, "AGENT_MOVED", {"x": 2}, "a")
+    await state.ticks.notify(2)
+    assert await live.__anext__() == await resumed.__anext__()
+
+    await live.aclose()
+    await resumed.aclose()
+    assert feed.viewers == 0
+    feed.close()
 
 
 async def main() -> None:
     await run_engine_100_ticks()
-    await run_event_sourcing_restart()
+    for backend in ("sqlite", "memory", "logfile"):
+        await run_event_sourcing_restart(backend)
+    with tempfile.TemporaryDirectory() as d:
+        # one pooled reader: the gap lookup must not ask for a second one
+        await run_replay_gaps(SqliteStorage(os.path.join(d, "gaps.sqlite3"), read_pool_size=1))
+    await run_replay_gaps(MemoryStorage())
+    await run_entry_tick()
+    await run_token_cache()
+    await run_read_pool()
+    await run_reader_without_pool()
+    run_world_stream()
+    await run_observation_long_poll()
+    await run_batch_endpoints()
+    await run_msgpack_negotiation()
+    await run_snapshot_frames_roundtrip()
+    await run_event_archival()
+    await run_action_log_recovery()
+    await run_grid_delta()
+    await run_response_cache()
+    await run_grid_binary()
+    await run_rate_limiter()
+    await run_rankings()
+    await run_arena_layout()
+    await run_tick_scheduler()
+    await run_lockstep()
+    await run_metrics()
+    await run_profiler()
+    await run_shared_world()
+    await run_event_feed()
     print("OK")
 
 